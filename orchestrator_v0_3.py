@@ -5,22 +5,65 @@ TOS v0.3 Orchestrator - S-5 experimental
 ChatGPT API / Claude API の実接続
 """
 
+import argparse
+import copy
 import json
 import os
 import sys
 import subprocess
 import re
 import time
-import requests
-import anthropic
 from datetime import datetime
 from pathlib import Path
 
+from tos_runtime.async_engine import get_engine, peek_engine
+from tos_runtime.clients import get_client_registry, peek_client_registry
+from tos_runtime.response_cache import (
+    CACHE_POLICY_OFF, CACHE_POLICY_READ_THROUGH, CACHE_POLICY_RECORD_ONLY,
+    get_response_cache, get_stage_policy, make_cache_key, peek_response_cache
+)
+from tos_runtime.policy import get_execution_policy, peek_execution_policy
+from tos_runtime.aggregate import PhaseAggregate
+from tos_runtime.command_scheduler import DEFAULT_MAX_WORKERS as DEFAULT_COMMAND_WORKERS
+from tos_runtime.command_scheduler import run_dependency_graph
+from tos_runtime.instrumentation import SpanRecorder, record_usage, recording, span
+from tos_runtime.done_engine import get_done_engine, peek_done_engine
+from tos_runtime.capture import CaptureSettings, run_captured
+from tos_runtime.shell_host import backend_for_type, get_shell_host_pool, peek_shell_host_pool
+from tos_runtime.history import HistoryManager, estimate_tokens
+from tos_runtime.retry import RetryCancelled, RetryExhausted, get_retry_scheduler, peek_retry_scheduler
+from tos_runtime.hedging import get_hedge_policy, peek_hedge_policy, run_hedged
+from tos_runtime.router import get_provider_router, peek_provider_router
+from tos_runtime.circuit import CircuitOpenError, get_circuit_breakers, peek_circuit_breakers
+from tos_runtime.singleflight import get_single_flight, peek_single_flight
+from tos_runtime.phase_state import flush_phase_states, fsync_dir, get_phase_state_manager, peek_phase_state_managers
+from tos_runtime.wal import get_step_wal, peek_step_wals
+from tos_runtime.serializer import get_serializer, load_file, peek_serializers
+from tos_runtime.payload import DEFAULT_INLINE_MAX_CHARS, get_payload_memo, peek_payload_memo
+from tos_runtime.interpreter import get_interpreter_cache, peek_interpreter_cache, probe_interpreter
+from tos_runtime.journal import (
+    DEFAULT_SEGMENT_MAX_BYTES, StepJournal, get_step_journal, journal_record_name
+)
+
 # グローバル定数
 BASE_DIR = Path(__file__).parent.resolve()
 CONFIG_FILE = BASE_DIR / "config_v0_3.json"
 TOS_PYTHON_PATH_FILE = BASE_DIR / "tos_python_path.txt"
 
+# OpenAI API のベースURL（openai_base_url 未設定時。ベンチマーク時はモックサーバを指す）
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# API呼び出しパラメータ（None は SDK の既定値）
+OPENAI_TEMPERATURE = 0.7
+ANTHROPIC_TEMPERATURE = None
+API_MAX_TOKENS = 2000
+
+# done_conditions.done_reason 未設定時の done_reason
+DEFAULT_DONE_REASON = "workspace/results/result_v2.txt が存在し、合計/平均/件数の全キーワードを含む"
+
+# 実行するコマンド type（allow_types で許可されたもののみ実行される）
+SHELL_COMMAND_TYPES = ("powershell", "sh")
+
 
 def load_config() -> dict:
     """設定ファイルを読み込む"""
@@ -52,7 +95,9 @@ def ensure_dirs(config: dict) -> None:
 
 
 def get_phase_state_path(config: dict) -> Path:
-    """phase_state.json のパスを取得"""
+    """phase_state.json のパスを取得（phase_state_path 指定時はそれを使う）"""
+    if config.get("phase_state_path"):
+        return BASE_DIR / config["phase_state_path"]
     return BASE_DIR / config["workspace_dir"] / "artifacts" / "phase_state.json"
 
 
@@ -64,25 +109,26 @@ def load_phase_state(config: dict) -> dict:
     """
     state_file = get_phase_state_path(config)
 
-    if not state_file.exists():
-        return None
-
     try:
-        with open(state_file, "r", encoding="utf-8") as f:
-            state = json.load(f)
-        print(f"フェーズ状態を復元: {state_file}")
-        return state
+        state = get_phase_state_manager(config, state_file).load(refresh=True)
     except Exception as e:
         print(f"フェーズ状態読み込みエラー: {e}")
         return None
+    if state is not None:
+        print(f"フェーズ状態を復元: {state_file}")
+    return state
 
 
 def save_phase_state(config: dict, current_phase: str, current_step: int,
                      last_done: bool, last_done_reason: str,
                      next_instruction_id: str = None,
-                     job_index: int = None) -> Path:
+                     job_index: int = None, durable: bool = True) -> Path:
     """フェーズ状態を保存する
 
+    状態は PhaseStateManager がメモリ上に保持し、一時ファイル + os.replace で書き込む。
+    ステップごとの途中経過は durable=False で保存し、phase_state.fsync=durable では fsync せず、
+    phase_state.coalesce=true では次の durable な保存（終了状態など）まで書き込みをまとめる
+
     Args:
         config: 設定dict
         current_phase: 現在のフェーズ名
@@ -91,42 +137,91 @@ def save_phase_state(config: dict, current_phase: str, current_step: int,
         last_done_reason: done判定の理由
         next_instruction_id: 次の指示書ID
         job_index: job_loopのインデックス (JG)
+        durable: 耐久化ポイントか（終了状態は True、ステップ途中の経過は False）
 
     Returns:
         Path: 保存したファイルのパス
     """
     state_file = get_phase_state_path(config)
 
-    # IM: previous_phase が存在しない場合のみ S-4 を設定
-    previous_phase = None
-    if state_file.exists():
-        try:
-            with open(state_file, "r", encoding="utf-8") as f:
-                existing_state = json.load(f)
-                previous_phase = existing_state.get("previous_phase")
-        except Exception:
-            pass
-    if previous_phase is None:
-        previous_phase = "S-4"
-
-    state = {
+    # IM: previous_phase は既存の状態の値を引き継ぎ、無ければ S-4（PhaseStateManager が補う）
+    written = get_phase_state_manager(config, state_file).save({
         "current_phase": current_phase,
-        "previous_phase": previous_phase,
         "current_step": current_step,
         "last_done": last_done,
         "last_done_reason": last_done_reason,
         "next_instruction_id": next_instruction_id,
         "job_index": job_index,
         "updated_at": datetime.now().isoformat()
-    }
-
-    with open(state_file, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    }, durable=durable)
 
-    print(f"フェーズ状態保存: {state_file}")
+    if written:
+        print(f"フェーズ状態保存: {state_file}")
+    else:
+        print(f"フェーズ状態更新（書き込み保留）: {state_file}")
     return state_file
 
 
+def get_step_wal_for(config: dict):
+    """config の step_wal 設定に対応する StepWAL を取得（step_wal.enabled=false なら None）"""
+    settings = config.get("step_wal", {})
+    if not settings.get("enabled", True):
+        return None
+    path = settings.get("path") or f"{config['workspace_dir']}/artifacts/step_wal.jsonl"
+    return get_step_wal(config, BASE_DIR / path)
+
+
+def commit_step(config: dict, step_num: int, step_data: dict, **state) -> None:
+    """ステップログとフェーズ状態の遷移をまとめて確定する
+
+    先にフェーズ状態の遷移とステップログの参照（step_num / job_index）を1レコードとして WAL に追記・fsync
+    （コミット）してから、ステップログ、フェーズ状態の順に書き込む。ステップログ本体は WAL に載せず、
+    WAL の fsync 設定に合わせてステップログ自体を fsync してからフェーズ状態を進める。
+    途中で落ちた場合は、次回起動時の replay_step_wal がステップログの有無を見てフェーズ状態を揃える
+
+    Args:
+        state: save_phase_state の引数（config 以外）
+    """
+    wal = get_step_wal_for(config)
+    seq = None
+    if wal is not None:
+        seq = wal.append({"step_num": step_num, "job_index": step_data.get("job_index"), "phase_state": state})
+    write_step_log(config, step_num, step_data, fsync=wal is not None and wal.fsync)
+    state_file = save_phase_state(config=config, **state)
+    # phase_state.coalesce で書き込みを保留した場合は適用済みにしない（落ちたら再適用する）
+    if wal is not None and not get_phase_state_manager(config, state_file).pending:
+        wal.mark_applied(seq)
+
+
+def replay_step_wal(config: dict) -> int:
+    """コミット済みで未適用の WAL レコードを再適用し、WAL を空にする（起動時に呼ぶ）
+
+    参照先のステップログが書き終わっているレコードだけフェーズ状態を進める。
+    ステップログが無いレコードはそのステップが確定していないものとして捨てる（フェーズ状態は進めず、
+    ステップは再実行される）。何度実行しても結果は同じ
+
+    Returns:
+        int: 再適用したレコード数
+    """
+    wal = get_step_wal_for(config)
+    if wal is None:
+        return 0
+    pending = wal.pending()
+    replayed = 0
+    for record in pending:
+        step_num = record["step_num"]
+        phase = record["phase_state"].get("current_phase")
+        if not step_log_exists(config, step_num):
+            print(f"WAL 破棄: step={step_num} phase={phase}（ステップログ未書き込み）")
+            continue
+        print(f"WAL 再適用: step={step_num} phase={phase}")
+        save_phase_state(config=config, **dict(record["phase_state"], durable=True))
+        replayed += 1
+    wal.count_replayed(replayed)
+    wal.reset()
+    return replayed
+
+
 def load_tos_python_path() -> str:
     """tos_python_path.txt から Python パスを読み込む"""
     if not TOS_PYTHON_PATH_FILE.exists():
@@ -138,25 +233,29 @@ def load_tos_python_path() -> str:
     return path if path else None
 
 
-def verify_python(python_path: str) -> bool:
-    """Python実行可能性を検証"""
+# verify_python に成功した Python パス（プロセス内で1回だけ検証する）
+_verified_python_paths = set()
+
+
+def verify_python(python_path: str, config: dict = None) -> bool:
+    """Python実行可能性を検証
+
+    config を渡すと、(パス, サイズ, mtime) が前回の検証と同じ場合は
+    workspace/artifacts/interpreter_cache.json の結果を使い、Python を起動しない
+    """
     if not python_path:
         return False
 
-    try:
-        result = subprocess.run(
-            [python_path, "--version"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            print(f"Python検証OK: {result.stdout.strip()}")
-            return True
-    except Exception as e:
-        print(f"Python検証失敗: {e}")
+    if config is not None:
+        capabilities = get_interpreter_cache(config, BASE_DIR).verify(python_path)
+    else:
+        capabilities = probe_interpreter(python_path)
+    if capabilities is None:
+        return False
 
-    return False
+    source = "（キャッシュ）" if capabilities.get("cached") else ""
+    print(f"Python検証OK{source}: Python {capabilities['version']} ({capabilities['platform']})")
+    return True
 
 
 def parse_json_strict(text: str) -> tuple:
@@ -198,13 +297,20 @@ def get_api_keys() -> tuple:
     return openai_key, anthropic_key
 
 
-def call_openai_api(config: dict, prompt: str, api_key: str, retry_count: int = 0) -> str:
-    """OpenAI ChatGPT APIを呼び出す"""
+def call_openai_api(config: dict, prompt: str, api_key: str, cancel_event=None) -> str:
+    """OpenAI ChatGPT APIを呼び出す（リトライとレート制御は RetryScheduler が行う）
+
+    cancel_event がセットされた場合（ヘッジで負けた側）はリトライせず None を返す
+    サーキットブレーカーが open の場合は呼び出さずに CircuitOpenError を送出する
+    """
+    # requests の import は重いため、API を呼ぶ実行でのみ読み込む（早期終了の起動を軽くする）
+    import requests
+
     model = config.get("openai_model", "gpt-4o-mini")
-    max_retries = config.get("api_retry", 2)
     timeout_sec = config.get("timeout_sec", 120)
 
-    url = "https://api.openai.com/v1/chat/completions"
+    base_url = config.get("openai_base_url") or DEFAULT_OPENAI_BASE_URL
+    url = f"{base_url.rstrip('/')}/chat/completions"
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -214,79 +320,227 @@ def call_openai_api(config: dict, prompt: str, api_key: str, retry_count: int =
         "messages": [
             {"role": "user", "content": prompt}
         ],
-        "temperature": 0.7,
-        "max_tokens": 2000
+        "temperature": OPENAI_TEMPERATURE,
+        "max_tokens": API_MAX_TOKENS
     }
 
+    def attempt(retry_count: int) -> tuple:
+        with span("api_attempt", provider="openai", retry=retry_count):
+            # プール済みセッションで keep-alive 接続を再利用する
+            response = get_client_registry(config).post(url, headers=headers, json=payload, timeout=timeout_sec)
+            response.raise_for_status()
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            usage = data.get("usage") or {}
+            record_usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        return content, usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=timeout_sec)
-        response.raise_for_status()
-        data = response.json()
-        content = data["choices"][0]["message"]["content"]
-        return content
-    except requests.exceptions.RequestException as e:
-        print(f"OpenAI API呼び出し失敗: {e}")
-        if retry_count < max_retries:
-            print(f"リトライ {retry_count + 1}/{max_retries}")
-            time.sleep(2 ** retry_count)
-            return call_openai_api(config, prompt, api_key, retry_count + 1)
+        return get_retry_scheduler(config).call(
+            "openai", attempt, estimate_request_tokens(prompt),
+            retry_on=(requests.exceptions.RequestException,), label="OpenAI", cancel_event=cancel_event,
+            breaker=get_circuit_breakers(config, BASE_DIR))
+    except (RetryExhausted, RetryCancelled):
         return None
 
 
-def call_anthropic_api(config: dict, prompt: str, api_key: str, retry_count: int = 0) -> str:
-    """Anthropic Claude APIを呼び出す"""
+def estimate_request_tokens(prompt: str) -> int:
+    """トークンバケット用の見積もり（プロンプトの概算 + 応答の上限）。応答後に usage で精算する"""
+    return estimate_tokens(prompt) + API_MAX_TOKENS
+
+
+def get_model_params(config: dict, api_type: str) -> tuple:
+    """api_type に対応する (model, temperature) を返す"""
+    if api_type == "openai":
+        return config.get("openai_model", "gpt-4o-mini"), OPENAI_TEMPERATURE
+    return config.get("anthropic_model", "claude-3-5-sonnet-20241022"), ANTHROPIC_TEMPERATURE
+
+
+def call_anthropic_api(config: dict, prompt: str, api_key: str, cancel_event=None) -> str:
+    """Anthropic Claude APIを呼び出す（リトライとレート制御は RetryScheduler が行う）
+
+    cancel_event がセットされた場合（ヘッジで負けた側）はリトライせず None を返す
+    サーキットブレーカーが open の場合は呼び出さずに CircuitOpenError を送出する
+    """
     model = config.get("anthropic_model", "claude-3-5-sonnet-20241022")
-    max_retries = config.get("api_retry", 2)
+
+    # クライアントはプロセス内で1つを使い回す（リトライ時も再生成しない）
+    # SDK 内蔵のリトライは無効にし、リトライ予算と待ち時間を RetryScheduler に一本化する
+    client_kwargs = {"max_retries": 0}
+    if config.get("anthropic_base_url"):
+        client_kwargs["base_url"] = config["anthropic_base_url"]
+
+    def attempt(retry_count: int) -> tuple:
+        with span("api_attempt", provider="anthropic", retry=retry_count):
+            client = get_client_registry(config).get_anthropic_client(api_key, **client_kwargs)
+            message = client.messages.create(
+                model=model,
+                max_tokens=API_MAX_TOKENS,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            content = message.content[0].text
+            usage = getattr(message, "usage", None)
+            tokens = None
+            if usage is not None:
+                input_tokens = getattr(usage, "input_tokens", 0) or 0
+                output_tokens = getattr(usage, "output_tokens", 0) or 0
+                record_usage(input_tokens, output_tokens)
+                tokens = input_tokens + output_tokens
+        return content, tokens
 
     try:
-        client = anthropic.Anthropic(api_key=api_key)
-        message = client.messages.create(
-            model=model,
-            max_tokens=2000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        content = message.content[0].text
-        return content
-    except Exception as e:
-        print(f"Anthropic API呼び出し失敗: {e}")
-        if retry_count < max_retries:
-            print(f"リトライ {retry_count + 1}/{max_retries}")
-            time.sleep(2 ** retry_count)
-            return call_anthropic_api(config, prompt, api_key, retry_count + 1)
+        return get_retry_scheduler(config).call(
+            "anthropic", attempt, estimate_request_tokens(prompt),
+            retry_on=(Exception,), label="Anthropic", cancel_event=cancel_event,
+            breaker=get_circuit_breakers(config, BASE_DIR))
+    except (RetryExhausted, RetryCancelled):
         return None
 
 
-def call_api_with_json_retry(config: dict, prompt: str, api_key: str, api_type: str) -> tuple:
-    """APIを呼び出し、JSONパースに失敗したらリトライする
+async def call_api_with_json_retry_async(config: dict, prompt: str, api_key: str, api_type: str,
+                                         stage: str = None, template_name: str = None,
+                                         call_info: dict = None) -> tuple:
+    """APIを呼び出し、JSONパースに失敗したらリトライする（非同期版）
+
+    API呼び出しは AsyncEngine.run_blocking で行う。同期ラッパー（run_sync）から呼ばれた場合はその場で呼び出し、
+    asyncio から並行に呼ばれた場合は executor 上で実行して同時実行数を async_engine.max_concurrency で制限する。
+    ヘッジの一次・複製リクエストは常に executor 上で並行に実行する。
+    同じリクエスト（プロバイダ・モデル・テンプレート・プロンプト・temperature）が同時に走っている場合は
+    single_flight で1回の呼び出しにまとめる
+
+    Args:
+        stage: ステージ名 (draft/review/final)。response_cache のポリシー選択に使う
+        template_name: キャッシュキーに含めるテンプレート名
+        call_info: 指定された場合、キャッシュ状態・所要時間・トークン使用量などの呼び出し情報を書き込む
 
     Returns:
         tuple: (raw_response, parsed_dict, extracted_text)
     """
+    with recording() as recorder:
+        started = time.perf_counter()
+        try:
+            return await _call_api_with_json_retry_async(
+                config, prompt, api_key, api_type, stage, template_name, call_info)
+        finally:
+            if call_info is not None:
+                call_info["timing"] = build_call_timing(recorder, (time.perf_counter() - started) * 1000)
+
+
+def build_call_timing(recorder: SpanRecorder, total_ms: float) -> dict:
+    """prompts_used.<stage>.timing に記録する内容"""
+    api_ms = recorder.durations("api_attempt")
+    json_attempts = recorder.count("json_attempt")
+    api_retries = sum(1 for entry in recorder.spans if entry["name"] == "api_attempt" and entry.get("retry"))
+    return {
+        "total_ms": round(total_ms, 3),
+        "api_attempts": len(api_ms),
+        "api_retries": api_retries,
+        "api_ms": round(sum(api_ms), 3),
+        "json_attempts": json_attempts,
+        "json_retries": max(0, json_attempts - 1),
+        "usage": dict(recorder.usage),
+        "spans": list(recorder.spans)
+    }
+
+
+async def _call_api_with_json_retry_async(config: dict, prompt: str, api_key: str, api_type: str,
+                                          stage: str, template_name: str, call_info: dict) -> tuple:
+    engine = get_engine(config)
     max_json_retries = config.get("json_retry", 2)
     json_retry_prefix = config.get("json_retry_prefix",
         "前回の応答がJSON形式ではありませんでした。必ず以下の形式で、JSONのみを返してください。説明文は不要です。")
 
+    # LLM応答キャッシュ（stage 未指定時は off）
+    cache_policy = get_stage_policy(config, stage) if stage else CACHE_POLICY_OFF
+    cache = get_response_cache(config, BASE_DIR) if cache_policy != CACHE_POLICY_OFF else None
+    model, temperature = get_model_params(config, api_type)
+    # status: off / miss / hit (read_through), bypass / recorded (record_only)
+    if cache is None:
+        cache_status = "off"
+    elif cache_policy == CACHE_POLICY_READ_THROUGH:
+        cache_status = "miss"
+    else:
+        cache_status = "bypass"
+    cache_info = {"policy": cache_policy, "status": cache_status, "key": None}
+    if call_info is not None:
+        call_info["cache"] = cache_info
+
+    # ヘッジ（hedging.stages に含まれるステージのみ）
+    hedge_policy = get_hedge_policy(config)
+    hedge_info = {"enabled": hedge_policy.applies_to(stage), "hedged": False, "hedges": 0, "hedge_wins": 0,
+                  "delay_ms": None}
+    if call_info is not None:
+        call_info["hedge"] = hedge_info
+
+    flight = get_single_flight(config, BASE_DIR)
+    api_func = call_openai_api if api_type == "openai" else call_anthropic_api
     extracted_text = None
 
     for attempt in range(max_json_retries + 1):
-        if api_type == "openai":
-            raw_response = call_openai_api(config, prompt, api_key)
-        else:
-            raw_response = call_anthropic_api(config, prompt, api_key)
-
-        if raw_response is None:
-            print("API呼び出しが失敗しました")
-            return None, None, None
+        with span("json_attempt", attempt=attempt) as attempt_info:
+            cache_key = None
+            raw_response = None
+            if cache is not None:
+                cache_key = make_cache_key(model, template_name, prompt, temperature)
+                cache_info["key"] = cache_key
+                if cache_policy == CACHE_POLICY_READ_THROUGH:
+                    raw_response = cache.get(cache_key)
+                    if raw_response is not None:
+                        cache_info["status"] = "hit"
+                        print(f"応答キャッシュヒット (stage={stage}, key={cache_key[:12]})")
+
+            if raw_response is None:
+                async def fetch():
+                    if not hedge_policy.applies_to(stage):
+                        return await engine.run_blocking(api_func, config, prompt, api_key)
+                    # 直近レイテンシの閾値を過ぎたら複製を送り、先に返った方を採用する
+                    response, hedge_result = await run_hedged(
+                        hedge_policy, (api_type, stage),
+                        lambda cancel_event: engine.run_concurrent(
+                            api_func, config, prompt, api_key, cancel_event=cancel_event))
+                    attempt_info["hedged"] = hedge_result["hedged"]
+                    if hedge_result["hedged"]:
+                        hedge_info["hedged"] = True
+                        hedge_info["hedges"] += 1
+                        hedge_info["delay_ms"] = hedge_result["delay_ms"]
+                        if hedge_result["winner"] == "hedge":
+                            hedge_info["hedge_wins"] += 1
+                    return response
+
+                flight_key = make_cache_key(f"{api_type}/{model}", template_name, prompt, temperature)
+                raw_response, flight_role = await flight.run(flight_key, fetch)
+                attempt_info["single_flight"] = flight_role
+                if call_info is not None:
+                    call_info["single_flight"] = flight_role
+
+                if raw_response is None:
+                    print("API呼び出しが失敗しました")
+                    return None, None, None
+
+                parsed, extracted_text = parse_json_strict(raw_response)
+                # JSONとして解釈できた応答のみキャッシュに記録する
+                if parsed is not None and cache is not None:
+                    cache.put(cache_key, raw_response, {
+                        "model": model,
+                        "template_name": template_name,
+                        "temperature": temperature,
+                        "stage": stage
+                    })
+                    if cache_policy == CACHE_POLICY_RECORD_ONLY:
+                        cache_info["status"] = "recorded"
+            else:
+                attempt_info["cache"] = "hit"
+                parsed, extracted_text = parse_json_strict(raw_response)
 
-        parsed, extracted_text = parse_json_strict(raw_response)
-        if parsed is not None:
-            return raw_response, parsed, extracted_text
+            attempt_info["parsed"] = parsed is not None
+            if parsed is not None:
+                return raw_response, parsed, extracted_text
 
-        if attempt < max_json_retries:
-            print(f"JSONパース失敗。再プロンプトでリトライ {attempt + 1}/{max_json_retries}")
-            prompt = f"""{json_retry_prefix}
+            if attempt < max_json_retries:
+                print(f"JSONパース失敗。再プロンプトでリトライ {attempt + 1}/{max_json_retries}")
+                prompt = f"""{json_retry_prefix}
 
 {prompt}"""
 
@@ -294,6 +548,55 @@ def call_api_with_json_retry(config: dict, prompt: str, api_key: str, api_type:
     return raw_response, None, extracted_text
 
 
+def call_api_with_json_retry(config: dict, prompt: str, api_key: str, api_type: str,
+                             stage: str = None, template_name: str = None, call_info: dict = None) -> tuple:
+    """APIを呼び出し、JSONパースに失敗したらリトライする
+
+    引数は call_api_with_json_retry_async と同じ（stage / template_name を渡さないと応答キャッシュ・ヘッジは使わない）
+
+    Returns:
+        tuple: (raw_response, parsed_dict, extracted_text)。サーキットブレーカーが open の場合は (None, None, None)
+    """
+    try:
+        return get_engine(config).run_sync(
+            call_api_with_json_retry_async(config, prompt, api_key, api_type, stage, template_name, call_info)
+        )
+    except CircuitOpenError as e:
+        print(e)
+        return None, None, None
+
+
+def discard_cached_response(prompt_info: dict) -> None:
+    """ステージの応答を応答キャッシュから削除する（deny されたコマンドを含む final を再び返さないため）"""
+    cache_info = (prompt_info or {}).get("cache") or {}
+    cache = peek_response_cache()
+    if cache is None or not cache_info.get("key"):
+        return
+    if cache.discard(cache_info["key"]):
+        cache_info["status"] = "discarded"
+        print(f"応答キャッシュから削除 (key={cache_info['key'][:12]}): deny されたコマンドを含むため")
+
+
+def build_models_used(config: dict, prompts_used: dict = None) -> dict:
+    """ステージごとの使用モデル（ルーターが選んだモデルがあればそれを優先する）"""
+    models_used = {
+        "draft": config.get("openai_model"),
+        "review": config.get("anthropic_model"),
+        "final": config.get("openai_model")
+    }
+    for stage, info in (prompts_used or {}).items():
+        routing = (info or {}).get("routing") if isinstance(info, dict) else None
+        if routing and routing.get("model"):
+            models_used[stage] = routing["model"]
+    return models_used
+
+
+def get_job_payload_blob_dir(config: dict) -> Path:
+    """job_payload のブロブを保存するディレクトリを取得"""
+    settings = config.get("job_payload_store", {})
+    return BASE_DIR / (settings.get("dir") or f"{config['workspace_dir']}/artifacts/payloads")
+
+
 def build_step_log_data(
     phase: str,
     step_num: int,
@@ -333,17 +636,28 @@ def build_step_log_data(
 
     全てのキーを必ず含め、欠損キーを防ぐ
     """
-    # 21-23: job_payload を sanitize (最大2000文字) + present/size を計算
+    # 21-23: job_payload を sanitize + present/size を計算
+    # JSON 化は PayloadMemo で1回だけ行い、job_payload_store 有効時は内容アドレスのブロブに1度だけ保存して
+    # ステップログには参照 (job_payload_ref) と短いプレビューだけを載せる
     sanitized_job_payload = None
     job_payload_present = job_payload is not None
     job_payload_size = 0
-    if job_payload is not None:
-        payload_str = json.dumps(job_payload, ensure_ascii=False)
-        job_payload_size = len(payload_str)
-        if len(payload_str) > 2000:
-            sanitized_job_payload = payload_str[:2000] + "...(truncated)"
-        else:
-            sanitized_job_payload = payload_str
+    job_payload_ref = None
+    memo = get_payload_memo(job_payload)
+    if memo is not None:
+        memo.use()
+        job_payload_size = memo.size
+        inline_max_chars = DEFAULT_INLINE_MAX_CHARS
+        store_settings = config.get("job_payload_store", {})
+        if store_settings.get("enabled", True):
+            try:
+                memo.store(get_job_payload_blob_dir(config))
+                job_payload_ref = memo.ref
+                inline_max_chars = store_settings.get("inline_max_chars", DEFAULT_INLINE_MAX_CHARS)
+            except OSError as e:
+                # ブロブが書けない場合は従来どおり最大2000文字をステップログに載せる
+                print(f"job_payload ブロブ保存エラー: {e}")
+        sanitized_job_payload = memo.preview(inline_max_chars)
 
     return {
         "phase": phase,
@@ -362,13 +676,10 @@ def build_step_log_data(
         "job_payload": sanitized_job_payload,
         "job_payload_present": job_payload_present,
         "job_payload_size": job_payload_size,
+        "job_payload_ref": job_payload_ref,
         "job_result_written": job_result_written,
         "job_result_path": job_result_path,
-        "models_used": models_used or {
-            "draft": config.get("openai_model"),
-            "review": config.get("anthropic_model"),
-            "final": config.get("openai_model")
-        },
+        "models_used": models_used or build_models_used(config, prompts_used),
         "prompts_used": prompts_used,
         "final_commands": final_commands,
         "allowlist_summary": allowlist_summary,
@@ -388,15 +699,56 @@ def build_step_log_data(
     }
 
 
+def get_step_log_backend(config: dict) -> str:
+    """ステップログの保存形式 (files / journal) を取得"""
+    return config.get("step_log", {}).get("backend", "files")
+
+
+def get_step_journal_for(config: dict) -> StepJournal:
+    """設定に対応するステップジャーナルを取得"""
+    settings = config.get("step_log", {})
+    journal_dir = settings.get("journal_dir") or f"{config['logs_dir']}/journal"
+    return get_step_journal(
+        BASE_DIR / journal_dir,
+        settings.get("segment_max_bytes", DEFAULT_SEGMENT_MAX_BYTES)
+    )
+
+
 def step_log_exists(config: dict, step_num: int) -> bool:
-    """ステップログが存在するか確認する"""
+    """ステップログが存在するか確認する
+
+    files 形式は step_NNN.json の有無（job_index を含まないファイル名）で判定する。
+    journal 形式も同じ結果になるよう、job_index を問わず step_num の索引のみで判定する
+    """
+    if get_step_log_backend(config) == "journal":
+        return get_step_journal_for(config).has_step(step_num)
+
     logs_dir = BASE_DIR / config["logs_dir"] / "steps"
     log_file = logs_dir / f"step_{step_num:03d}.json"
     return log_file.exists()
 
 
-def write_step_log(config: dict, step_num: int, data: dict) -> Path:
-    """ステップログを書き込む"""
+def read_step_log(config: dict, step_num: int, job_index: int = None) -> dict:
+    """ステップログを1件読み込む。存在しなければ None"""
+    if get_step_log_backend(config) == "journal":
+        return get_step_journal_for(config).read(job_index, step_num)
+
+    log_file = BASE_DIR / config["logs_dir"] / "steps" / f"step_{step_num:03d}.json"
+    if not log_file.exists():
+        return None
+    return load_file(log_file)
+
+
+def write_step_log(config: dict, step_num: int, data: dict, fsync: bool = False) -> Path:
+    """ステップログを書き込む
+
+    step_NNN.json の形式（compact / pretty）は serialization 設定に従う。
+    一時ファイル + os.replace で書くため、step_NNN.json があれば中身は書き終わっている。
+    journal 形式では step_NNN.json を作らず、セグメントファイルに追記する
+
+    Args:
+        fsync: ファイル（journal 形式ではセグメントと索引）を fsync してから戻る
+    """
     logs_dir = BASE_DIR / config["logs_dir"] / "steps"
     log_file = logs_dir / f"step_{step_num:03d}.json"
 
@@ -406,47 +758,199 @@ def write_step_log(config: dict, step_num: int, data: dict) -> Path:
     if "step_num" not in data:
         data["step_num"] = step_num
 
-    with open(log_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    if get_step_log_backend(config) == "journal":
+        journal = get_step_journal_for(config)
+        job_index = data.get("job_index")
+        segment_file = journal.append(job_index, step_num, data, fsync=fsync)
+        segment, offset, length = journal.location(job_index, step_num)
+        print(f"ステップログ出力: {segment_file} (job_index={job_index}, step={step_num})")
+        update_phase_aggregate(config, journal_record_name(job_index, step_num), data,
+                               size=length, location=[segment, offset])
+        return segment_file
+
+    tmp_file = log_file.with_name(f"{log_file.name}.{os.getpid()}.tmp")
+    get_serializer(config, "step_log").write(tmp_file, data, fsync=fsync)
+    os.replace(tmp_file, log_file)
+    if fsync:
+        fsync_dir(logs_dir)
 
     print(f"ステップログ出力: {log_file}")
+    st = log_file.stat()
+    update_phase_aggregate(config, log_file.name, data, size=st.st_size, mtime_ns=st.st_mtime_ns)
     return log_file
 
 
-def make_draft(config: dict, step_num: int, context: dict, openai_key: str, job_payload: dict = None) -> tuple:
-    """ChatGPT APIでドラフト生成
+def get_phase_aggregate_path(config: dict) -> Path:
+    """phase_summary 集計サイドカーのパスを取得"""
+    return BASE_DIR / config["logs_dir"] / "phase_aggregate.json"
+
+
+def update_phase_aggregate(config: dict, name: str, data: dict, size: int = None,
+                           mtime_ns: int = None, location: list = None) -> None:
+    """書き込んだステップログ1件を集計サイドカーに反映する"""
+    aggregate_file = get_phase_aggregate_path(config)
+    try:
+        aggregate = PhaseAggregate.load(aggregate_file) or PhaseAggregate()
+        aggregate.apply(name, data, size=size, mtime_ns=mtime_ns, location=location)
+        aggregate.save(aggregate_file)
+    except Exception as e:
+        # サイドカーは write_phase_summary 時に突き合わせて復旧できるため処理は継続する
+        print(f"集計サイドカー更新エラー: {e}")
+
+
+def load_phase_aggregate(config: dict) -> PhaseAggregate:
+    """集計サイドカーを読み込み、ステップログ（ファイル名一覧 or ジャーナル索引）と突き合わせる"""
+    aggregate_file = get_phase_aggregate_path(config)
+    aggregate = PhaseAggregate.load(aggregate_file)
+    if aggregate is None:
+        return rebuild_phase_aggregate(config, verbose=False)
+
+    if get_step_log_backend(config) == "journal":
+        changed = aggregate.reconcile_journal(get_step_journal_for(config))
+    else:
+        changed = aggregate.reconcile(BASE_DIR / config["logs_dir"] / "steps")
+    if changed:
+        aggregate.save(aggregate_file)
+    return aggregate
+
+
+def rebuild_phase_aggregate(config: dict, verbose: bool = True) -> PhaseAggregate:
+    """ステップログから集計サイドカーを再生成する（復旧用）"""
+    aggregate_file = get_phase_aggregate_path(config)
+    if get_step_log_backend(config) == "journal":
+        aggregate = PhaseAggregate.rebuild_from_journal(get_step_journal_for(config))
+    else:
+        aggregate = PhaseAggregate.rebuild(BASE_DIR / config["logs_dir"] / "steps")
+    aggregate.save(aggregate_file)
+    if verbose:
+        print(f"集計サイドカー再生成: {aggregate_file} ({len(aggregate.records)} steps)")
+    return aggregate
+
+
+def export_step_journal(config: dict, out_dir: str = None, job_index: int = None) -> list:
+    """ステップジャーナルを従来形式の step_NNN.json に書き出す"""
+    steps_dir = Path(out_dir) if out_dir else BASE_DIR / config["logs_dir"] / "steps"
+    written = get_step_journal_for(config).export(steps_dir, job_index)
+    print(f"ステップジャーナル書き出し: {steps_dir} ({len(written)} files)")
+    return written
+
+
+async def call_stage_async(config: dict, stage: str, template_name: str, render, default_provider: str,
+                           api_key: str, prompt_info: dict) -> tuple:
+    """ステージの API 呼び出しをプロバイダルーター経由で行う
+
+    render(template) で選ばれたプロバイダ用のプロンプトを作り、call_api_with_json_retry_async を呼ぶ。
+    API 呼び出し失敗・JSON パース失敗・サーキットブレーカーが open の場合は次のプロバイダへフェイルオーバーする。
+    実際に使ったプロバイダとモデルは prompt_info["routing"] に記録する
 
     Returns:
-        tuple: (raw_response, parsed_json, prompt_info)
+        tuple: (raw_response, parsed_json, extracted_text)
     """
-    print(f"ドラフト生成開始 (step={step_num})")
+    router = get_provider_router(config)
+    openai_key, anthropic_key = get_api_keys()
+    api_keys = {"openai": openai_key, "anthropic": anthropic_key}
+    api_keys[default_provider] = api_key or api_keys.get(default_provider)
+    providers = [p for p in router.order(stage, default_provider) if api_keys.get(p)] or [default_provider]
+
+    failover = []
+    raw = parsed = extracted = None
+    for index, provider in enumerate(providers):
+        if index > 0:
+            router.count_failover()
+            print(f"{stage}: {providers[index - 1]} が失敗したため {provider} にフェイルオーバーします")
+        prompt = render(router.template_for(config, template_name, provider))
+        prompt_info["prompt"] = sanitize_for_log(prompt, 300)
+        prompt_info["prompt_length"] = len(prompt)
+        model, _ = get_model_params(config, provider)
+        prompt_info["routing"] = {"provider": provider, "model": model, "failover": failover}
+
+        started = time.perf_counter()
+        try:
+            raw, parsed, extracted = await call_api_with_json_retry_async(
+                config, prompt, api_keys[provider], provider,
+                stage=stage, template_name=template_name, call_info=prompt_info)
+        except CircuitOpenError as e:
+            # 呼び出していないためルーターのレイテンシ・エラー率には反映しない
+            print(f"{stage}: {e}")
+            raw = parsed = extracted = None
+            failover.append({
+                "provider": provider,
+                "model": model,
+                "error": "circuit_open",
+                "retry_in_sec": round(e.retry_in_sec, 3)
+            })
+            continue
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        # 応答キャッシュのヒットや single_flight の待ち合わせはプロバイダのレイテンシではないため、
+        # 実際に API を呼んだ場合のみルーターに反映する
+        if (prompt_info.get("timing") or {}).get("api_attempts"):
+            router.record(provider, elapsed_ms, parsed is not None)
+        if parsed is not None:
+            break
+        failover.append({
+            "provider": provider,
+            "model": model,
+            "error": "api_failure" if raw is None else "json_parse_failure",
+            "elapsed_ms": round(elapsed_ms, 3)
+        })
+    return raw, parsed, extracted
 
-    template_name = "draft_prompt_template"
-    template = config.get(template_name, "")
 
-    # テンプレート変数を置換
-    history_json = json.dumps(context.get("history", []), ensure_ascii=False)
-    prompt = template.replace("{step_num}", str(step_num))
-    prompt = prompt.replace("{history_json}", history_json)
+def describe_stage_failure(stage: str, prompt_info: dict) -> str:
+    """ステージ失敗時の end_reason
 
-    # KE: job_payload を渡す
-    job_payload_json = json.dumps(job_payload, ensure_ascii=False) if job_payload else "null"
-    prompt = prompt.replace("{job_payload_json}", job_payload_json)
+    試したプロバイダがすべてサーキットブレーカーで止められた場合は circuit_open と明示する
+    """
+    failover = ((prompt_info or {}).get("routing") or {}).get("failover") or []
+    if failover and all(entry.get("error") == "circuit_open" for entry in failover):
+        providers = ", ".join(entry["provider"] for entry in failover)
+        return f"circuit_open: {providers} ({stage}生成失敗)"
+    return f"fatal_error: {stage}生成失敗"
 
-    prompt_info = {
-        "template_name": template_name,
-        "prompt": sanitize_for_log(prompt, 300),
-        "prompt_length": len(prompt)
-    }
 
-    raw, parsed, extracted = call_api_with_json_retry(config, prompt, openai_key, "openai")
+async def make_draft_async(config: dict, step_num: int, context: dict, openai_key: str, job_payload: dict = None) -> tuple:
+    """ChatGPT APIでドラフト生成（非同期版）
+
+    provider_routing が有効な場合は、ルーターが選んだプロバイダで生成する
+
+    Returns:
+        tuple: (raw_response, parsed_json, prompt_info)
+    """
+    print(f"ドラフト生成開始 (step={step_num})")
+
+    template_name = "draft_prompt_template"
+
+    # テンプレート変数（履歴は直近 K ステップ + 古いステップの要約を予算内に収める）
+    history = context.get("history")
+    if isinstance(history, HistoryManager):
+        history_json, history_stats = history.render()
+    else:
+        history_json, history_stats = json.dumps(history or [], ensure_ascii=False), None
+    # KE: job_payload を渡す（JSON 化は PayloadMemo のものを使い回す）
+    job_payload_json = "null"
+    if job_payload:
+        memo = get_payload_memo(job_payload)
+        memo.use()
+        job_payload_json = memo.prompt_json
+
+    def render(template: str) -> str:
+        prompt = template.replace("{step_num}", str(step_num))
+        prompt = prompt.replace("{history_json}", history_json)
+        return prompt.replace("{job_payload_json}", job_payload_json)
+
+    prompt_info = {"template_name": template_name}
+    if history_stats is not None:
+        prompt_info["history"] = history_stats
+
+    raw, parsed, extracted = await call_stage_async(
+        config, "draft", template_name, render, "openai", openai_key, prompt_info)
     if parsed is None and extracted:
         prompt_info["extracted_text"] = sanitize_for_log(extracted, 300)
     return raw, parsed, prompt_info
 
 
-def review_plus(config: dict, step_num: int, draft: dict, context: dict, anthropic_key: str) -> tuple:
-    """Claude APIでレビューと改善
+async def review_plus_async(config: dict, step_num: int, draft: dict, context: dict, anthropic_key: str) -> tuple:
+    """Claude APIでレビューと改善（非同期版）
 
     Returns:
         tuple: (raw_response, parsed_json, prompt_info)
@@ -454,27 +958,25 @@ def review_plus(config: dict, step_num: int, draft: dict, context: dict, anthrop
     print(f"レビュー開始 (step={step_num})")
 
     template_name = "review_prompt_template"
-    template = config.get(template_name, "")
 
-    # テンプレート変数を置換
+    # テンプレート変数
     draft_json = json.dumps(draft, ensure_ascii=False, indent=2)
-    prompt = template.replace("{step_num}", str(step_num))
-    prompt = prompt.replace("{draft_json}", draft_json)
 
-    prompt_info = {
-        "template_name": template_name,
-        "prompt": sanitize_for_log(prompt, 300),
-        "prompt_length": len(prompt)
-    }
+    def render(template: str) -> str:
+        prompt = template.replace("{step_num}", str(step_num))
+        return prompt.replace("{draft_json}", draft_json)
+
+    prompt_info = {"template_name": template_name}
 
-    raw, parsed, extracted = call_api_with_json_retry(config, prompt, anthropic_key, "anthropic")
+    raw, parsed, extracted = await call_stage_async(
+        config, "review", template_name, render, "anthropic", anthropic_key, prompt_info)
     if parsed is None and extracted:
         prompt_info["extracted_text"] = sanitize_for_log(extracted, 300)
     return raw, parsed, prompt_info
 
 
-def make_final(config: dict, step_num: int, draft: dict, review: dict, openai_key: str) -> tuple:
-    """ChatGPT APIで最終決定
+async def make_final_async(config: dict, step_num: int, draft: dict, review: dict, openai_key: str) -> tuple:
+    """ChatGPT APIで最終決定（非同期版）
 
     Returns:
         tuple: (raw_response, parsed_json, prompt_info)
@@ -482,57 +984,68 @@ def make_final(config: dict, step_num: int, draft: dict, review: dict, openai_ke
     print(f"最終決定開始 (step={step_num})")
 
     template_name = "final_prompt_template"
-    template = config.get(template_name, "")
 
-    # テンプレート変数を置換
+    # テンプレート変数
     draft_json = json.dumps(draft, ensure_ascii=False, indent=2)
     review_json = json.dumps(review, ensure_ascii=False, indent=2)
-    prompt = template.replace("{step_num}", str(step_num))
-    prompt = prompt.replace("{draft_json}", draft_json)
-    prompt = prompt.replace("{review_json}", review_json)
-
-    prompt_info = {
-        "template_name": template_name,
-        "prompt": sanitize_for_log(prompt, 300),
-        "prompt_length": len(prompt)
-    }
 
-    raw, parsed, extracted = call_api_with_json_retry(config, prompt, openai_key, "openai")
+    def render(template: str) -> str:
+        prompt = template.replace("{step_num}", str(step_num))
+        prompt = prompt.replace("{draft_json}", draft_json)
+        return prompt.replace("{review_json}", review_json)
+
+    prompt_info = {"template_name": template_name}
+
+    raw, parsed, extracted = await call_stage_async(
+        config, "final", template_name, render, "openai", openai_key, prompt_info)
     if parsed is None and extracted:
         prompt_info["extracted_text"] = sanitize_for_log(extracted, 300)
     return raw, parsed, prompt_info
 
 
-def check_allowlist(config: dict, cmd_type: str, code: str) -> tuple:
-    """コマンドがallowlistを通過するか判定する
+def make_draft(config: dict, step_num: int, context: dict, openai_key: str, job_payload: dict = None) -> tuple:
+    """ChatGPT APIでドラフト生成
 
     Returns:
-        tuple: (allowed: bool, reason: str, matched: str or None)
+        tuple: (raw_response, parsed_json, prompt_info)
     """
-    # 0. execution_policy チェック
-    exec_policy = config.get("execution_policy", {})
-    default_action = exec_policy.get("default_action", "allow")
+    return get_engine(config).run_sync(
+        make_draft_async(config, step_num, context, openai_key, job_payload)
+    )
 
-    if default_action == "deny":
-        return False, "execution_policy.default_action=deny", None
 
-    deny_if_contains = exec_policy.get("deny_if_contains", [])
-    for keyword in deny_if_contains:
-        if keyword in code:
-            return False, f"deny_if_contains '{keyword}' に一致", keyword
+def review_plus(config: dict, step_num: int, draft: dict, context: dict, anthropic_key: str) -> tuple:
+    """Claude APIでレビューと改善
 
-    # 1. type チェック
-    allow_types = config.get("allow_types", ["powershell"])
-    if cmd_type not in allow_types:
-        return False, f"type '{cmd_type}' は許可されていない (allow_types: {allow_types})", None
+    Returns:
+        tuple: (raw_response, parsed_json, prompt_info)
+    """
+    return get_engine(config).run_sync(
+        review_plus_async(config, step_num, draft, context, anthropic_key)
+    )
 
-    # 2. deny_patterns チェック
-    deny_patterns = config.get("deny_patterns", [])
-    for pattern in deny_patterns:
-        if re.search(pattern, code, re.IGNORECASE):
-            return False, f"禁止パターン '{pattern}' に一致", pattern
 
-    return True, "allowlist通過", None
+def make_final(config: dict, step_num: int, draft: dict, review: dict, openai_key: str) -> tuple:
+    """ChatGPT APIで最終決定
+
+    Returns:
+        tuple: (raw_response, parsed_json, prompt_info)
+    """
+    return get_engine(config).run_sync(
+        make_final_async(config, step_num, draft, review, openai_key)
+    )
+
+
+def check_allowlist(config: dict, cmd_type: str, code: str) -> tuple:
+    """コマンドがallowlistを通過するか判定する
+
+    判定は config から一度だけ構築した ExecutionPolicy に委譲する。
+    同一コマンドの判定結果は pre_check_commands / run_commands 間で共有される
+
+    Returns:
+        tuple: (allowed: bool, reason: str, matched: str or None)
+    """
+    return get_execution_policy(config).check(cmd_type, code)
 
 
 def pre_check_commands(config: dict, commands: list) -> dict:
@@ -588,10 +1101,178 @@ def pre_check_commands(config: dict, commands: list) -> dict:
     }
 
 
+def get_shell_host_settings(config: dict) -> dict:
+    """shell_host 設定（enabled / scope）を返す"""
+    settings = config.get("shell_host", {})
+    return {
+        "enabled": settings.get("enabled", False),
+        "scope": settings.get("scope", "step")
+    }
+
+
+def close_shell_hosts() -> None:
+    """起動済みの常駐シェルホストをすべて終了する"""
+    pool = peek_shell_host_pool()
+    if pool is not None:
+        pool.close_all()
+
+
+def close_async_engine() -> None:
+    """AsyncEngine の executor とイベントループを解放する"""
+    engine = peek_engine()
+    if engine is not None:
+        engine.shutdown()
+
+
+def get_command_cwd(config: dict) -> Path:
+    """コマンドの作業ディレクトリ
+
+    通常は BASE_DIR。並列ジョブではジョブディレクトリ（build_job_config が command_cwd を設定）になり、
+    コマンド中の相対パス workspace/... がジョブ専用の workspace を指す
+    """
+    return BASE_DIR / config.get("command_cwd", ".")
+
+
+def run_shell_subprocess(cmd_type: str, code: str, timeout_sec: int, stdout, stderr, cwd: Path = BASE_DIR) -> int:
+    """コマンドごとにインタプリタを起動して実行する（従来方式）。終了コードを返す"""
+    if cmd_type == "sh":
+        argv = ["sh", "-c", code]
+    else:
+        argv = ["powershell", "-Command", code]
+    return run_captured(argv, timeout_sec, stdout, stderr, cwd=str(cwd))
+
+
+def run_shell_host(cmd_type: str, code: str, timeout_sec: int, stdout, stderr, cwd: Path = BASE_DIR) -> int:
+    """常駐シェルホストで実行する（タイムアウト時はホストを終了して TimeoutExpired を送出）"""
+    pool = get_shell_host_pool(cwd=str(cwd))
+    host = pool.acquire(backend_for_type(cmd_type))
+    try:
+        host_result = host.run(code, timeout_sec, stdout, stderr)
+    finally:
+        pool.release(host)
+    if host_result.timed_out:
+        raise subprocess.TimeoutExpired(cmd_type, timeout_sec)
+    if host_result.host_exited:
+        print(f"シェルホストがコマンド実行中に終了しました (rc={host_result.returncode})。次回再起動します")
+    return host_result.returncode
+
+
+def describe_capture(stream: str, capture) -> dict:
+    """command_results に記録するキャプチャ情報（バイト数・省略有無・退避先）"""
+    info = {
+        f"{stream}_bytes": capture.total_bytes,
+        f"{stream}_truncated": capture.truncated
+    }
+    if capture.spilled:
+        try:
+            info[f"{stream}_spill_path"] = str(capture.spill_path.relative_to(BASE_DIR))
+        except ValueError:
+            info[f"{stream}_spill_path"] = str(capture.spill_path)
+    return info
+
+
+def execute_command(config: dict, cmd_type: str, code: str, reason: str) -> tuple:
+    """許可済みのコマンドを1件実行する
+
+    shell_host.enabled=true の場合は常駐シェルホストに流し、インタプリタ起動を省く
+    stdout/stderr は command_capture の範囲（既定は先頭 1000 文字）のみ保持する（全量は任意で workspace/results へ退避）
+
+    Returns:
+        tuple: (result: dict or None, outcome: "executed" / "timeout" / "failed" or None)
+               実行対象外の type は (None, None)
+    """
+    timeout_sec = config.get("timeout_sec", 120)
+
+    if cmd_type not in SHELL_COMMAND_TYPES:
+        return None, None
+
+    label = "PowerShell" if cmd_type == "powershell" else "sh"
+    use_host = get_shell_host_settings(config)["enabled"]
+    stdout, stderr = CaptureSettings.from_config(config, BASE_DIR).new_pair()
+    started = time.perf_counter()
+
+    try:
+        if use_host:
+            returncode = run_shell_host(cmd_type, code, timeout_sec, stdout, stderr, cwd=get_command_cwd(config))
+        else:
+            returncode = run_shell_subprocess(cmd_type, code, timeout_sec, stdout, stderr,
+                                              cwd=get_command_cwd(config))
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        print(f"{label}実行完了 (rc={returncode}, {duration_ms:.0f}ms)")
+        result = {
+            "type": cmd_type,
+            "code": code[:500] + "..." if len(code) > 500 else code,
+            "allowed": True,
+            "allow_reason": reason,
+            "executed": True,
+            "returncode": returncode,
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "timeout": False,
+            "duration_ms": duration_ms
+        }
+        result.update(describe_capture("stdout", stdout))
+        result.update(describe_capture("stderr", stderr))
+        return result, "executed"
+    except subprocess.TimeoutExpired:
+        print(f"{label}タイムアウト ({timeout_sec}秒)")
+        return {
+            "type": cmd_type,
+            "code": code[:500] + "..." if len(code) > 500 else code,
+            "allowed": True,
+            "allow_reason": reason,
+            "executed": True,
+            "timeout": True,
+            "error": f"タイムアウト ({timeout_sec}秒)",
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+        }, "timeout"
+    except Exception as e:
+        print(f"{label}実行失敗: {e}")
+        return {
+            "type": cmd_type,
+            "code": code[:500] + "..." if len(code) > 500 else code,
+            "allowed": True,
+            "allow_reason": reason,
+            "executed": False,
+            "error": str(e)
+        }, "failed"
+
+
+def build_denied_result(cmd_type: str, code: str, reason: str, matched_pattern: str) -> dict:
+    """deny されたコマンドの command_results 要素を作る"""
+    return {
+        "type": cmd_type,
+        "code": code[:200] + "..." if len(code) > 200 else code,
+        "allowed": False,
+        "deny_reason": reason,
+        "matched_pattern": matched_pattern,
+        "executed": False
+    }
+
+
 def run_commands(config: dict, commands: list, python_path: str) -> dict:
-    """コマンドを実行（allowlist判定付き）"""
+    """コマンドを実行（allowlist判定付き）
+
+    command_executor.mode=parallel の場合は run_commands_parallel で並行実行する
+    shell_host.scope=step の場合はステップ終了時に常駐シェルホストを終了する
+    """
+    executor_settings = config.get("command_executor", {})
+    started = time.perf_counter()
+    try:
+        if executor_settings.get("mode", "sequential") == "parallel" and len(commands) > 1:
+            exec_result = run_commands_parallel(config, commands, python_path)
+        else:
+            exec_result = run_commands_sequential(config, commands, python_path)
+        exec_result["timing"] = {"total_ms": round((time.perf_counter() - started) * 1000, 3)}
+        return exec_result
+    finally:
+        if get_shell_host_settings(config)["scope"] == "step":
+            close_shell_hosts()
+
+
+def run_commands_sequential(config: dict, commands: list, python_path: str) -> dict:
+    """コマンドを1件ずつ順に実行する（allowlist判定付き）"""
     results = []
-    timeout_sec = config.get("timeout_sec", 120)
 
     # execution_summary counters
     executed_count = 0
@@ -609,63 +1290,21 @@ def run_commands(config: dict, commands: list, python_path: str) -> dict:
         if not allowed:
             print(f"コマンド拒否: {reason}")
             denied_count += 1
-            results.append({
-                "type": cmd_type,
-                "code": code[:200] + "..." if len(code) > 200 else code,
-                "allowed": False,
-                "deny_reason": reason,
-                "matched_pattern": matched_pattern,
-                "executed": False
-            })
+            results.append(build_denied_result(cmd_type, code, reason, matched_pattern))
             continue
 
         print(f"コマンド許可: {reason}")
 
-        if cmd_type == "powershell":
-            try:
-                result = subprocess.run(
-                    ["powershell", "-Command", code],
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout_sec,
-                    cwd=str(BASE_DIR)
-                )
-                executed_count += 1
-                results.append({
-                    "type": cmd_type,
-                    "code": code[:500] + "..." if len(code) > 500 else code,
-                    "allowed": True,
-                    "allow_reason": reason,
-                    "executed": True,
-                    "returncode": result.returncode,
-                    "stdout": result.stdout[:1000] if result.stdout else "",
-                    "stderr": result.stderr[:1000] if result.stderr else "",
-                    "timeout": False
-                })
-                print(f"PowerShell実行完了 (rc={result.returncode})")
-            except subprocess.TimeoutExpired:
-                timeout_count += 1
-                results.append({
-                    "type": cmd_type,
-                    "code": code[:500] + "..." if len(code) > 500 else code,
-                    "allowed": True,
-                    "allow_reason": reason,
-                    "executed": True,
-                    "timeout": True,
-                    "error": f"タイムアウト ({timeout_sec}秒)"
-                })
-                print(f"PowerShellタイムアウト ({timeout_sec}秒)")
-            except Exception as e:
-                failed_count += 1
-                results.append({
-                    "type": cmd_type,
-                    "code": code[:500] + "..." if len(code) > 500 else code,
-                    "allowed": True,
-                    "allow_reason": reason,
-                    "executed": False,
-                    "error": str(e)
-                })
-                print(f"PowerShell実行失敗: {e}")
+        result, outcome = execute_command(config, cmd_type, code, reason)
+        if result is None:
+            continue
+        results.append(result)
+        if outcome == "executed":
+            executed_count += 1
+        elif outcome == "timeout":
+            timeout_count += 1
+        elif outcome == "failed":
+            failed_count += 1
 
     return {
         "command_results": results,
@@ -678,48 +1317,122 @@ def run_commands(config: dict, commands: list, python_path: str) -> dict:
     }
 
 
-def evaluate_done_minimal(config: dict) -> bool:
-    """done判定（最小版）
+def run_commands_parallel(config: dict, commands: list, python_path: str) -> dict:
+    """コマンドを依存関係に従って並行実行する（allowlist判定付き）
 
-    条件:
-    - workspace/results/result_v2.txt が存在
-    - 「合計:」「平均:」「件数:」を全て含む
+    - 各コマンドの任意フィールド id / depends_on / parallel_group で依存関係を決める
+    - command_results の並びと execution_summary のカウンタは逐次実行と同じ規則
+    - parallel_group 内で失敗（rc!=0 / タイムアウト / 例外）したら、同グループの未開始コマンドは実行しない
     """
-    result_file = BASE_DIR / config["workspace_dir"] / "results" / "result_v2.txt"
+    executor_settings = config.get("command_executor", {})
+    max_workers = executor_settings.get("max_workers", DEFAULT_COMMAND_WORKERS)
 
-    if not result_file.exists():
-        print("done判定: result_v2.txt が存在しない")
-        return False
+    # allowlist判定は実行前にまとめて行う（判定結果は ExecutionPolicy にキャッシュされる）
+    verdicts = []
+    for cmd in commands:
+        cmd_type = cmd.get("type", "")
+        code = cmd.get("code", "")
+        allowed, reason, matched_pattern = check_allowlist(config, cmd_type, code)
+        if allowed:
+            print(f"コマンド許可: {reason}")
+        else:
+            print(f"コマンド拒否: {reason}")
+        verdicts.append((allowed, reason, matched_pattern))
 
-    try:
-        # PowerShellのOut-FileはUTF-16で出力することがあるため、複数のエンコードを試す
-        content = None
-        for encoding in ["utf-8", "utf-16", "utf-16-le", "cp932"]:
-            try:
-                with open(result_file, "r", encoding=encoding) as f:
-                    content = f.read()
-                break
-            except UnicodeDecodeError:
+    def _run(index: int) -> tuple:
+        cmd = commands[index]
+        cmd_type = cmd.get("type", "")
+        code = cmd.get("code", "")
+        allowed, reason, matched_pattern = verdicts[index]
+        if not allowed:
+            return (build_denied_result(cmd_type, code, reason, matched_pattern), "denied"), False
+
+        result, outcome = execute_command(config, cmd_type, code, reason)
+        failed = outcome in ("timeout", "failed") or (
+            outcome == "executed" and result.get("returncode") != 0)
+        return (result, outcome), failed
+
+    outcomes, skipped = run_dependency_graph(commands, _run, max_workers)
+
+    results = []
+    counters = {"executed": 0, "denied": 0, "timeout": 0, "failed": 0}
+    for index, cmd in enumerate(commands):
+        if index in skipped:
+            code = cmd.get("code", "")
+            allowed, reason, matched_pattern = verdicts[index]
+            if not allowed:
+                # deny されたコマンドは実行順に関係なく deny（逐次実行と同じカウンタにする）
+                results.append(build_denied_result(cmd.get("type", ""), code, reason, matched_pattern))
+                counters["denied"] += 1
                 continue
+            results.append({
+                "type": cmd.get("type", ""),
+                "code": code[:500] + "..." if len(code) > 500 else code,
+                "allowed": True,
+                "allow_reason": reason,
+                "executed": False,
+                "skipped": True,
+                "error": f"fail_fast: parallel_group '{skipped[index]}' 内のコマンドが失敗したため未実行"
+            })
+            continue
 
-        if content is None:
-            print("done判定: ファイルのエンコードを判別できませんでした")
-            return False
+        result, outcome = outcomes[index]
+        if result is None:
+            continue
+        results.append(result)
+        counters[outcome] += 1
 
-        required = ["合計:", "平均:", "件数:"]
-        missing = [r for r in required if r not in content]
+    return {
+        "command_results": results,
+        "execution_summary": {
+            "executed_count": counters["executed"],
+            "denied_count": counters["denied"],
+            "timeout_count": counters["timeout"],
+            "failed_count": counters["failed"]
+        }
+    }
 
-        if missing:
-            print(f"done判定: 必須キーワード不足 {missing}")
-            return False
 
-        print("done判定: 全条件クリア")
-        return True
+def get_default_done_checks(config: dict) -> list:
+    """done_conditions 未設定時の条件（result_v2.txt に合計/平均/件数を含む）"""
+    return [{
+        "glob": f"{config['workspace_dir']}/results/result_v2.txt",
+        "keywords": ["合計:", "平均:", "件数:"],
+        "description": "result_v2.txt"
+    }]
+
+
+def evaluate_done_conditions(config: dict):
+    """done_conditions を評価する（判定は DoneConditionEngine、結果は成果物の (size, mtime_ns) でキャッシュ）"""
+    engine = get_done_engine(
+        config,
+        BASE_DIR,
+        default_checks=get_default_done_checks(config),
+        default_reason=DEFAULT_DONE_REASON
+    )
+    return engine.evaluate()
 
+
+def evaluate_done_minimal(config: dict) -> bool:
+    """done判定（最小版）
+
+    条件は config の done_conditions（未設定時は get_default_done_checks）:
+    - workspace/results/result_v2.txt が存在
+    - 「合計:」「平均:」「件数:」を全て含む
+    """
+    try:
+        result = evaluate_done_conditions(config)
     except Exception as e:
         print(f"done判定エラー: {e}")
         return False
 
+    if not result.done:
+        print(f"done判定: {result.reason}")
+        return False
+
+    print("done判定: 全条件クリア")
+    return True
+
 
 def evaluate_phase_done(config: dict) -> dict:
     """フェーズ完了判定
@@ -742,7 +1455,7 @@ def evaluate_phase_done(config: dict) -> dict:
     if is_done:
         return {
             "done": True,
-            "done_reason": "workspace/results/result_v2.txt が存在し、合計/平均/件数の全キーワードを含む",
+            "done_reason": config.get("done_conditions", {}).get("done_reason", DEFAULT_DONE_REASON),
             "next_phase_name": "S-5",
             "next_phase_done_condition": "次のフェーズの完了条件（未定義）",
             "next_instruction_id": "指示書010",
@@ -780,7 +1493,7 @@ def sanitize_for_log(text: str, max_length: int = 2000) -> str:
 
 
 def write_job_result(config: dict, job_name: str, max_jobs: int, jobs_executed: int,
-                     end_reason: str, last_phase: str, last_step: int) -> Path:
+                     end_reason: str, last_phase: str, last_step: int, extra: dict = None) -> Path:
     """KH-KI: job_loop_complete 時に job_result.json を出力する
 
     Args:
@@ -791,6 +1504,7 @@ def write_job_result(config: dict, job_name: str, max_jobs: int, jobs_executed:
         end_reason: 終了理由
         last_phase: 最終フェーズ
         last_step: 最終ステップ
+        extra: 追加で出力する項目（並列ジョブ実行時の job_index / jobs など）
 
     Returns:
         Path: 出力ファイルのパス
@@ -811,14 +1525,73 @@ def write_job_result(config: dict, job_name: str, max_jobs: int, jobs_executed:
         "last_step": last_step,
         "timestamp": datetime.now().isoformat()
     }
+    if extra:
+        result.update(extra)
 
-    with open(result_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    get_serializer(config, "job_result").write(result_file, result)
 
     print(f"job_result 出力: {result_file}")
     return result_file
 
 
+def collect_runtime_stats() -> dict:
+    """実行基盤の統計情報を集める（生成済みのものだけ）"""
+    stats = {}
+    engine = peek_engine()
+    if engine is not None:
+        stats["async_engine"] = engine.summary()
+    registry = peek_client_registry()
+    if registry is not None:
+        stats["provider_clients"] = registry.stats()
+    cache = peek_response_cache()
+    if cache is not None:
+        stats["response_cache"] = cache.summary()
+    policy = peek_execution_policy()
+    if policy is not None:
+        stats["execution_policy"] = policy.summary()
+    done_engine = peek_done_engine()
+    if done_engine is not None:
+        stats["done_engine"] = done_engine.summary()
+    shell_pool = peek_shell_host_pool()
+    if shell_pool is not None:
+        stats["shell_host"] = shell_pool.summary()
+    retry_scheduler = peek_retry_scheduler()
+    if retry_scheduler is not None:
+        stats["api_retry"] = retry_scheduler.summary()
+    hedge_policy = peek_hedge_policy()
+    if hedge_policy is not None and hedge_policy.enabled:
+        stats["hedging"] = hedge_policy.summary()
+    router = peek_provider_router()
+    if router is not None and router.enabled:
+        stats["provider_routing"] = router.summary()
+    breakers = peek_circuit_breakers()
+    if breakers is not None and breakers.enabled:
+        stats["circuit_breaker"] = breakers.summary()
+    flight = peek_single_flight()
+    if flight is not None and flight.enabled:
+        stats["single_flight"] = flight.summary()
+    interpreter_cache = peek_interpreter_cache()
+    if interpreter_cache is not None:
+        stats["interpreter"] = interpreter_cache.summary()
+    phase_state_managers = peek_phase_state_managers()
+    if phase_state_managers:
+        stats["phase_state"] = {
+            os.path.relpath(path, BASE_DIR): manager.summary() for path, manager in phase_state_managers.items()
+        }
+    payload_memo = peek_payload_memo()
+    if payload_memo is not None:
+        stats["job_payload"] = payload_memo.summary()
+    serializers = peek_serializers()
+    if serializers:
+        stats["serializer"] = {name: serializer.summary() for name, serializer in serializers.items()}
+    step_wals = peek_step_wals()
+    if step_wals:
+        stats["step_wal"] = {
+            os.path.relpath(path, BASE_DIR): wal.summary() for path, wal in step_wals.items()
+        }
+    return stats
+
+
 def write_phase_summary(config: dict, skipped_steps: list = None, execution_summary: dict = None, end_reason: str = None, job_loop_info: dict = None, job_result_path: str = None, job_payload_present: bool = False, job_result_written: bool = False) -> Path:
     """全ステップのサマリをphase_summary.jsonに集約する
 
@@ -836,100 +1609,14 @@ def write_phase_summary(config: dict, skipped_steps: list = None, execution_summ
         Path: 出力ファイルのパス
     """
     logs_dir = BASE_DIR / config["logs_dir"]
-    steps_dir = logs_dir / "steps"
     summary_file = logs_dir / "phase_summary.json"
 
     # stop_on_deny設定を取得
     exec_policy = config.get("execution_policy", {})
     stop_on_deny = exec_policy.get("stop_on_deny", True)
 
-    # 全ステップログを読み込み
-    step_files = sorted(steps_dir.glob("step_*.json"))
-    steps = []
-    success_count = 0
-    fail_count = 0
-    denied_count = 0
-    fatal_error_count = 0
-    stopped_count = 0
-    denied_steps = []
-    fatal_error_steps = []
-    stopped_steps = []
-    final_done = False
-    final_phase_result = None
-
-    for step_file in step_files:
-        try:
-            with open(step_file, "r", encoding="utf-8") as f:
-                step_data = json.load(f)
-                step_info = {
-                    "step_num": step_data.get("step_num"),
-                    "phase": step_data.get("phase"),
-                    "done": step_data.get("done"),
-                    "done_reason": step_data.get("done_reason"),
-                    "timestamp": step_data.get("timestamp"),
-                    "error": step_data.get("error"),
-                    "message": step_data.get("message"),
-                    "stopped": step_data.get("stopped", False)
-                }
-                steps.append(step_info)
-
-                # stopped=trueの場合はstopped_stepsに追加（success_countには含めない）
-                if step_data.get("stopped"):
-                    stopped_count += 1
-                    stopped_steps.append({
-                        "step_num": step_data.get("step_num"),
-                        "phase": step_data.get("phase"),
-                        "reason": step_data.get("done_reason")
-                    })
-                    # denyやfatal_errorのカウントも行う
-                    if step_data.get("phase") == "deny":
-                        denied_count += 1
-                        denied_steps.append({
-                            "step_num": step_data.get("step_num"),
-                            "reason": step_data.get("done_reason"),
-                            "message": step_data.get("message")
-                        })
-                    elif step_data.get("phase") == "fatal_error":
-                        fatal_error_count += 1
-                        fatal_error_steps.append({
-                            "step_num": step_data.get("step_num"),
-                            "reason": step_data.get("done_reason"),
-                            "error": step_data.get("error")
-                        })
-                else:
-                    # 統計情報を集計（stopped=falseの場合のみ）
-                    if step_data.get("phase") == "error":
-                        fail_count += 1
-                    elif step_data.get("phase") == "deny":
-                        denied_count += 1
-                        denied_steps.append({
-                            "step_num": step_data.get("step_num"),
-                            "reason": step_data.get("done_reason"),
-                            "message": step_data.get("message")
-                        })
-                    elif step_data.get("phase") == "fatal_error":
-                        fatal_error_count += 1
-                        fatal_error_steps.append({
-                            "step_num": step_data.get("step_num"),
-                            "reason": step_data.get("done_reason"),
-                            "error": step_data.get("error")
-                        })
-                    elif step_data.get("phase") in ["execute", "done"]:
-                        success_count += 1
-
-                # 最終結果を記録
-                if step_data.get("done"):
-                    final_done = True
-                    final_phase_result = {
-                        "next_phase_name": step_data.get("next_phase_name"),
-                        "next_phase_done_condition": step_data.get("next_phase_done_condition"),
-                        "next_instruction_id": step_data.get("next_instruction_id"),
-                        "next_instruction_summary": step_data.get("next_instruction_summary"),
-                        "next_instruction_inputs": step_data.get("next_instruction_inputs"),
-                        "next_instruction_expected_outputs": step_data.get("next_instruction_expected_outputs")
-                    }
-        except Exception as e:
-            print(f"ステップログ読み込みエラー: {step_file} - {e}")
+    # 集計サイドカーから生成（ステップログ一覧と突き合わせ、未反映のものだけ読む）
+    aggregated = load_phase_aggregate(config).render()
 
     # S-5 experimental 情報を取得
     s5_settings = config.get("s5_settings", {})
@@ -970,57 +1657,292 @@ def write_phase_summary(config: dict, skipped_steps: list = None, execution_summ
         "job_loop": job_loop_info,
         "job_payload_present": job_payload_present,
         "job_result_written": job_result_written,
-        "total_steps": len(steps),
-        "success_count": success_count,
-        "fail_count": fail_count,
-        "denied_count": denied_count,
-        "fatal_error_count": fatal_error_count,
-        "stopped_count": stopped_count,
+        "total_steps": aggregated["total_steps"],
+        "success_count": aggregated["success_count"],
+        "fail_count": aggregated["fail_count"],
+        "denied_count": aggregated["denied_count"],
+        "fatal_error_count": aggregated["fatal_error_count"],
+        "stopped_count": aggregated["stopped_count"],
         "skipped_count": len(skipped_steps) if skipped_steps else 0,
-        "final_done": final_done,
-        "final_phase_result": final_phase_result,
+        "final_done": aggregated["final_done"],
+        "final_phase_result": aggregated["final_phase_result"],
         "execution_summary": execution_summary,
         "stop_on_deny": stop_on_deny,
         "end_reason": end_reason,
-        "denied_steps": denied_steps,
-        "fatal_error_steps": fatal_error_steps,
-        "stopped_steps": stopped_steps,
+        "denied_steps": aggregated["denied_steps"],
+        "fatal_error_steps": aggregated["fatal_error_steps"],
+        "stopped_steps": aggregated["stopped_steps"],
         "skipped_steps": skipped_steps or [],
-        "steps": steps,
+        "steps": aggregated["steps"],
         "job_result_path": job_result_path,
-        "job_result_path_posix": job_result_path_posix
+        "job_result_path_posix": job_result_path_posix,
+        "latency": aggregated["latency"],
+        "token_usage": aggregated["token_usage"],
+        "runtime_stats": collect_runtime_stats()
     }
 
     # ファイル出力
-    with open(summary_file, "w", encoding="utf-8") as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
+    get_serializer(config, "phase_summary").write(summary_file, summary)
 
     print(f"フェーズサマリ出力: {summary_file}")
     return summary_file
 
 
+def get_parallel_job_settings(config: dict) -> dict:
+    """job_loop.parallel 設定を取得（job_loop が無効なら常に無効）"""
+    job_loop_settings = config.get("s5_settings", {}).get("job_loop", {})
+    settings = job_loop_settings.get("parallel", {})
+    return {
+        "enabled": job_loop_settings.get("enabled", False) and settings.get("enabled", False),
+        "max_workers": settings.get("max_workers", 2),
+        "jobs_dir": settings.get("jobs_dir") or f"{config['logs_dir']}/jobs",
+        "summary_file": settings.get("summary_file") or f"{config['logs_dir']}/job_loop_summary.json"
+    }
+
+
+def rebase_workspace_path(path: str, workspace_dir: str, job_workspace_dir: str) -> str:
+    """workspace_dir 配下を指すパスを job_workspace_dir 配下に付け替える（それ以外のパスはそのまま）"""
+    prefix = workspace_dir.rstrip("/") + "/"
+    normalized = path.replace("\\", "/")
+    if normalized.startswith(prefix):
+        return f"{job_workspace_dir}/{normalized[len(prefix):]}"
+    return path
+
+
+def build_job_config(config: dict, job_index: int) -> dict:
+    """ジョブ専用の設定を作る
+
+    logs_dir（steps / phase_summary / 集計サイドカー / ジャーナル）、phase_state、ステップ WAL、job_result を
+    jobs_dir/job_NNN/ 配下に振り分け、ジョブ同士で状態を共有しないようにする。
+    workspace もジョブごとに jobs_dir/job_NNN/workspace/ とし、コマンドはジョブディレクトリで実行する
+    （プロンプト中の workspace/... はジョブ専用の workspace を指す）。done_conditions と
+    command_capture.spill_dir の workspace 配下のパスも付け替える。
+    応答キャッシュ・サーキットブレーカー・シングルフライト・インタプリタキャッシュはジョブ間で共有する
+    """
+    job_dir = f"{get_parallel_job_settings(config)['jobs_dir']}/job_{job_index:03d}"
+    job_workspace_dir = f"{job_dir}/workspace"
+    job_config = copy.deepcopy(config)
+    job_config["logs_dir"] = job_dir
+    job_config["workspace_dir"] = job_workspace_dir
+    job_config["command_cwd"] = job_dir
+    for check in job_config.get("done_conditions", {}).get("checks", []):
+        if check.get("glob"):
+            check["glob"] = rebase_workspace_path(check["glob"], config["workspace_dir"], job_workspace_dir)
+    capture_settings = job_config.get("command_capture", {})
+    if capture_settings.get("spill_dir"):
+        capture_settings["spill_dir"] = rebase_workspace_path(
+            capture_settings["spill_dir"], config["workspace_dir"], job_workspace_dir)
+    job_config["phase_state_path"] = f"{job_dir}/phase_state.json"
+    job_config.setdefault("step_wal", {})["path"] = f"{job_dir}/step_wal.jsonl"
+    job_config.setdefault("step_log", {})["journal_dir"] = f"{job_dir}/journal"
+    job_loop_settings = job_config["s5_settings"]["job_loop"]
+    job_loop_settings["job_result"] = {"path": f"{job_dir}/job_result.json"}
+    job_loop_settings["parallel"] = {"enabled": False}
+    return job_config
+
+
+def run_job_process(config: dict, job_index: int) -> dict:
+    """プロセスプールのワーカーで1ジョブを実行する
+
+    標準出力はジョブディレクトリの orchestrator.log に書き出す
+
+    Returns:
+        dict: job_index / status / end_reason / phase_summary / job_result のパス
+    """
+    job_config = build_job_config(config, job_index)
+    job_dir = BASE_DIR / job_config["logs_dir"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+
+    outcome = {"job_index": job_index, "status": "completed", "end_reason": None}
+    original_stdout = sys.stdout
+    with open(job_dir / "orchestrator.log", "a", encoding="utf-8", buffering=1) as log:
+        sys.stdout = log
+        try:
+            print(f"TOS v0.3 Orchestrator job {job_index} 開始 (pid={os.getpid()})")
+            end_reason = run_orchestrator(job_config, job_index_override=job_index)
+            outcome["end_reason"] = end_reason
+
+            state = load_phase_state(job_config) or {}
+            job_name = job_config["s5_settings"]["job_loop"].get("job_name", "default")
+            write_job_result(
+                config=job_config,
+                job_name=job_name,
+                max_jobs=job_config["s5_settings"]["job_loop"].get("max_jobs", 1),
+                jobs_executed=1,
+                end_reason=end_reason,
+                last_phase=state.get("current_phase"),
+                last_step=state.get("current_step"),
+                extra={"job_index": job_index}
+            )
+        except SystemExit as e:
+            outcome["status"] = "error"
+            outcome["end_reason"] = f"exit ({e.code})"
+        except Exception as e:
+            outcome["status"] = "error"
+            outcome["end_reason"] = f"exception: {e}"
+            print(f"ジョブ実行エラー: {e}")
+        finally:
+            close_shell_hosts()
+            close_async_engine()
+            # プロセスプールのワーカーでは atexit が走らないため、保留中の状態をここで書き出す
+            flush_phase_states()
+            sys.stdout = original_stdout
+
+    outcome["job_dir"] = job_config["logs_dir"]
+    outcome["phase_summary_path"] = f"{job_config['logs_dir']}/phase_summary.json"
+    outcome["job_result_path"] = job_config["s5_settings"]["job_loop"]["job_result"]["path"]
+    return outcome
+
+
+def load_job_outcome_summary(outcome: dict) -> dict:
+    """ジョブの phase_summary.json から統合サマリ用の項目を取り出す"""
+    summary_file = BASE_DIR / outcome["phase_summary_path"]
+    if not summary_file.exists():
+        return {}
+    try:
+        summary = load_file(summary_file)
+    except Exception as e:
+        print(f"ジョブのフェーズサマリ読み込みエラー: {summary_file} - {e}")
+        return {}
+    keys = ("total_steps", "success_count", "fail_count", "denied_count", "fatal_error_count",
+            "stopped_count", "skipped_count", "final_done", "end_reason", "execution_summary")
+    return {key: summary.get(key) for key in keys}
+
+
+def run_jobs_parallel(config: dict) -> Path:
+    """job_loop の max_jobs 件のジョブをプロセスプールで同時実行し、統合サマリを出力する
+
+    - 各ジョブは jobs_dir/job_NNN/ に phase_state / ステップログ / phase_summary / job_result を持つ
+    - 完了済み（phase_state.last_done=true）のジョブは再実行しない
+    - 全ジョブ完了後、summary_file に統合サマリ、job_result.path に全体の job_result を出力する
+
+    Returns:
+        Path: 統合サマリのパス
+    """
+    ensure_dirs(config)
+    # 前提条件はワーカー起動前に1度だけ確認する（不備があればここで終了）
+    check_prerequisites()
+
+    settings = get_parallel_job_settings(config)
+    job_loop_settings = config["s5_settings"]["job_loop"]
+    max_jobs = job_loop_settings.get("max_jobs", 1)
+    job_name = job_loop_settings.get("job_name", "default")
+    max_workers = max(1, min(settings["max_workers"], max_jobs))
+    print(f"job_loop parallel: max_jobs={max_jobs}, max_workers={max_workers}, jobs_dir={settings['jobs_dir']}")
+
+    outcomes = {}
+    pending = []
+    for job_index in range(1, max_jobs + 1):
+        job_config = build_job_config(config, job_index)
+        replay_step_wal(job_config)
+        state = load_phase_state(job_config)
+        if state and state.get("last_done"):
+            print(f"job {job_index}: 完了済みのためスキップ")
+            outcomes[job_index] = {
+                "job_index": job_index,
+                "status": "already_completed",
+                "end_reason": state.get("last_done_reason"),
+                "job_dir": job_config["logs_dir"],
+                "phase_summary_path": f"{job_config['logs_dir']}/phase_summary.json",
+                "job_result_path": job_config["s5_settings"]["job_loop"]["job_result"]["path"]
+            }
+        else:
+            pending.append(job_index)
+
+    if pending:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(run_job_process, config, job_index): job_index for job_index in pending}
+            for future in as_completed(futures):
+                job_index = futures[future]
+                try:
+                    outcomes[job_index] = future.result()
+                except Exception as e:
+                    outcomes[job_index] = {"job_index": job_index, "status": "error",
+                                           "end_reason": f"exception: {e}"}
+                print(f"job {job_index}: {outcomes[job_index]['status']} ({outcomes[job_index]['end_reason']})")
+
+    jobs = []
+    totals = {key: 0 for key in ("total_steps", "success_count", "fail_count", "denied_count",
+                                 "fatal_error_count", "stopped_count", "skipped_count")}
+    execution_totals = {key: 0 for key in ("executed_count", "denied_count", "timeout_count", "failed_count")}
+    for job_index in sorted(outcomes):
+        job = dict(outcomes[job_index])
+        if job.get("phase_summary_path"):
+            job.update({k: v for k, v in load_job_outcome_summary(job).items() if k != "end_reason"})
+        for key in totals:
+            totals[key] += job.get(key) or 0
+        for key in execution_totals:
+            execution_totals[key] += (job.get("execution_summary") or {}).get(key, 0)
+        jobs.append(job)
+
+    all_done = bool(jobs) and all(job.get("final_done") or job["status"] == "already_completed" for job in jobs)
+    end_reason = f"job_loop_parallel: {sum(1 for job in jobs if job['status'] != 'error')}/{max_jobs} jobs finished"
+
+    summary = {
+        "generated_at": datetime.now().isoformat(),
+        "job_name": job_name,
+        "max_jobs": max_jobs,
+        "max_workers": max_workers,
+        "all_done": all_done,
+        "end_reason": end_reason,
+        "totals": totals,
+        "execution_summary": execution_totals,
+        "jobs": jobs
+    }
+    summary_file = BASE_DIR / settings["summary_file"]
+    summary_file.parent.mkdir(parents=True, exist_ok=True)
+    get_serializer(config, "job_loop_summary").write(summary_file, summary)
+    print(f"job_loop 統合サマリ出力: {summary_file}")
+
+    write_job_result(
+        config=config,
+        job_name=job_name,
+        max_jobs=max_jobs,
+        jobs_executed=len(jobs),
+        end_reason=end_reason,
+        last_phase="job_loop_complete" if all_done else "job_loop_parallel",
+        last_step=None,
+        extra={"jobs": [{"job_index": job["job_index"], "status": job["status"],
+                         "end_reason": job.get("end_reason"), "job_result_path": job.get("job_result_path")}
+                        for job in jobs]}
+    )
+    if all_done:
+        # 逐次実行に戻した場合も job_loop 完了として扱われるよう、共有の phase_state を進める
+        save_phase_state(
+            config=config,
+            current_phase="job_loop_complete",
+            current_step=1,
+            last_done=True,
+            last_done_reason=f"job_loop_complete: max_jobs({max_jobs})に到達",
+            job_index=max_jobs + 1
+        )
+
+    print(f"TOS v0.3 Orchestrator 終了 ({end_reason})")
+    return summary_file
+
+
 def main():
     print("TOS v0.3 Orchestrator 開始")
 
     # 1. 設定読み込み
     config = load_config()
 
-    # 2. ディレクトリ確認
-    ensure_dirs(config)
+    # job_loop.parallel.enabled=true の場合は複数ジョブをプロセスプールで同時実行する
+    if get_parallel_job_settings(config)["enabled"]:
+        run_jobs_parallel(config)
+        return
+
+    run_orchestrator(config)
 
-    # 3. フェーズ状態確認（復帰 or 新規開始）
-    phase_state = load_phase_state(config)
-    if phase_state:
-        start_step = phase_state.get("current_step", 1)
-        if phase_state.get("last_done"):
-            print(f"前回完了済み (step={start_step})。新規開始します。")
-            start_step = 1
-        else:
-            print(f"前回の状態から復帰: step={start_step}")
-    else:
-        start_step = 1
-        print("新規開始")
 
+def check_prerequisites() -> tuple:
+    """Python パスと API キーを確認する（不備があれば終了）
+
+    Returns:
+        tuple: (python_path, openai_key, anthropic_key)
+    """
     # 4. Python パス確認（tos_python_path.txt）
     python_path = load_tos_python_path()
 
@@ -1039,16 +1961,7 @@ def main():
         print("を実行して確認してください。")
         sys.exit(1)
 
-    # 5. Python 検証
-    if not verify_python(python_path):
-        print("")
-        print(f"Python実行ファイルが無効です: {python_path}")
-        print("")
-        print(f"tos_python_path.txt の内容を確認してください:")
-        print(f"  {TOS_PYTHON_PATH_FILE}")
-        print("")
-        print("正しい Python パスに修正してください。")
-        sys.exit(1)
+    # 5. Python 検証はサブプロセスを起動するため、最初の API 呼び出しの直前（require_python）まで遅らせる
 
     # 6. APIキー確認
     openai_key, anthropic_key = get_api_keys()
@@ -1064,6 +1977,58 @@ def main():
         sys.exit(1)
 
     print("APIキー確認完了")
+    return python_path, openai_key, anthropic_key
+
+
+def require_python(config: dict, python_path: str) -> None:
+    """Python実行ファイルを検証する（無効なら終了）
+
+    job_loop_complete やステップ1で done の早期終了ではコマンドを実行しないため呼ばない。
+    検証に成功したパスはプロセス内で再検証しない
+    """
+    if python_path in _verified_python_paths:
+        return
+    if not verify_python(python_path, config):
+        print("")
+        print(f"Python実行ファイルが無効です: {python_path}")
+        print("")
+        print(f"tos_python_path.txt の内容を確認してください:")
+        print(f"  {TOS_PYTHON_PATH_FILE}")
+        print("")
+        print("正しい Python パスに修正してください。")
+        sys.exit(1)
+    _verified_python_paths.add(python_path)
+
+
+def run_orchestrator(config: dict, job_index_override: int = None) -> str:
+    """フェーズ状態の復帰からメインループ・サマリ出力までを実行する
+
+    Args:
+        config: 設定dict
+        job_index_override: 並列ジョブ実行時に割り当てた job_index（phase_state より優先）
+
+    Returns:
+        str: 終了理由 (end_reason)
+    """
+    # 2. ディレクトリ確認
+    ensure_dirs(config)
+
+    # 3. フェーズ状態確認（復帰 or 新規開始）
+    # 前回 WAL にコミットしたままステップログ / フェーズ状態の書き込みが終わらなかったステップを先に反映する
+    replay_step_wal(config)
+    phase_state = load_phase_state(config)
+    if phase_state:
+        start_step = phase_state.get("current_step", 1)
+        if phase_state.get("last_done"):
+            print(f"前回完了済み (step={start_step})。新規開始します。")
+            start_step = 1
+        else:
+            print(f"前回の状態から復帰: step={start_step}")
+    else:
+        start_step = 1
+        print("新規開始")
+
+    python_path, openai_key, anthropic_key = check_prerequisites()
 
     # S-5 experimental フラグ
     s5_settings = config.get("s5_settings", {})
@@ -1087,8 +2052,7 @@ def main():
             job_input_file = BASE_DIR / job_input_path
             if job_input_file.exists():
                 try:
-                    with open(job_input_file, "r", encoding="utf-8") as f:
-                        job_payload = json.load(f)
+                    job_payload = load_file(job_input_file)
                     print(f"job_payload 読み込み完了: {job_input_file}")
                 except Exception as e:
                     print(f"job_payload 読み込みエラー: {e}")
@@ -1104,7 +2068,9 @@ def main():
     # phase_stateからjob_indexを復元、なければ1から開始
     job_index = None
     if job_loop_enabled:
-        if phase_state and phase_state.get("job_index") is not None:
+        if job_index_override is not None:
+            job_index = job_index_override
+        elif phase_state and phase_state.get("job_index") is not None:
             job_index = phase_state.get("job_index")
         else:
             job_index = 1
@@ -1112,14 +2078,6 @@ def main():
         # JF: max_jobs到達チェック（事前チェック）
         if job_index > job_loop_max_jobs:
             print(f"job_loop_complete: job_index({job_index}) > max_jobs({job_loop_max_jobs})")
-            save_phase_state(
-                config=config,
-                current_phase="job_loop_complete",
-                current_step=start_step,
-                last_done=True,
-                last_done_reason=f"job_loop_complete: max_jobs({job_loop_max_jobs})に到達",
-                job_index=job_index
-            )
             # JH: job_loop_info を構築
             job_loop_complete_info = {
                 "enabled": job_loop_enabled,
@@ -1155,7 +2113,14 @@ def main():
                 job_result_written=True,
                 job_result_path=str(job_result_file)
             )
-            write_step_log(config, start_step, step_data)
+            commit_step(
+                config, start_step, step_data,
+                current_phase="job_loop_complete",
+                current_step=start_step,
+                last_done=True,
+                last_done_reason=f"job_loop_complete: max_jobs({job_loop_max_jobs})に到達",
+                job_index=job_index
+            )
             # LH: phase_summaryにjob_result_pathを保存
             write_phase_summary(
                 config, [], {},
@@ -1170,7 +2135,7 @@ def main():
 
     # 7. メインループ
     max_steps = config.get("max_steps", 8)
-    context = {"history": []}
+    context = {"history": HistoryManager.from_config(config)}
     skipped_steps = []  # スキップしたステップを記録
     total_execution_summary = {  # 累積execution_summary
         "executed_count": 0,
@@ -1218,13 +2183,11 @@ def main():
                 next_instruction_inputs=phase_result["next_instruction_inputs"],
                 next_instruction_expected_outputs=phase_result["next_instruction_expected_outputs"]
             )
-            write_step_log(config, step_num, step_data)
-
             # JE: job_loop enabled の場合、job_index++ して保存
             if job_loop_enabled:
                 next_job_index = job_index + 1
-                save_phase_state(
-                    config=config,
+                commit_step(
+                    config, step_num, step_data,
                     current_phase="done",
                     current_step=step_num,
                     last_done=True,
@@ -1234,9 +2197,9 @@ def main():
                 )
                 end_reason = f"done (job {job_index}/{job_loop_max_jobs} completed)"
             else:
-                # フェーズ状態を保存（完了）
-                save_phase_state(
-                    config=config,
+                # ステップログとフェーズ状態を保存（完了）
+                commit_step(
+                    config, step_num, step_data,
                     current_phase="done",
                     current_step=step_num,
                     last_done=True,
@@ -1246,10 +2209,14 @@ def main():
                 end_reason = "done"
             break
 
+        # API 呼び出しの前に Python を検証する（無効なら API を消費せずに終了）
+        require_python(config, python_path)
+
         # API呼び出し: draft (ChatGPT)
         draft_raw, draft, draft_prompt_info = make_draft(config, step_num, context, openai_key, job_payload)
         if draft is None:
             print("draft生成に失敗しました。処理を中断します。")
+            failure_reason = describe_stage_failure("draft", draft_prompt_info)
             step_data = build_step_log_data(
                 phase="fatal_error",
                 step_num=step_num,
@@ -1267,22 +2234,22 @@ def main():
                 prompts_used={"draft": draft_prompt_info},
                 draft_raw=sanitize_for_log(draft_raw)
             )
-            write_step_log(config, step_num, step_data)
-            save_phase_state(
-                config=config,
+            commit_step(
+                config, step_num, step_data,
                 current_phase="fatal_error",
                 current_step=step_num,
                 last_done=False,
-                last_done_reason="fatal_error: draft生成失敗",
+                last_done_reason=failure_reason,
                 job_index=job_index
             )
-            end_reason = "fatal_error: draft生成失敗"
+            end_reason = failure_reason
             break
 
         # API呼び出し: review (Claude)
         review_raw, review, review_prompt_info = review_plus(config, step_num, draft, context, anthropic_key)
         if review is None:
             print("review生成に失敗しました。処理を中断します。")
+            failure_reason = describe_stage_failure("review", review_prompt_info)
             step_data = build_step_log_data(
                 phase="fatal_error",
                 step_num=step_num,
@@ -1301,22 +2268,22 @@ def main():
                 draft=draft,
                 review_raw=sanitize_for_log(review_raw)
             )
-            write_step_log(config, step_num, step_data)
-            save_phase_state(
-                config=config,
+            commit_step(
+                config, step_num, step_data,
                 current_phase="fatal_error",
                 current_step=step_num,
                 last_done=False,
-                last_done_reason="fatal_error: review生成失敗",
+                last_done_reason=failure_reason,
                 job_index=job_index
             )
-            end_reason = "fatal_error: review生成失敗"
+            end_reason = failure_reason
             break
 
         # API呼び出し: final (ChatGPT)
         final_raw, final, final_prompt_info = make_final(config, step_num, draft, review, openai_key)
         if final is None:
             print("final生成に失敗しました。処理を中断します。")
+            failure_reason = describe_stage_failure("final", final_prompt_info)
             step_data = build_step_log_data(
                 phase="fatal_error",
                 step_num=step_num,
@@ -1336,16 +2303,15 @@ def main():
                 review=review,
                 final_raw=sanitize_for_log(final_raw)
             )
-            write_step_log(config, step_num, step_data)
-            save_phase_state(
-                config=config,
+            commit_step(
+                config, step_num, step_data,
                 current_phase="fatal_error",
                 current_step=step_num,
                 last_done=False,
-                last_done_reason="fatal_error: final生成失敗",
+                last_done_reason=failure_reason,
                 job_index=job_index
             )
-            end_reason = "fatal_error: final生成失敗"
+            end_reason = failure_reason
             break
 
         # コマンド取得
@@ -1353,6 +2319,9 @@ def main():
 
         # deny判定（run_commandsより前）
         pre_check = pre_check_commands(config, commands)
+        if pre_check["denied_count"] > 0:
+            # 同じプロンプトで同じ final がキャッシュから返り続けないようにする
+            discard_cached_response(final_prompt_info)
 
         # stop_on_deny設定を取得
         exec_policy = config.get("execution_policy", {})
@@ -1408,16 +2377,15 @@ def main():
                 job_index=job_index,
                 job_payload=job_payload
             )
-            write_step_log(config, step_num, step_data)
-
-            # フェーズ状態を保存
-            save_phase_state(
-                config=config,
+            # ステップログとフェーズ状態を保存
+            commit_step(
+                config, step_num, step_data,
                 current_phase="deny",
                 current_step=step_num + 1,
                 last_done=False,
                 last_done_reason=f"deny: {deny_reason_str}",
-                job_index=job_index
+                job_index=job_index,
+                durable=stop_on_deny
             )
 
             # stop_on_deny=trueの場合は即停止（context保存しない）
@@ -1479,16 +2447,15 @@ def main():
                 job_index=job_index,
                 job_payload=job_payload
             )
-            write_step_log(config, step_num, step_data)
-
-            # フェーズ状態を保存（実行中）
-            save_phase_state(
-                config=config,
+            # ステップログとフェーズ状態を保存（実行中）
+            commit_step(
+                config, step_num, step_data,
                 current_phase="execute",
                 current_step=step_num + 1,  # 次のステップ番号
                 last_done=False,
                 last_done_reason="ステップ実行完了、次のループでdone判定",
-                job_index=job_index
+                job_index=job_index,
+                durable=False
             )
 
         # コンテキスト更新
@@ -1512,10 +2479,9 @@ def main():
             job_index=job_index,
             job_payload=job_payload
         )
-        write_step_log(config, max_steps + 1, step_data)
-        # フェーズ状態を保存（max_steps到達）
-        save_phase_state(
-            config=config,
+        # ステップログとフェーズ状態を保存（max_steps到達）
+        commit_step(
+            config, max_steps + 1, step_data,
             current_phase="max_steps_reached",
             current_step=max_steps + 1,
             last_done=False,
@@ -1544,7 +2510,63 @@ def main():
 
     print("")
     print(f"TOS v0.3 Orchestrator 終了 ({end_reason})")
+    return end_reason
+
+
+def cli(argv: list = None) -> None:
+    """コマンドライン入口（引数なしは従来どおり main() を実行）"""
+    parser = argparse.ArgumentParser(
+        prog="orchestrator_v0_3.py",
+        description="TOS v0.3 Orchestrator"
+    )
+    parser.add_argument(
+        "--rebuild-phase-aggregate",
+        action="store_true",
+        help="ステップログから集計サイドカー (phase_aggregate.json) を再生成する"
+    )
+    parser.add_argument(
+        "--export-step-journal",
+        metavar="OUT_DIR",
+        nargs="?",
+        const="",
+        help="ステップジャーナルを従来形式の step_NNN.json に書き出す（既定: logs/steps）"
+    )
+    parser.add_argument(
+        "--rebuild-journal-index",
+        action="store_true",
+        help="セグメントファイルからステップジャーナルの索引を再生成する"
+    )
+    parser.add_argument(
+        "--job-index",
+        type=int,
+        default=None,
+        help="--export-step-journal の対象 job_index"
+    )
+    args = parser.parse_args(argv)
+
+    if args.rebuild_journal_index:
+        config = load_config()
+        count = get_step_journal_for(config).rebuild_index()
+        print(f"ジャーナル索引再生成: {count} records")
+        return
+
+    if args.rebuild_phase_aggregate:
+        config = load_config()
+        rebuild_phase_aggregate(config)
+        return
+
+    if args.export_step_journal is not None:
+        config = load_config()
+        export_step_journal(config, args.export_step_journal or None, args.job_index)
+        return
+
+    try:
+        main()
+    finally:
+        # shell_host.scope=job の常駐シェルホストはジョブ終了時にまとめて終了する
+        close_shell_hosts()
+        close_async_engine()
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,101 @@
+"""
+TOS v0.3 テスト - phase_summary 集計サイドカー
+ステップファイルとの突き合わせで、追加・削除・同名ファイルの書き換えが集計に反映されることを確認する
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.aggregate import PhaseAggregate  # noqa: E402
+
+
+class PhaseAggregateReconcileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_aggregate_test_")
+        self.steps_dir = Path(self.tmp_dir) / "steps"
+        self.steps_dir.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_step(self, step_num: int, phase: str, mtime_ns: int = None, **extra) -> None:
+        path = self.steps_dir / f"step_{step_num:03d}.json"
+        data = {"step_num": step_num, "phase": phase, "done": phase == "done"}
+        data.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_rebuild_counts_every_step(self):
+        self.write_step(1, "execute")
+        self.write_step(2, "error")
+        self.write_step(3, "deny", stopped=True)
+
+        rendered = PhaseAggregate.rebuild(self.steps_dir).render()
+        self.assertEqual(rendered["total_steps"], 3)
+        self.assertEqual(rendered["success_count"], 1)
+        self.assertEqual(rendered["fail_count"], 1)
+        self.assertEqual(rendered["denied_count"], 1)
+        self.assertEqual(rendered["stopped_count"], 1)
+
+    def test_rewritten_step_file_is_read_again(self):
+        self.write_step(1, "error", mtime_ns=1_000_000_000)
+        aggregate = PhaseAggregate.rebuild(self.steps_dir)
+        self.assertEqual(aggregate.counters["fail_count"], 1)
+
+        # ロールバックで同名ファイルが別の内容に戻った
+        self.write_step(1, "done", mtime_ns=2_000_000_000, done_reason="完了")
+
+        self.assertTrue(aggregate.reconcile(self.steps_dir))
+        rendered = aggregate.render()
+        self.assertEqual(rendered["fail_count"], 0)
+        self.assertEqual(rendered["success_count"], 1)
+        self.assertTrue(rendered["final_done"])
+
+    def test_name_only_reconcile_is_opt_in(self):
+        self.write_step(1, "error", mtime_ns=1_000_000_000)
+        aggregate = PhaseAggregate.rebuild(self.steps_dir)
+        self.write_step(1, "execute", mtime_ns=2_000_000_000)
+
+        self.assertFalse(aggregate.reconcile(self.steps_dir, check_stat=False))
+        self.assertEqual(aggregate.counters["fail_count"], 1)
+
+    def test_unchanged_files_are_not_read(self):
+        self.write_step(1, "execute")
+        aggregate = PhaseAggregate.rebuild(self.steps_dir)
+        self.assertFalse(aggregate.reconcile(self.steps_dir))
+
+    def test_removed_and_added_files(self):
+        self.write_step(1, "execute")
+        self.write_step(2, "execute")
+        aggregate = PhaseAggregate.rebuild(self.steps_dir)
+
+        (self.steps_dir / "step_002.json").unlink()
+        self.write_step(3, "fatal_error")
+
+        self.assertTrue(aggregate.reconcile(self.steps_dir))
+        self.assertEqual(sorted(aggregate.records), ["step_001.json", "step_003.json"])
+        self.assertEqual(aggregate.counters["success_count"], 1)
+        self.assertEqual(aggregate.counters["fatal_error_count"], 1)
+
+    def test_save_and_load_round_trip(self):
+        self.write_step(1, "execute")
+        aggregate = PhaseAggregate.rebuild(self.steps_dir)
+        path = Path(self.tmp_dir) / "phase_aggregate.json"
+        aggregate.save(path)
+
+        loaded = PhaseAggregate.load(path)
+        self.assertEqual(loaded.render(), aggregate.render())
+        self.assertFalse(loaded.reconcile(self.steps_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+TOS v0.3 テスト - 非同期実行エンジン
+同期ラッパーからの呼び出しはスレッドを乗り換えずに実行し、並行させる呼び出しは executor 上で
+同時実行数の上限内で並行に動くこと、shutdown でイベントループが解放されることを確認する
+"""
+
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+from tos_runtime.async_engine import AsyncEngine  # noqa: E402
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def blocking_call(delay: float = 0.0) -> tuple:
+    time.sleep(delay)
+    return threading.get_ident(), request_id.get()
+
+
+class AsyncEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = AsyncEngine(max_concurrency=2)
+
+    def tearDown(self):
+        self.engine.shutdown()
+
+    def test_run_sync_calls_blocking_function_inline(self):
+        async def call():
+            request_id.set("draft")
+            return await self.engine.run_blocking(blocking_call)
+
+        thread_id, seen_request_id = self.engine.run_sync(call())
+        self.assertEqual(thread_id, threading.get_ident())
+        self.assertEqual(seen_request_id, "draft")
+        self.assertEqual(self.engine.summary()["inline_calls"], 1)
+        self.assertEqual(self.engine.summary()["executor_calls"], 0)
+
+    def test_concurrent_callers_use_executor(self):
+        async def call():
+            request_id.set("review")
+            return await self.engine.run_blocking(blocking_call)
+
+        thread_id, seen_request_id = asyncio.run(call())
+        self.assertNotEqual(thread_id, threading.get_ident())
+        self.assertEqual(seen_request_id, "review")
+        self.assertEqual(self.engine.summary()["executor_calls"], 1)
+
+    def test_run_concurrent_overlaps_within_limit(self):
+        async def call_many(count):
+            started = time.perf_counter()
+            await asyncio.gather(*(self.engine.run_concurrent(blocking_call, 0.1) for _ in range(count)))
+            return time.perf_counter() - started
+
+        self.assertLess(self.engine.run_sync(call_many(2)), 0.18)
+        # 上限 2 を超えた分は待たされる
+        self.assertGreaterEqual(self.engine.run_sync(call_many(3)), 0.19)
+
+    def test_run_sync_reuses_loop_per_thread(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        self.assertIs(self.engine.run_sync(current_loop()), self.engine.run_sync(current_loop()))
+
+    def test_run_sync_inside_running_loop_is_an_error(self):
+        async def nested():
+            self.engine.run_sync(asyncio.sleep(0))
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(nested())
+
+    def test_shutdown_closes_loops_of_every_thread(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        loops = []
+        worker = threading.Thread(target=lambda: loops.append(self.engine.run_sync(current_loop())))
+        worker.start()
+        worker.join()
+        loops.append(self.engine.run_sync(current_loop()))
+
+        self.engine.shutdown()
+        self.assertTrue(all(loop.is_closed() for loop in loops))
+        # shutdown 後も新しいループで使える
+        self.assertEqual(self.engine.run_sync(self.engine.run_blocking(lambda: "ok")), "ok")
+
+
+class SyncWrapperTest(unittest.TestCase):
+    def test_sync_call_passes_stage_and_template(self):
+        received = {}
+
+        async def fake_call(config, prompt, api_key, api_type, stage=None, template_name=None, call_info=None):
+            received.update(stage=stage, template_name=template_name, call_info=call_info)
+            return "raw", {}, "raw"
+
+        call_info = {}
+        with mock.patch.object(orchestrator, "call_api_with_json_retry_async", fake_call):
+            orchestrator.call_api_with_json_retry({}, "prompt", "key", "openai", stage="draft",
+                                                  template_name="draft_prompt_template", call_info=call_info)
+        self.assertEqual(received, {"stage": "draft", "template_name": "draft_prompt_template",
+                                    "call_info": call_info})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+TOS v0.3 テスト - コマンド出力キャプチャ
+既定で従来のステップログ形式（先頭 1000 文字）になり、多バイト文字の途中で切れても文字化けしないことを確認する
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.capture import BoundedCapture, CaptureSettings, run_captured  # noqa: E402
+
+
+def feed(capture: BoundedCapture, data: bytes, chunk_size: int = 7) -> BoundedCapture:
+    for start in range(0, len(data), chunk_size):
+        capture.write(data[start:start + chunk_size])
+    return capture
+
+
+class BoundedCaptureTest(unittest.TestCase):
+    def default_capture(self) -> BoundedCapture:
+        stdout, _ = CaptureSettings().new_pair()
+        return stdout
+
+    def test_default_matches_baseline_slice(self):
+        for text in ("ok\n", "a" * 5000, "合計: 10\n" * 800):
+            with self.subTest(length=len(text)):
+                capture = feed(self.default_capture(), text.encode("utf-8"))
+                self.assertEqual(capture.text("utf-8"), text[:1000])
+                self.assertEqual(capture.truncated, len(text) > 1000)
+
+    def test_head_cut_inside_multibyte_character(self):
+        data = "あいう".encode("utf-8")
+        capture = feed(BoundedCapture(head_bytes=4, tail_bytes=0), data, chunk_size=1)
+        self.assertEqual(capture.text("utf-8"), "あ")
+
+    def test_tail_cut_inside_multibyte_character(self):
+        data = ("x" * 10 + "合計平均件数").encode("utf-8")
+        capture = feed(BoundedCapture(head_bytes=4, tail_bytes=8), data)
+        text = capture.text("utf-8")
+        self.assertTrue(text.startswith("xxxx\n... ["))
+        self.assertTrue(text.endswith("\n件数"))
+        self.assertNotIn("�", text)
+
+    def test_tail_cut_inside_cp932_character(self):
+        data = ("x" * 10 + "合計平均").encode("cp932")
+        capture = feed(BoundedCapture(head_bytes=2, tail_bytes=5), data)
+        text = capture.text("cp932")
+        self.assertTrue(text.endswith("平均"))
+        self.assertNotIn("�", text)
+
+    def test_max_chars_limits_head_and_tail(self):
+        capture = feed(BoundedCapture(head_bytes=20, tail_bytes=20, max_chars=5), b"h" * 20 + b"-" * 50 + b"t" * 20)
+        head, _, tail = capture.text("utf-8").partition("\n... [")
+        self.assertEqual(head, "hhhhh")
+        self.assertTrue(tail.endswith("\nttttt"))
+
+    def test_unbounded_capture_keeps_everything(self):
+        data = "行\r\n".encode("utf-8") * 3000
+        capture = feed(BoundedCapture(head_bytes=None), data)
+        self.assertEqual(capture.text("utf-8"), "行\n" * 3000)
+        self.assertFalse(capture.truncated)
+
+
+@unittest.skipIf(shutil.which("sh") is None, "sh がありません")
+class RunCapturedTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_capture_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_spill_keeps_full_output(self):
+        settings = CaptureSettings(head_bytes=10, tail_bytes=10, spill=True, spill_dir=self.tmp_dir)
+        stdout, stderr = settings.new_pair()
+        returncode = run_captured(["sh", "-c", "seq 1 2000"], 30, stdout, stderr)
+
+        self.assertEqual(returncode, 0)
+        self.assertTrue(stdout.truncated)
+        self.assertTrue(stdout.spilled)
+        self.assertEqual(stdout.spill_path.read_bytes().decode().split(), [str(i) for i in range(1, 2001)])
+        self.assertFalse(stderr.spilled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+TOS v0.3 テスト - サーキットブレーカー
+half_open の試行枠が、試行の結果にかかわらず返却されることを確認する
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.circuit import (  # noqa: E402
+    STATE_CLOSED, STATE_HALF_OPEN, CircuitBreakerRegistry, CircuitOpenError
+)
+from tos_runtime.retry import RetryScheduler  # noqa: E402
+
+OPEN_SEC = 0.05
+
+
+class HalfOpenProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_circuit_test_")
+        self.breakers = CircuitBreakerRegistry(Path(self.tmp_dir) / "circuit_state.json",
+                                               enabled=True, open_sec=OPEN_SEC)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def trip_and_wait(self):
+        for _ in range(3):
+            self.breakers.record_failure("openai", "server")
+        time.sleep(OPEN_SEC * 2)
+
+    def test_rate_limited_probe_closes_circuit(self):
+        self.trip_and_wait()
+        self.breakers.check("openai")
+        self.breakers.record_failure("openai", "rate_limit")
+
+        self.assertEqual(self.breakers.state_of("openai"), STATE_CLOSED)
+        for _ in range(3):
+            self.breakers.check("openai")
+
+    def test_released_probe_can_be_retried(self):
+        self.trip_and_wait()
+        self.breakers.check("openai")
+        self.breakers.release("openai")
+
+        self.assertEqual(self.breakers.state_of("openai"), STATE_HALF_OPEN)
+        self.breakers.check("openai")
+
+    def test_scheduler_releases_probe_on_unexpected_error(self):
+        self.trip_and_wait()
+        scheduler = RetryScheduler(seed=0)
+
+        def attempt(retry_count):
+            raise KeyError("想定外")
+
+        with self.assertRaises(KeyError):
+            scheduler.call("openai", attempt, retry_on=(ValueError,), breaker=self.breakers)
+        result = scheduler.call("openai", lambda retry_count: ("ok", 0), breaker=self.breakers)
+
+        self.assertEqual(result, "ok")
+        self.assertEqual(self.breakers.state_of("openai"), STATE_CLOSED)
+
+
+class SharedStateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_circuit_test_")
+        self.state_path = Path(self.tmp_dir) / "circuit_state.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_disabled_by_default(self):
+        breakers = CircuitBreakerRegistry.from_config({}, self.tmp_dir)
+        for _ in range(5):
+            breakers.record_failure("openai", "server")
+        breakers.check("openai")
+        breakers.raise_if_open("openai")
+        self.assertFalse(Path(self.tmp_dir, "workspace").exists())
+
+    def test_raise_if_open_sees_trip_from_other_process(self):
+        ours = CircuitBreakerRegistry(self.state_path, enabled=True)
+        ours.record_failure("openai", "server")
+        ours.raise_if_open("openai")
+
+        other = CircuitBreakerRegistry(self.state_path, enabled=True)
+        for _ in range(3):
+            other.record_failure("openai", "server")
+
+        with self.assertRaises(CircuitOpenError):
+            ours.raise_if_open("openai")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+TOS v0.3 テスト - プロバイダクライアントレジストリ
+Anthropic クライアントの使い回しと、呼び出し元の設定・古い SDK への配慮を確認する
+"""
+
+import sys
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.clients import ProviderClientRegistry  # noqa: E402
+
+
+class FakeAnthropic:
+    def __init__(self, api_key, **kwargs):
+        self.api_key = api_key
+        self.kwargs = kwargs
+
+    def close(self):
+        pass
+
+
+class FakeHttpxClient:
+    def __init__(self, limits=None):
+        self.limits = limits
+
+
+def fake_modules(with_default_httpx_client: bool) -> dict:
+    anthropic = types.ModuleType("anthropic")
+    anthropic.Anthropic = FakeAnthropic
+    if with_default_httpx_client:
+        anthropic.DefaultHttpxClient = FakeHttpxClient
+    httpx = types.ModuleType("httpx")
+    httpx.Limits = lambda **kwargs: kwargs
+    return {"anthropic": anthropic, "httpx": httpx}
+
+
+class AnthropicClientTest(unittest.TestCase):
+    def test_client_is_reused_per_key_and_base_url(self):
+        registry = ProviderClientRegistry()
+        with mock.patch.dict(sys.modules, fake_modules(True)):
+            first = registry.get_anthropic_client("key", base_url="http://a")
+            second = registry.get_anthropic_client("key", base_url="http://a")
+            other = registry.get_anthropic_client("key", base_url="http://b")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertIsInstance(first.kwargs["http_client"], FakeHttpxClient)
+        self.assertEqual(registry.stats()["anthropic_client_reuses"], 1)
+
+    def test_caller_kwargs_are_not_modified(self):
+        registry = ProviderClientRegistry()
+        client_kwargs = {"base_url": "http://a"}
+        with mock.patch.dict(sys.modules, fake_modules(True)):
+            registry.get_anthropic_client("key", **client_kwargs)
+
+        self.assertEqual(client_kwargs, {"base_url": "http://a"})
+
+    def test_old_sdk_without_default_httpx_client_uses_sdk_default(self):
+        registry = ProviderClientRegistry()
+        with mock.patch.dict(sys.modules, fake_modules(False)):
+            client = registry.get_anthropic_client("key")
+
+        self.assertNotIn("http_client", client.kwargs)
+
+
+if __name__ == "__main__":
+    unittest.main()
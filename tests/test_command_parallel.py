@@ -0,0 +1,66 @@
+"""
+TOS v0.3 テスト - final_commands の並行実行
+run_commands_parallel の command_results / execution_summary が逐次実行と同じ規則になることを確認する
+"""
+
+import copy
+import json
+import sys
+import unittest
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+
+
+def load_config(**overrides) -> dict:
+    with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config = copy.deepcopy(config)
+    config["allow_types"] = ["sh"]
+    config["command_executor"] = {"mode": "parallel", "max_workers": 2}
+    config["shell_host"] = {"enabled": False, "scope": "step"}
+    config.update(overrides)
+    return config
+
+
+class RunCommandsParallelTest(unittest.TestCase):
+    def test_denied_command_in_failed_group_is_counted_as_denied(self):
+        config = load_config()
+        commands = [
+            {"type": "sh", "code": "exit 1", "id": "a", "parallel_group": "g"},
+            {"type": "sh", "code": "Remove-Item x", "depends_on": ["a"], "parallel_group": "g"},
+            {"type": "sh", "code": "true", "depends_on": ["a"], "parallel_group": "g"},
+        ]
+
+        result = orchestrator.run_commands_parallel(config, commands, sys.executable)
+        results = result["command_results"]
+
+        self.assertEqual(len(results), 3)
+        self.assertTrue(results[0]["executed"])
+        self.assertEqual(results[0]["returncode"], 1)
+        # deny されたコマンドは fail fast で未開始でも allowed=False / denied として記録する
+        self.assertFalse(results[1]["allowed"])
+        self.assertFalse(results[1]["executed"])
+        self.assertNotIn("skipped", results[1])
+        self.assertIn("deny_reason", results[1])
+        # 許可されたコマンドのみ skipped
+        self.assertTrue(results[2]["allowed"])
+        self.assertTrue(results[2]["skipped"])
+        self.assertEqual(result["execution_summary"], {
+            "executed_count": 1,
+            "denied_count": 1,
+            "timeout_count": 0,
+            "failed_count": 0
+        })
+
+        # deny の件数は逐次実行と一致する
+        sequential = orchestrator.run_commands_sequential(config, commands, sys.executable)
+        self.assertEqual(sequential["execution_summary"]["denied_count"],
+                         result["execution_summary"]["denied_count"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+TOS v0.3 テスト - done 条件エンジン
+エンコーディング判定、チャンク境界をまたぐ一致、JSON パス条件、判定キャッシュを確認する
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.done_engine import DoneConditionEngine, read_text, scan_text  # noqa: E402
+
+KEYWORDS = ["合計:", "平均:", "件数:"]
+RESULT_TEXT = "合計: 60\n平均: 20\n件数: 3\n"
+
+
+class DoneEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="tos_done_engine_test_"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, name: str, data: bytes) -> Path:
+        path = self.tmp_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+
+class EncodingTest(DoneEngineTestCase):
+    def test_reads_each_encoding(self):
+        samples = {
+            "utf8.txt": RESULT_TEXT.encode("utf-8"),
+            "utf8_bom.txt": RESULT_TEXT.encode("utf-8-sig"),
+            "utf16_bom.txt": RESULT_TEXT.encode("utf-16"),
+            "cp932.txt": RESULT_TEXT.encode("cp932"),
+        }
+        for name, data in samples.items():
+            with self.subTest(name=name):
+                path = self.write(name, data)
+                self.assertEqual(read_text(path, chunk_size=5), RESULT_TEXT)
+                self.assertEqual(scan_text(path, KEYWORDS, [], chunk_size=5), ([], []))
+
+    def test_bomless_utf16_is_detected_from_nul_bytes(self):
+        text = "count: 3\ntotal: 60\n"
+        for encoding in ("utf-16-le", "utf-16-be"):
+            with self.subTest(encoding=encoding):
+                path = self.write(f"{encoding}.txt", text.encode(encoding))
+                self.assertEqual(read_text(path, chunk_size=6), text)
+
+
+class ChunkOverlapTest(DoneEngineTestCase):
+    def test_keyword_across_chunk_boundary(self):
+        path = self.write("result.txt", ("x" * 9 + "合計: 1").encode("utf-8"))
+        for chunk_size in range(1, 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(scan_text(path, ["合計:"], [], chunk_size=chunk_size), ([], []))
+
+    def test_regex_across_chunk_boundary(self):
+        path = self.write("result.txt", ("x" * 30 + "平均: 12.5\n").encode("utf-8"))
+        missing = scan_text(path, [], [r"平均: \d+\.\d+"], chunk_size=8, overlap_chars=16)
+        self.assertEqual(missing, ([], []))
+
+    def test_missing_keyword_is_reported(self):
+        path = self.write("result.txt", "合計: 1\n".encode("utf-8"))
+        self.assertEqual(scan_text(path, KEYWORDS, [], chunk_size=4), (["平均:", "件数:"], []))
+
+
+class DoneConditionEngineTest(DoneEngineTestCase):
+    def make_engine(self, checks: list, mode: str = "all") -> DoneConditionEngine:
+        return DoneConditionEngine(checks, self.tmp_dir, mode=mode, done_reason="完了")
+
+    def test_keywords_and_missing_file(self):
+        engine = self.make_engine([{"glob": "results/result_v2.txt", "keywords": KEYWORDS}])
+        result = engine.evaluate()
+        self.assertFalse(result.done)
+        self.assertIn("が存在しない", result.reason)
+
+        self.write("results/result_v2.txt", RESULT_TEXT.encode("utf-8"))
+        result = engine.evaluate()
+        self.assertTrue(result.done)
+        self.assertEqual(result.reason, "完了")
+
+    def test_json_path_conditions(self):
+        self.write("out.json", json.dumps({"summary": {"count": 3, "items": ["a"]}}).encode("utf-8"))
+        engine = self.make_engine([{"glob": "out.json", "json": [
+            {"path": "$.summary.count", "equals": 3},
+            {"path": "$.summary.items[0]", "not_empty": True},
+        ]}])
+        self.assertTrue(engine.evaluate().done)
+
+        engine = self.make_engine([{"glob": "out.json", "json": [{"path": "$.summary.total"}]}])
+        result = engine.evaluate()
+        self.assertFalse(result.done)
+        self.assertIn("$.summary.total が存在しない", result.reason)
+
+    def test_mode_any(self):
+        self.write("b.txt", b"ok")
+        engine = self.make_engine([{"glob": "a.txt"}, {"glob": "b.txt", "keywords": ["ok"]}], mode="any")
+        self.assertTrue(engine.evaluate().done)
+
+    def test_unchanged_file_is_served_from_cache(self):
+        path = self.write("result.txt", RESULT_TEXT.encode("utf-8"))
+        engine = self.make_engine([{"glob": "result.txt", "keywords": KEYWORDS}])
+        engine.evaluate()
+        engine.evaluate()
+        self.assertEqual(engine.summary()["cache_hits"], 1)
+
+        path.write_bytes("合計: 60\n".encode("utf-8"))
+        os.utime(path, ns=(1, 1))
+        self.assertFalse(engine.evaluate().done)
+        self.assertEqual(engine.summary()["cache_hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
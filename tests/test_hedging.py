@@ -0,0 +1,119 @@
+"""
+TOS v0.3 テスト - ヘッジリクエスト
+ヘッジの閾値・レート上限と、どちらかのリクエストが失敗・例外になっても他方の結果を採用することを確認する
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.circuit import CircuitOpenError  # noqa: E402
+from tos_runtime.hedging import HedgePolicy, run_hedged  # noqa: E402
+
+KEY = ("openai", "draft")
+HEDGE_DELAY_MS = 20
+
+
+def warm_policy() -> HedgePolicy:
+    policy = HedgePolicy(enabled=True, min_samples=3, max_extra_rate=1.0)
+    for _ in range(3):
+        policy.record_latency(KEY, HEDGE_DELAY_MS)
+    return policy
+
+
+def requests(*behaviours):
+    """呼ばれた順に behaviours[i] = (待ち秒数, 結果 or 例外) を返す start_request"""
+    calls = []
+
+    def start_request(cancel_event):
+        delay, outcome = behaviours[len(calls)]
+        calls.append(cancel_event)
+
+        async def run():
+            await asyncio.sleep(delay)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        return run()
+
+    return start_request, calls
+
+
+class HedgePolicyTest(unittest.TestCase):
+    def test_warmup_and_rate_cap(self):
+        policy = HedgePolicy(enabled=True, min_samples=2, max_extra_rate=0.5)
+        self.assertIsNone(policy.plan(KEY))
+        policy.record_latency(KEY, 100)
+        policy.record_latency(KEY, 300)
+
+        self.assertAlmostEqual(policy.plan(KEY), 0.3)
+        self.assertIsNone(policy.plan(KEY))
+        summary = policy.summary()
+        self.assertEqual(summary["skipped_warmup"], 1)
+        self.assertEqual(summary["skipped_rate_cap"], 1)
+
+    def test_stage_filter(self):
+        policy = HedgePolicy(enabled=True, stages=("draft",))
+        self.assertTrue(policy.applies_to("draft"))
+        self.assertFalse(policy.applies_to("review"))
+        self.assertFalse(HedgePolicy().applies_to("draft"))
+
+    def test_record_outcome(self):
+        policy = HedgePolicy(enabled=True)
+        policy.record_outcome(True, cancelled=1)
+        policy.record_outcome(False)
+        summary = policy.summary()
+        self.assertEqual((summary["hedge_wins"], summary["losers_cancelled"]), (1, 1))
+
+
+class RunHedgedTest(unittest.TestCase):
+    def run_hedged(self, policy, start_request):
+        return asyncio.run(run_hedged(policy, KEY, start_request))
+
+    def test_fast_primary_is_not_hedged(self):
+        start_request, calls = requests((0, "primary"))
+        result, info = self.run_hedged(warm_policy(), start_request)
+        self.assertEqual(result, "primary")
+        self.assertFalse(info["hedged"])
+        self.assertEqual(len(calls), 1)
+
+    def test_faster_hedge_wins_and_primary_is_cancelled(self):
+        policy = warm_policy()
+        start_request, calls = requests((1.0, "primary"), (0, "hedge"))
+        result, info = self.run_hedged(policy, start_request)
+        self.assertEqual(result, "hedge")
+        self.assertEqual(info["winner"], "hedge")
+        self.assertTrue(calls[0].is_set())
+        self.assertEqual(policy.summary()["hedge_wins"], 1)
+        self.assertEqual(policy.summary()["losers_cancelled"], 1)
+
+    def test_hedge_error_does_not_cancel_primary(self):
+        # half_open の試行枠を一次リクエストが持っているため、ヘッジは回路確認で即失敗する
+        start_request, calls = requests((0.1, "primary"), (0, CircuitOpenError("openai", 60)))
+        result, info = self.run_hedged(warm_policy(), start_request)
+        self.assertEqual(result, "primary")
+        self.assertEqual(info["winner"], "primary")
+        self.assertFalse(calls[0].is_set())
+
+    def test_primary_error_falls_back_to_hedge(self):
+        start_request, _ = requests((0.05, RuntimeError("primary failed")), (0.1, "hedge"))
+        result, info = self.run_hedged(warm_policy(), start_request)
+        self.assertEqual(result, "hedge")
+        self.assertEqual(info["winner"], "hedge")
+
+    def test_error_is_raised_only_when_both_fail(self):
+        start_request, _ = requests((0.05, RuntimeError("primary failed")), (0.1, None))
+        with self.assertRaises(RuntimeError):
+            self.run_hedged(warm_policy(), start_request)
+
+        start_request, _ = requests((0.05, None), (0.1, None))
+        result, _ = self.run_hedged(warm_policy(), start_request)
+        self.assertIsNone(result)
+
+
+if __name__ == "__main__":
+    unittest.main()
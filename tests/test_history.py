@@ -0,0 +1,84 @@
+"""
+TOS v0.3 テスト - コンテキスト履歴
+直近ステップの保持、古いステップの要約行への畳み込み、予算内への圧縮を確認する
+"""
+
+import json
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.history import HistoryManager, estimate_tokens  # noqa: E402
+
+
+def fill(manager: HistoryManager, count: int, summary: str = "集計結果を result_v2.txt に書き出した") -> None:
+    for step in range(1, count + 1):
+        manager.append({"step": step, "summary": f"{summary} ({step})"})
+
+
+class EstimateTokensTest(unittest.TestCase):
+    def test_ascii_and_non_ascii(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd"), 1)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+        self.assertEqual(estimate_tokens("合計"), 2)
+        self.assertEqual(estimate_tokens("合計abcd"), 3)
+
+
+class HistoryManagerTest(unittest.TestCase):
+    def test_short_history_is_verbatim(self):
+        manager = HistoryManager(keep_recent=3)
+        fill(manager, 2)
+        history_json, stats = manager.render()
+
+        self.assertEqual([entry["step"] for entry in json.loads(history_json)], [1, 2])
+        self.assertEqual(stats["verbatim"], 2)
+        self.assertEqual(stats["digested"], 0)
+
+    def test_old_steps_are_folded_into_digest(self):
+        manager = HistoryManager(keep_recent=2, budget=0, digest_summary_chars=6)
+        fill(manager, 5)
+        history = json.loads(manager.render()[0])
+
+        self.assertEqual(len(history[0]["digest"]), 3)
+        self.assertTrue(history[0]["digest"][0].startswith("step 1: "))
+        self.assertTrue(history[0]["digest"][0].endswith("…"))
+        self.assertEqual([entry["step"] for entry in history[1:]], [4, 5])
+
+    def test_render_stays_within_budget(self):
+        for unit in ("tokens", "chars"):
+            with self.subTest(unit=unit):
+                manager = HistoryManager(keep_recent=3, budget=120, budget_unit=unit)
+                fill(manager, 30)
+                history_json, stats = manager.render()
+
+                self.assertLessEqual(manager.measure(history_json), 120)
+                self.assertGreater(stats["omitted"], 0)
+                self.assertEqual(json.loads(history_json)[-1]["step"], 30)
+                self.assertLess(stats["compaction_ratio"], 1.0)
+
+    def test_single_long_entry_is_truncated_to_budget(self):
+        manager = HistoryManager(keep_recent=1, budget=50, budget_unit="chars")
+        manager.append({"step": 1, "summary": "x" * 500})
+        history_json, _ = manager.render()
+
+        self.assertLessEqual(len(history_json), 50)
+        self.assertTrue(json.loads(history_json)[0]["summary"].endswith("…"))
+
+    def test_render_is_reused_until_append(self):
+        manager = HistoryManager()
+        fill(manager, 2)
+        first = manager.render()
+        self.assertIs(manager.render(), first)
+        manager.append({"step": 3, "summary": "done"})
+        self.assertIsNot(manager.render(), first)
+
+    def test_invalid_budget_unit(self):
+        with self.assertRaises(ValueError):
+            HistoryManager(budget_unit="bytes")
+
+
+if __name__ == "__main__":
+    unittest.main()
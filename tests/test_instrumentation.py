@@ -0,0 +1,195 @@
+"""
+TOS v0.3 テスト - 計測
+スパンが入れ子・スレッド・executor をまたいで記録されること、パーセンタイル、
+トークン使用量が prompts_used.<stage>.timing と phase_summary に集計されることを確認する
+"""
+
+import asyncio
+import contextvars
+import copy
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+from tos_runtime.async_engine import AsyncEngine  # noqa: E402
+from tos_runtime.instrumentation import (  # noqa: E402
+    SpanRecorder, percentile, record_usage, recording, span, summarize_latencies
+)
+
+
+def api_attempt(retry: int = 0, input_tokens: int = 100, output_tokens: int = 20) -> str:
+    with span("api_attempt", provider="openai", retry=retry):
+        record_usage(input_tokens, output_tokens)
+    return threading.current_thread().name
+
+
+class SpanTest(unittest.TestCase):
+    def test_nested_spans_are_recorded_inner_first(self):
+        with recording() as recorder:
+            with span("json_attempt", attempt=0) as attempt_info:
+                api_attempt()
+                attempt_info["parsed"] = True
+
+        self.assertEqual([entry["name"] for entry in recorder.spans], ["api_attempt", "json_attempt"])
+        self.assertTrue(recorder.spans[1]["parsed"])
+        self.assertGreaterEqual(recorder.spans[1]["duration_ms"], recorder.spans[0]["duration_ms"])
+
+    def test_error_type_is_recorded(self):
+        with recording() as recorder:
+            with self.assertRaises(ValueError):
+                with span("api_attempt"):
+                    raise ValueError("bad response")
+        self.assertEqual(recorder.spans[0]["error"], "ValueError")
+
+    def test_spans_outside_recording_are_dropped(self):
+        api_attempt()
+        with recording() as recorder:
+            pass
+        self.assertEqual(recorder.spans, [])
+
+    def test_threads_record_only_with_copied_context(self):
+        with recording() as recorder:
+            # contextvars を引き継がないスレッドの記録は入らない
+            plain = threading.Thread(target=api_attempt)
+            plain.start()
+            plain.join()
+            ctx = contextvars.copy_context()
+            copied = threading.Thread(target=ctx.run, args=(api_attempt,))
+            copied.start()
+            copied.join()
+
+        self.assertEqual(recorder.count("api_attempt"), 1)
+        self.assertEqual(recorder.usage, {"input_tokens": 100, "output_tokens": 20})
+
+    def test_spans_cross_executor_hops(self):
+        engine = AsyncEngine(max_concurrency=2)
+
+        async def call():
+            with recording() as recorder:
+                with span("stage"):
+                    await engine.run_blocking(api_attempt, 0)
+                    await asyncio.gather(engine.run_concurrent(api_attempt, 1),
+                                         engine.run_concurrent(api_attempt, 1))
+            return recorder
+
+        try:
+            for driver in (engine.run_sync, asyncio.run):
+                with self.subTest(driver=driver.__name__):
+                    recorder = driver(call())
+                    self.assertEqual(recorder.count("api_attempt"), 3)
+                    self.assertEqual(recorder.count("stage"), 1)
+                    self.assertEqual(recorder.usage, {"input_tokens": 300, "output_tokens": 60})
+        finally:
+            engine.shutdown()
+
+    def test_concurrent_recordings_do_not_mix(self):
+        recorders = {}
+
+        def worker(count):
+            with recording() as recorder:
+                for _ in range(count):
+                    api_attempt()
+            recorders[count] = recorder
+
+        threads = [threading.Thread(target=worker, args=(count,)) for count in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({count: recorder.count("api_attempt") for count, recorder in recorders.items()},
+                         {1: 1, 2: 2, 3: 3})
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(20, 0, -1))
+        self.assertEqual(percentile(values, 50), 10)
+        self.assertEqual(percentile(values, 95), 19)
+        self.assertEqual(percentile(values, 100), 20)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize_latencies(self):
+        self.assertEqual(summarize_latencies([30, 10, 20]),
+                         {"count": 3, "p50_ms": 20, "p95_ms": 30, "max_ms": 30})
+        self.assertEqual(summarize_latencies([]), {"count": 0, "p50_ms": None, "p95_ms": None, "max_ms": None})
+
+
+class BuildCallTimingTest(unittest.TestCase):
+    def test_counts_retries_and_usage(self):
+        recorder = SpanRecorder()
+        with recording(recorder):
+            with span("json_attempt", attempt=0):
+                api_attempt(retry=0)
+                api_attempt(retry=1, input_tokens=50, output_tokens=5)
+            with span("json_attempt", attempt=1):
+                api_attempt(retry=0)
+
+        timing = orchestrator.build_call_timing(recorder, 12.3456)
+        self.assertEqual(timing["total_ms"], 12.346)
+        self.assertEqual(timing["api_attempts"], 3)
+        self.assertEqual(timing["api_retries"], 1)
+        self.assertEqual(timing["json_attempts"], 2)
+        self.assertEqual(timing["json_retries"], 1)
+        self.assertEqual(timing["usage"], {"input_tokens": 250, "output_tokens": 45})
+        self.assertEqual(len(timing["spans"]), 5)
+
+
+class TokenUsageRollupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="tos_instrumentation_test_"))
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            self.config = copy.deepcopy(json.load(f))
+        (self.tmp_dir / "logs" / "steps").mkdir(parents=True)
+        self.config["logs_dir"] = str(self.tmp_dir / "logs")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_draft(self):
+        def fake_openai(config, prompt, api_key, cancel_event=None):
+            api_attempt(input_tokens=120, output_tokens=30)
+            return '{"thought": "集計", "commands": []}'
+
+        with mock.patch.object(orchestrator, "call_openai_api", fake_openai), \
+                mock.patch.object(orchestrator, "get_api_keys", return_value=("key", "")):
+            return orchestrator.make_draft(self.config, 1, {"history": []}, "key")
+
+    def test_usage_is_recorded_in_stage_timing(self):
+        _, parsed, prompt_info = self.make_draft()
+        self.assertIsNotNone(parsed)
+        timing = prompt_info["timing"]
+        self.assertEqual(timing["usage"], {"input_tokens": 120, "output_tokens": 30})
+        self.assertEqual(timing["api_attempts"], 1)
+
+    def test_usage_and_latency_are_summed_into_phase_summary(self):
+        _, _, prompt_info = self.make_draft()
+        for step_num in (1, 2):
+            orchestrator.write_step_log(self.config, step_num, {
+                "phase": "execute",
+                "prompts_used": {"draft": prompt_info, "final": prompt_info},
+                "execution": {"command_results": [{"duration_ms": 10.0 * step_num}]}
+            })
+
+        summary_file = orchestrator.write_phase_summary(self.config)
+        with open(summary_file, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+
+        self.assertEqual(summary["token_usage"]["input_tokens"], 480)
+        self.assertEqual(summary["token_usage"]["output_tokens"], 120)
+        self.assertEqual(summary["latency"]["draft"]["count"], 2)
+        self.assertEqual(summary["latency"]["api_attempt"]["count"], 4)
+        self.assertEqual(summary["latency"]["command"], {"count": 2, "p50_ms": 10.0, "p95_ms": 20.0, "max_ms": 20.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+TOS v0.3 テスト - インタプリタ検証キャッシュ
+(パス, サイズ, mtime) が変わらない限りプローブを省き、変わった場合・失敗した場合・形式の違うキャッシュは
+プローブし直すことを確認する
+"""
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime import interpreter as interpreter_module  # noqa: E402
+from tos_runtime.interpreter import CACHE_VERSION, InterpreterCache, interpreter_key, probe_interpreter  # noqa: E402
+
+CAPABILITIES = {"version": "3.12.1", "implementation": "CPython", "platform": "win32", "bits": 64}
+
+
+class InterpreterCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="tos_interpreter_test_"))
+        self.cache_path = self.tmp_dir / "interpreter_cache.json"
+        self.python_path = self.make_interpreter("python.exe")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_interpreter(self, name: str, content: bytes = b"MZ fake interpreter") -> str:
+        path = self.tmp_dir / name
+        path.write_bytes(content)
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        return str(path)
+
+    def verify(self, python_path: str = None, capabilities=CAPABILITIES) -> tuple:
+        """新しいプロセスを模して、キャッシュファイルから読み直すインスタンスで検証する"""
+        cache = InterpreterCache(self.cache_path)
+        with mock.patch.object(interpreter_module, "probe_interpreter", return_value=capabilities) as probe:
+            result = cache.verify(python_path or self.python_path)
+        return result, probe.call_count
+
+    def test_cache_hit_skips_probe(self):
+        result, probes = self.verify()
+        self.assertEqual((result["cached"], probes), (False, 1))
+
+        result, probes = self.verify()
+        self.assertEqual((result["cached"], probes), (True, 0))
+        self.assertEqual(result["version"], "3.12.1")
+
+    def test_size_or_mtime_change_forces_probe(self):
+        self.verify()
+        Path(self.python_path).write_bytes(b"MZ updated interpreter build")
+        os.utime(self.python_path, ns=(1_000_000_000, 1_000_000_000))
+        self.assertEqual(self.verify()[1], 1)
+
+        os.utime(self.python_path, ns=(2_000_000_000, 2_000_000_000))
+        self.assertEqual(self.verify()[1], 1)
+        self.assertEqual(self.verify()[1], 0)
+
+    def test_resolved_path_change_forces_probe(self):
+        other = self.make_interpreter("other_python.exe")
+        with mock.patch.object(interpreter_module.shutil, "which", return_value=self.python_path):
+            self.assertEqual(self.verify("python")[1], 1)
+            self.assertEqual(self.verify("python")[1], 0)
+        # PATH 上の python が同じサイズ・mtime の別の実体に変わった
+        with mock.patch.object(interpreter_module.shutil, "which", return_value=other):
+            self.assertEqual(self.verify("python")[1], 1)
+
+    def test_failed_probe_is_not_recorded(self):
+        result, probes = self.verify(capabilities=None)
+        self.assertIsNone(result)
+        self.assertFalse(self.cache_path.exists())
+        self.assertEqual(self.verify()[1], 1)
+
+    def test_cache_file_with_other_version_is_ignored(self):
+        entry = dict(interpreter_key(self.python_path), capabilities=CAPABILITIES)
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION + 1, "entries": {self.python_path: entry}}, f)
+        self.assertEqual(self.verify()[1], 1)
+
+        with open(self.cache_path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["version"], CACHE_VERSION)
+
+    def test_missing_interpreter_is_not_cached(self):
+        missing = str(self.tmp_dir / "missing.exe")
+        result, probes = self.verify(missing, capabilities=None)
+        self.assertIsNone(result)
+        self.assertEqual(probes, 1)
+        self.assertIsNone(interpreter_key(missing))
+
+
+class ProbeInterpreterTest(unittest.TestCase):
+    def test_probe_current_interpreter(self):
+        capabilities = probe_interpreter(sys.executable)
+        self.assertEqual(capabilities["version"], platform.python_version())
+        self.assertEqual(capabilities["implementation"], platform.python_implementation())
+
+
+if __name__ == "__main__":
+    unittest.main()
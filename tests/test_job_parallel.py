@@ -0,0 +1,147 @@
+"""
+TOS v0.3 テスト - job_loop 並列実行
+ジョブごとの設定がログ・状態・workspace・done 判定を共有しないこと、完了済みジョブのスキップ、
+統合サマリの集計を確認する
+"""
+
+import concurrent.futures
+import copy
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+
+RESULT_TEXT = "合計: 10\n平均: 5\n件数: 2\n"
+
+
+class ParallelJobTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="tos_job_parallel_test_"))
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            self.config = copy.deepcopy(json.load(f))
+        self.config["workspace_dir"] = "workspace"
+        self.config["logs_dir"] = str(self.tmp_dir / "logs")
+        self.config["phase_state_path"] = str(self.tmp_dir / "phase_state.json")
+        job_loop = self.config["s5_settings"]["job_loop"]
+        job_loop["max_jobs"] = 3
+        job_loop["job_result"] = {"path": str(self.tmp_dir / "job_result.json")}
+        job_loop["parallel"] = {"enabled": True, "max_workers": 2, "jobs_dir": str(self.tmp_dir / "jobs"),
+                                "summary_file": str(self.tmp_dir / "job_loop_summary.json")}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class BuildJobConfigTest(ParallelJobTestCase):
+    def job_paths(self, job_config: dict) -> list:
+        return [
+            job_config["logs_dir"],
+            job_config["workspace_dir"],
+            job_config["command_cwd"],
+            job_config["phase_state_path"],
+            job_config["step_wal"]["path"],
+            job_config["step_log"]["journal_dir"],
+            job_config["s5_settings"]["job_loop"]["job_result"]["path"],
+            job_config["done_conditions"]["checks"][0]["glob"],
+            job_config["command_capture"]["spill_dir"],
+        ]
+
+    def test_jobs_do_not_share_paths(self):
+        original = copy.deepcopy(self.config)
+        first = orchestrator.build_job_config(self.config, 1)
+        second = orchestrator.build_job_config(self.config, 2)
+
+        for path in self.job_paths(first):
+            self.assertTrue(path.startswith(str(self.tmp_dir / "jobs" / "job_001")), path)
+        self.assertTrue(set(self.job_paths(first)).isdisjoint(self.job_paths(second)))
+        self.assertFalse(first["s5_settings"]["job_loop"]["parallel"]["enabled"])
+        self.assertEqual(self.config, original)
+
+    def test_workspace_paths_resolve_from_command_cwd(self):
+        job_config = orchestrator.build_job_config(self.config, 1)
+        workspace = orchestrator.get_command_cwd(job_config) / "workspace"
+        self.assertEqual(workspace, orchestrator.BASE_DIR / job_config["workspace_dir"])
+        self.assertEqual(orchestrator.get_command_cwd(self.config), orchestrator.BASE_DIR)
+        self.assertEqual(job_config["done_conditions"]["checks"][0]["glob"],
+                         f"{job_config['workspace_dir']}/results/result_v2.txt")
+
+    def test_result_of_one_job_does_not_complete_another(self):
+        first = orchestrator.build_job_config(self.config, 1)
+        second = orchestrator.build_job_config(self.config, 2)
+        for job_config in (first, second):
+            orchestrator.ensure_dirs(job_config)
+        result_file = orchestrator.get_command_cwd(first) / "workspace" / "results" / "result_v2.txt"
+        result_file.write_text(RESULT_TEXT, encoding="utf-8")
+
+        self.assertTrue(orchestrator.evaluate_done_conditions(first).done)
+        self.assertFalse(orchestrator.evaluate_done_conditions(second).done)
+
+
+def fake_run_job_process(config: dict, job_index: int) -> dict:
+    """ジョブごとに異なる件数の phase_summary を書いて完了したことにする"""
+    job_config = orchestrator.build_job_config(config, job_index)
+    job_dir = orchestrator.BASE_DIR / job_config["logs_dir"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+    summary = {"total_steps": job_index, "success_count": job_index, "fail_count": 0, "final_done": True,
+               "execution_summary": {"executed_count": job_index * 2}}
+    with open(job_dir / "phase_summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f)
+    return {"job_index": job_index, "status": "completed", "end_reason": "done",
+            "job_dir": job_config["logs_dir"], "phase_summary_path": f"{job_config['logs_dir']}/phase_summary.json",
+            "job_result_path": job_config["s5_settings"]["job_loop"]["job_result"]["path"]}
+
+
+class RunJobsParallelTest(ParallelJobTestCase):
+    def run_jobs(self, runner=fake_run_job_process):
+        # ワーカーはスレッドで代用する（run_job_process の差し替えを子プロセスに渡せないため）
+        with mock.patch.object(concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor), \
+                mock.patch.object(orchestrator, "run_job_process", side_effect=runner) as run_job_process, \
+                mock.patch.object(orchestrator, "check_prerequisites", return_value=("python", "key", "key")):
+            summary_file = orchestrator.run_jobs_parallel(self.config)
+        with open(summary_file, "r", encoding="utf-8") as f:
+            return json.load(f), run_job_process
+
+    def test_summary_merges_job_results(self):
+        summary, run_job_process = self.run_jobs()
+
+        self.assertEqual(run_job_process.call_count, 3)
+        self.assertEqual([job["job_index"] for job in summary["jobs"]], [1, 2, 3])
+        self.assertEqual(summary["totals"]["total_steps"], 6)
+        self.assertEqual(summary["execution_summary"]["executed_count"], 12)
+        self.assertTrue(summary["all_done"])
+        self.assertTrue(orchestrator.load_phase_state(self.config)["last_done"])
+
+    def test_completed_jobs_are_skipped(self):
+        job_config = orchestrator.build_job_config(self.config, 2)
+        orchestrator.save_phase_state(job_config, current_phase="done", current_step=4, last_done=True,
+                                      last_done_reason="完了")
+
+        summary, run_job_process = self.run_jobs()
+
+        self.assertEqual(sorted(call.args[1] for call in run_job_process.call_args_list), [1, 3])
+        statuses = {job["job_index"]: job["status"] for job in summary["jobs"]}
+        self.assertEqual(statuses, {1: "completed", 2: "already_completed", 3: "completed"})
+
+    def test_failed_job_is_reported(self):
+        def runner(config, job_index):
+            if job_index == 2:
+                raise RuntimeError("worker crashed")
+            return fake_run_job_process(config, job_index)
+
+        summary, _ = self.run_jobs(runner)
+
+        self.assertFalse(summary["all_done"])
+        self.assertEqual(summary["jobs"][1]["status"], "error")
+        self.assertEqual(summary["end_reason"], "job_loop_parallel: 2/3 jobs finished")
+
+
+if __name__ == "__main__":
+    unittest.main()
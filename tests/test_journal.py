@@ -0,0 +1,111 @@
+"""
+TOS v0.3 テスト - ステップジャーナル
+追記・索引経由の読込・再起動時の索引復元と、files 形式と同じ重複実行チェックになることを確認する
+"""
+
+import copy
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+from tos_runtime.journal import INDEX_FILE, StepJournal  # noqa: E402
+
+
+class StepJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_journal_test_")
+        self.journal_dir = Path(self.tmp_dir) / "journal"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_append_and_read(self):
+        journal = StepJournal(self.journal_dir)
+        journal.append(1, 1, {"phase": "execute", "message": "合計"})
+        journal.append(1, 1, {"phase": "done"})
+        journal.append(2, 1, {"phase": "error"})
+
+        self.assertEqual(journal.read(1, 1), {"phase": "done"})
+        self.assertEqual(journal.read(2, 1), {"phase": "error"})
+        self.assertIsNone(journal.read(3, 1))
+        self.assertEqual(journal.keys(), [(1, 1), (2, 1)])
+
+    def test_index_is_restored_on_reopen(self):
+        journal = StepJournal(self.journal_dir, segment_max_bytes=64)
+        for step_num in range(1, 4):
+            journal.append(None, step_num, {"phase": "execute", "step_num": step_num})
+
+        reopened = StepJournal(self.journal_dir)
+        self.assertEqual(reopened.keys(), [(None, 1), (None, 2), (None, 3)])
+        self.assertEqual(reopened.read(None, 3)["step_num"], 3)
+        self.assertGreater(reopened.location(None, 3)[0], 1)
+
+    def test_torn_index_tail_is_ignored(self):
+        journal = StepJournal(self.journal_dir)
+        journal.append(None, 1, {"phase": "execute"})
+        with open(self.journal_dir / INDEX_FILE, "ab") as f:
+            f.write(b"\x01\x02\x03")
+
+        reopened = StepJournal(self.journal_dir)
+        self.assertEqual(reopened.keys(), [(None, 1)])
+
+    def test_rebuild_index_from_segments(self):
+        journal = StepJournal(self.journal_dir)
+        journal.append(None, 1, {"phase": "execute"})
+        journal.append(None, 2, {"phase": "done"})
+        (self.journal_dir / INDEX_FILE).unlink()
+
+        reopened = StepJournal(self.journal_dir)
+        self.assertFalse(reopened.has_step(1))
+        self.assertEqual(reopened.rebuild_index(), 2)
+        self.assertTrue(reopened.has_step(2))
+        self.assertEqual(reopened.read(None, 2), {"phase": "done"})
+
+    def test_has_step_ignores_job_index(self):
+        journal = StepJournal(self.journal_dir)
+        journal.append(1, 2, {"phase": "execute"})
+
+        self.assertTrue(journal.has_step(2))
+        self.assertFalse(journal.has_step(1))
+        self.assertFalse(journal.exists(2, 2))
+
+
+class StepLogExistsTest(unittest.TestCase):
+    """files 形式と journal 形式で重複実行チェックの結果が一致する"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_step_log_test_")
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            self.base_config = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_config(self, backend: str) -> dict:
+        config = copy.deepcopy(self.base_config)
+        logs_dir = Path(self.tmp_dir) / backend
+        (logs_dir / "steps").mkdir(parents=True)
+        config["logs_dir"] = str(logs_dir)
+        config["step_log"] = {"backend": backend, "journal_dir": str(logs_dir / "journal")}
+        return config
+
+    def test_backends_agree(self):
+        results = {}
+        for backend in ("files", "journal"):
+            config = self.make_config(backend)
+            orchestrator.write_step_log(config, 1, {"phase": "execute", "job_index": 1})
+            results[backend] = [orchestrator.step_log_exists(config, step_num) for step_num in (1, 2)]
+
+        self.assertEqual(results["files"], [True, False])
+        self.assertEqual(results["journal"], results["files"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+TOS v0.3 テスト - job_payload メモ
+JSON 化・ハッシュの共有、プレビューの切り詰め、内容アドレスのブロブが1度だけ書かれることを確認する
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.payload import (  # noqa: E402
+    TRUNCATED_SUFFIX, PayloadMemo, blob_path_for, get_payload_memo
+)
+
+PAYLOAD = {"job_id": "J-001", "rows": [{"name": "東京", "value": 3}, {"name": "大阪", "value": 5}]}
+
+
+class PayloadMemoTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_payload_test_")
+        self.blob_dir = Path(self.tmp_dir) / "blobs"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_prompt_json_is_unchanged(self):
+        memo = PayloadMemo(PAYLOAD)
+        self.assertEqual(memo.prompt_json, json.dumps(PAYLOAD, ensure_ascii=False))
+
+    def test_ref_ignores_key_order(self):
+        reordered = {"rows": PAYLOAD["rows"], "job_id": PAYLOAD["job_id"]}
+        self.assertEqual(PayloadMemo(reordered).ref, PayloadMemo(PAYLOAD).ref)
+        self.assertNotEqual(PayloadMemo(dict(PAYLOAD, job_id="J-002")).ref, PayloadMemo(PAYLOAD).ref)
+
+    def test_preview_is_truncated(self):
+        memo = PayloadMemo(PAYLOAD)
+        self.assertEqual(memo.preview(10_000), memo.prompt_json)
+        preview = memo.preview(10)
+        self.assertEqual(preview, memo.prompt_json[:10] + TRUNCATED_SUFFIX)
+        self.assertIs(memo.preview(10), preview)
+
+    def test_blob_is_written_once(self):
+        memo = PayloadMemo(PAYLOAD)
+        path = memo.store(self.blob_dir)
+        self.assertEqual(memo.store(self.blob_dir), path)
+        self.assertEqual(path, blob_path_for(self.blob_dir, memo.ref))
+        with open(path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), PAYLOAD)
+
+        # 別のジョブが同じ内容を保存しても書き直さない
+        other = PayloadMemo(json.loads(json.dumps(PAYLOAD)))
+        other.store(self.blob_dir)
+        self.assertEqual(memo.summary()["blob_writes"], 1)
+        self.assertEqual(other.summary()["blob_writes"], 0)
+        self.assertEqual(other.summary()["blob_hits"], 1)
+        self.assertEqual([p.name for p in self.blob_dir.iterdir()], [path.name])
+
+    def test_invalid_ref(self):
+        with self.assertRaises(ValueError):
+            blob_path_for(self.blob_dir, "md5:abc")
+
+
+class GetPayloadMemoTest(unittest.TestCase):
+    def test_memo_is_reused_for_the_same_payload(self):
+        payload = dict(PAYLOAD)
+        memo = get_payload_memo(payload)
+        self.assertIs(get_payload_memo(payload), memo)
+        self.assertIsNot(get_payload_memo(dict(PAYLOAD)), memo)
+        self.assertIsNone(get_payload_memo(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+TOS v0.3 テスト - 実行ポリシーエンジン
+Aho-Corasick による deny_if_contains 判定と ExecutionPolicy の判定が、
+キーワード・パターンを順に調べる従来の check_allowlist と一致することを確認する
+"""
+
+import re
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.policy import AhoCorasickMatcher, ExecutionPolicy  # noqa: E402
+
+DENY_IF_CONTAINS = ["Remove-Item", "rmdir", "del ", "format ", "shutdown", "reg add"]
+ALLOW_TYPES = ["powershell"]
+DENY_PATTERNS = ["Remove-Item.*-Recurse", "rmdir.*/s", "curl ", "Start-Process", "Invoke-WebRequest"]
+
+COMMANDS = [
+    ("powershell", "Set-Content -Path a.txt -Value '合計: 10' -Encoding UTF8"),
+    ("powershell", "Remove-Item a.txt"),
+    ("powershell", "remove-item -recurse x"),
+    ("powershell", "echo shutdown now"),
+    ("powershell", "reg add HKCU\\x"),
+    ("powershell", "del a.txt"),
+    ("powershell", "Get-ChildItem | Format-Table"),
+    ("powershell", "curl http://example.com"),
+    ("powershell", "start-process notepad"),
+    ("powershell", ""),
+    ("sh", "ls"),
+    ("sh", "rmdir /s x"),
+]
+
+
+def reference_check(deny_if_contains, allow_types, deny_patterns, cmd_type, code):
+    """baseline の check_allowlist と同じ判定"""
+    for keyword in deny_if_contains:
+        if keyword in code:
+            return False, f"deny_if_contains '{keyword}' に一致", keyword
+    if cmd_type not in allow_types:
+        return False, f"type '{cmd_type}' は許可されていない (allow_types: {allow_types})", None
+    for pattern in deny_patterns:
+        if re.search(pattern, code, re.IGNORECASE):
+            return False, f"禁止パターン '{pattern}' に一致", pattern
+    return True, "allowlist通過", None
+
+
+class AhoCorasickMatcherTest(unittest.TestCase):
+    def test_returns_lowest_index_among_matches(self):
+        matcher = AhoCorasickMatcher(["she", "he", "hers", "his"])
+        self.assertEqual(matcher.find_first("ushers"), 0)
+        self.assertEqual(matcher.find_first("hers"), 1)
+        self.assertEqual(matcher.find_first("this"), 3)
+        self.assertIsNone(matcher.find_first("xyz"))
+
+    def test_overlapping_suffix_is_found(self):
+        matcher = AhoCorasickMatcher(["abcd", "bc"])
+        self.assertEqual(matcher.find_first("abce"), 1)
+
+    def test_empty_keyword_matches_everything(self):
+        self.assertEqual(AhoCorasickMatcher([""]).find_first("ls"), 0)
+        self.assertEqual(AhoCorasickMatcher([""]).find_first(""), 0)
+        matcher = AhoCorasickMatcher(["rm", ""])
+        self.assertEqual(matcher.find_first("ls"), 1)
+        self.assertEqual(matcher.find_first("rm -f"), 0)
+
+
+class ExecutionPolicyTest(unittest.TestCase):
+    def make_policy(self, deny_if_contains):
+        return ExecutionPolicy(deny_if_contains=deny_if_contains, allow_types=ALLOW_TYPES,
+                               deny_patterns=DENY_PATTERNS)
+
+    def test_matches_sequential_check(self):
+        for deny_if_contains in (DENY_IF_CONTAINS, DENY_IF_CONTAINS + [""], ["", "rmdir"]):
+            policy = self.make_policy(deny_if_contains)
+            for cmd_type, code in COMMANDS:
+                with self.subTest(deny_if_contains=deny_if_contains, code=code):
+                    expected = reference_check(deny_if_contains, ALLOW_TYPES, DENY_PATTERNS, cmd_type, code)
+                    self.assertEqual(policy.check(cmd_type, code), expected)
+
+    def test_empty_deny_keyword_denies_every_command(self):
+        policy = self.make_policy(["shutdown", ""])
+        allowed, _, matched = policy.check("powershell", "Get-Date")
+        self.assertFalse(allowed)
+        self.assertEqual(matched, "")
+
+    def test_backreference_patterns_still_match(self):
+        deny_patterns = ["(a)b", r"(x)\1", "curl "]
+        policy = ExecutionPolicy(allow_types=ALLOW_TYPES, deny_patterns=deny_patterns)
+        for code in ("xx", "XX", "ab", "xy", "curl http://example.com"):
+            with self.subTest(code=code):
+                expected = reference_check([], ALLOW_TYPES, deny_patterns, "powershell", code)
+                self.assertEqual(policy.check("powershell", code), expected)
+        self.assertFalse(policy.check("powershell", "xx")[0])
+
+    def test_default_action_deny(self):
+        policy = ExecutionPolicy(default_action="deny")
+        self.assertEqual(policy.check("powershell", "Get-Date"),
+                         (False, "execution_policy.default_action=deny", None))
+
+    def test_repeated_verdicts_come_from_cache(self):
+        policy = self.make_policy(DENY_IF_CONTAINS)
+        first = policy.check("powershell", "Get-Date")
+        second = policy.check("powershell", "Get-Date")
+        self.assertEqual(first, second)
+        self.assertEqual(policy.summary()["cache_hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+TOS v0.3 テスト - LLM応答キャッシュ
+キーの作り方、TTL、LRU の追い出し、discard、ステージごとのポリシーを確認する
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.response_cache import (  # noqa: E402
+    CACHE_POLICY_OFF, CACHE_POLICY_READ_THROUGH, ResponseCache, get_stage_policy, make_cache_key
+)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_response_cache_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_key_depends_on_every_field(self):
+        base = make_cache_key("gpt-4o-mini", "draft", "プロンプト", 0.3)
+        self.assertEqual(base, make_cache_key("gpt-4o-mini", "draft", "プロンプト", 0.3))
+        self.assertNotEqual(base, make_cache_key("gpt-4o", "draft", "プロンプト", 0.3))
+        self.assertNotEqual(base, make_cache_key("gpt-4o-mini", "final", "プロンプト", 0.3))
+        self.assertNotEqual(base, make_cache_key("gpt-4o-mini", "draft", "プロンプト!", 0.3))
+        self.assertNotEqual(base, make_cache_key("gpt-4o-mini", "draft", "プロンプト", 0.0))
+
+    def test_put_then_get_survives_new_instance(self):
+        key = make_cache_key("m", "draft", "p", 0)
+        ResponseCache(self.tmp_dir).put(key, '{"commands": []}')
+
+        cache = ResponseCache(self.tmp_dir)
+        self.assertEqual(cache.get(key), '{"commands": []}')
+        self.assertIsNone(cache.get(make_cache_key("m", "draft", "other", 0)))
+        self.assertEqual(cache.summary()["hits"], 1)
+        self.assertEqual(cache.summary()["misses"], 1)
+
+    def test_expired_entry_is_removed(self):
+        cache = ResponseCache(self.tmp_dir, ttl_sec=0.01)
+        key = make_cache_key("m", "draft", "p", 0)
+        cache.put(key, "old")
+        time.sleep(0.05)
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.summary()["expired"], 1)
+        self.assertEqual(cache.summary()["entries"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(self.tmp_dir, max_bytes=0)
+        keys = [make_cache_key("m", "draft", str(i), 0) for i in range(3)]
+        for key in keys:
+            cache.put(key, "x" * 100)
+        # 3件は収まり、4件目で1件追い出される上限にする
+        cache.max_bytes = cache.summary()["total_bytes"] + 50
+
+        # keys[0] を最近使ったことにしてから1件追加する
+        cache.get(keys[0])
+        for key in keys[1:]:
+            os.utime(cache._path(key), (1, 1))
+            cache._entries[key][1] = 1
+        cache.put(make_cache_key("m", "draft", "new", 0), "x" * 100)
+
+        self.assertEqual(cache.summary()["evictions"], 1)
+        self.assertEqual(cache.get(keys[0]), "x" * 100)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[2]), "x" * 100)
+
+    def test_discard_removes_entry(self):
+        cache = ResponseCache(self.tmp_dir)
+        key = make_cache_key("m", "final", "p", 0)
+        cache.put(key, "denied final")
+
+        self.assertTrue(cache.discard(key))
+        self.assertFalse(cache.discard(key))
+        self.assertIsNone(ResponseCache(self.tmp_dir).get(key))
+
+    def test_stage_policy_defaults_to_off(self):
+        config = {"response_cache": {"stages": {"draft": "read_through", "review": "bogus"}}}
+        self.assertEqual(get_stage_policy(config, "draft"), CACHE_POLICY_READ_THROUGH)
+        self.assertEqual(get_stage_policy(config, "review"), CACHE_POLICY_OFF)
+        self.assertEqual(get_stage_policy(config, "final"), CACHE_POLICY_OFF)
+        self.assertEqual(get_stage_policy({}, "draft"), CACHE_POLICY_OFF)
+
+
+if __name__ == "__main__":
+    unittest.main()
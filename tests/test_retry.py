@@ -0,0 +1,160 @@
+"""
+TOS v0.3 テスト - API リトライ / レート制御
+エラー種別の分類、種別ごとのリトライ予算、Retry-After、トークンバケットの待ち時間を確認する
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.retry import (  # noqa: E402
+    ERROR_CLIENT, ERROR_RATE_LIMIT, ERROR_SERVER, ERROR_TRANSIENT, DecorrelatedJitter, RetryCancelled,
+    RetryExhausted, RetryScheduler, TokenBucket, classify_error, parse_retry_after
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, headers)
+
+
+def make_scheduler(**budgets) -> RetryScheduler:
+    return RetryScheduler(budgets=budgets, base_delay_sec=0.001, max_delay_sec=0.002, seed=0)
+
+
+class ClassifyErrorTest(unittest.TestCase):
+    def test_classes(self):
+        self.assertEqual(classify_error(FakeHTTPError(429)), ERROR_RATE_LIMIT)
+        self.assertEqual(classify_error(FakeHTTPError(503)), ERROR_SERVER)
+        self.assertEqual(classify_error(FakeHTTPError(408)), ERROR_SERVER)
+        self.assertEqual(classify_error(FakeHTTPError(400)), ERROR_CLIENT)
+        self.assertEqual(classify_error(ConnectionError("reset")), ERROR_TRANSIENT)
+
+    def test_retry_after_headers(self):
+        self.assertEqual(parse_retry_after(FakeHTTPError(429, {"retry-after": "2"})), 2.0)
+        self.assertEqual(parse_retry_after(FakeHTTPError(429, {"retry-after-ms": "250"})), 0.25)
+        self.assertIsNone(parse_retry_after(FakeHTTPError(429)))
+        self.assertIsNone(parse_retry_after(ValueError("no response")))
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_reservations_queue_up(self):
+        bucket = TokenBucket(rate_per_sec=10, capacity=2)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(1), 0.2, delta=0.01)
+
+    def test_refund_returns_unused_tokens(self):
+        bucket = TokenBucket(rate_per_sec=1, capacity=100)
+        bucket.reserve(100)
+        bucket.refund(60)
+        self.assertEqual(bucket.reserve(50), 0.0)
+
+    def test_oversized_request_does_not_wait_forever(self):
+        bucket = TokenBucket(rate_per_sec=10, capacity=5)
+        self.assertEqual(bucket.reserve(1000), 0.0)
+
+    def test_jitter_stays_within_bounds(self):
+        jitter = DecorrelatedJitter(base=1.0, cap=5.0)
+        for _ in range(50):
+            self.assertTrue(1.0 <= jitter.next() <= 5.0)
+
+
+class RetrySchedulerTest(unittest.TestCase):
+    def test_retries_until_success(self):
+        scheduler = make_scheduler(server=2)
+        calls = []
+
+        def attempt(retry_count):
+            calls.append(retry_count)
+            if retry_count < 2:
+                raise FakeHTTPError(503)
+            return "ok", 10
+
+        self.assertEqual(scheduler.call("openai", attempt), "ok")
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual(scheduler.summary()["openai"]["retries"][ERROR_SERVER], 2)
+
+    def test_budget_is_per_error_class(self):
+        scheduler = make_scheduler(server=1, rate_limit=1)
+        errors = [FakeHTTPError(503), FakeHTTPError(429), FakeHTTPError(503)]
+
+        def attempt(retry_count):
+            raise errors[retry_count]
+
+        with self.assertRaises(RetryExhausted) as ctx:
+            scheduler.call("openai", attempt)
+        self.assertEqual(ctx.exception.error_class, ERROR_SERVER)
+        self.assertEqual(ctx.exception.attempts, 3)
+
+    def test_client_errors_are_not_retried(self):
+        scheduler = make_scheduler()
+        attempts = []
+
+        def attempt(retry_count):
+            attempts.append(retry_count)
+            raise FakeHTTPError(400)
+
+        with self.assertRaises(RetryExhausted):
+            scheduler.call("openai", attempt)
+        self.assertEqual(attempts, [0])
+
+    def test_retry_after_is_honored(self):
+        scheduler = make_scheduler(rate_limit=1)
+
+        def attempt(retry_count):
+            if retry_count == 0:
+                raise FakeHTTPError(429, {"retry-after-ms": "100"})
+            return "ok", 0
+
+        started = time.monotonic()
+        self.assertEqual(scheduler.call("anthropic", attempt), "ok")
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(scheduler.summary()["anthropic"]["retry_after_honored"], 1)
+
+    def test_cancel_event_stops_retries(self):
+        scheduler = make_scheduler(server=5)
+        cancel = threading.Event()
+
+        def attempt(retry_count):
+            cancel.set()
+            raise FakeHTTPError(503)
+
+        with self.assertRaises(RetryCancelled):
+            scheduler.call("openai", attempt, cancel_event=cancel)
+
+    def test_unlisted_exceptions_propagate(self):
+        scheduler = make_scheduler()
+
+        def attempt(retry_count):
+            raise KeyError("bug")
+
+        with self.assertRaises(KeyError):
+            scheduler.call("openai", attempt, retry_on=(FakeHTTPError,))
+
+    def test_rate_limits_from_config(self):
+        scheduler = RetryScheduler.from_config({
+            "api_retry": 1,
+            "api_rate_limits": {"openai": {"requests_per_minute": 60}}
+        })
+        self.assertEqual(scheduler.budgets[ERROR_SERVER], 1)
+        limiter = scheduler.limiter("openai")
+        self.assertIsNotNone(limiter.requests)
+        self.assertIsNone(limiter.tokens)
+        self.assertIsNone(scheduler.limiter("anthropic").requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
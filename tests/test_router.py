@@ -0,0 +1,90 @@
+"""
+TOS v0.3 テスト - プロバイダルーター
+試行順の決め方と、実際に API を呼んだ呼び出しだけがレイテンシ・エラー率に反映されることを確認する
+"""
+
+import asyncio
+import copy
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+from tos_runtime.router import ProviderRouter  # noqa: E402
+
+
+class ProviderRouterTest(unittest.TestCase):
+    def test_disabled_router_keeps_default_provider(self):
+        router = ProviderRouter()
+        self.assertEqual(router.order("review", "anthropic"), ["anthropic"])
+        self.assertEqual(router.order("draft", "openai"), ["openai"])
+
+    def test_stage_priorities_and_failover_flag(self):
+        router = ProviderRouter(enabled=True)
+        self.assertEqual(router.order("review", "anthropic"), ["anthropic", "openai"])
+        router = ProviderRouter(enabled=True, failover=False)
+        self.assertEqual(router.order("draft", "openai"), ["openai"])
+
+    def test_slow_provider_is_moved_back(self):
+        router = ProviderRouter(enabled=True, min_samples=2, priority_bias_ms=100)
+        for _ in range(2):
+            router.record("openai", 5000, True)
+            router.record("anthropic", 200, True)
+        self.assertEqual(router.order("draft", "openai"), ["anthropic", "openai"])
+        self.assertEqual(router.summary()["rerouted"], 1)
+
+    def test_failing_provider_is_tried_last(self):
+        router = ProviderRouter(enabled=True, min_samples=1, ewma_alpha=1.0, priority_bias_ms=0)
+        router.record("openai", 10, False)
+        router.record("anthropic", 5000, True)
+        self.assertEqual(router.order("draft", "openai"), ["anthropic", "openai"])
+
+    def test_prompt_overrides(self):
+        router = ProviderRouter(prompt_overrides={"anthropic": {"draft_prompt_template": "override"}})
+        config = {"draft_prompt_template": "base"}
+        self.assertEqual(router.template_for(config, "draft_prompt_template", "anthropic"), "override")
+        self.assertEqual(router.template_for(config, "draft_prompt_template", "openai"), "base")
+
+
+class CallStageRecordingTest(unittest.TestCase):
+    def setUp(self):
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            self.config = copy.deepcopy(json.load(f))
+        self.config["provider_routing"]["enabled"] = True
+
+    def call_stage(self, api_attempts: int, parsed):
+        async def fake_call(config, prompt, api_key, api_type, stage=None, template_name=None, call_info=None):
+            call_info["timing"] = {"api_attempts": api_attempts}
+            return "raw", parsed, "raw"
+
+        with mock.patch.object(orchestrator, "call_api_with_json_retry_async", fake_call), \
+                mock.patch.object(orchestrator, "get_api_keys", return_value=("key", "")):
+            return asyncio.run(orchestrator.call_stage_async(
+                self.config, "draft", "draft_prompt_template", lambda template: template, "openai", "key", {}))
+
+    def router_calls(self) -> int:
+        providers = orchestrator.get_provider_router(self.config).summary()["providers"]
+        return providers.get("openai", {}).get("calls", 0)
+
+    def test_upstream_call_is_recorded(self):
+        self.call_stage(api_attempts=1, parsed={"commands": []})
+        self.assertEqual(self.router_calls(), 1)
+
+    def test_cache_hit_or_follower_is_not_recorded(self):
+        self.call_stage(api_attempts=0, parsed={"commands": []})
+        self.call_stage(api_attempts=0, parsed=None)
+        self.assertEqual(self.router_calls(), 0)
+
+    def test_shipped_config_keeps_routing_disabled(self):
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+        self.assertFalse(ProviderRouter.from_config(config).enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
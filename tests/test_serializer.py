@@ -0,0 +1,99 @@
+"""
+TOS v0.3 テスト - JSON シリアライザ
+compact / pretty の出力形式、orjson と json で同じ結果になること、成果物ごとの mode 指定を確認する
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime import serializer as serializer_module  # noqa: E402
+from tos_runtime.serializer import (  # noqa: E402
+    BACKEND_JSON, BACKEND_ORJSON, MODE_COMPACT, MODE_PRETTY, Serializer, get_serializer, load_file, loads
+)
+
+SAMPLE = {"step_num": 3, "phase": "execute", "message": "合計を出力", "commands": [{"cmd": "dir", "ok": True}],
+          "error": None}
+HAS_ORJSON = serializer_module._load_orjson() is not None
+
+
+def backends() -> list:
+    return [BACKEND_JSON, BACKEND_ORJSON] if HAS_ORJSON else [BACKEND_JSON]
+
+
+class SerializerFormatTest(unittest.TestCase):
+    def test_pretty_matches_json_dump_indent_2(self):
+        expected = json.dumps(SAMPLE, ensure_ascii=False, indent=2).encode("utf-8")
+        for backend in backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(Serializer(MODE_PRETTY, backend).dumps(SAMPLE), expected)
+
+    def test_compact_has_no_whitespace(self):
+        expected = json.dumps(SAMPLE, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for backend in backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(Serializer(MODE_COMPACT, backend).dumps(SAMPLE), expected)
+
+    @unittest.skipUnless(HAS_ORJSON, "orjson が無い")
+    def test_orjson_falls_back_for_big_integers(self):
+        serializer = Serializer(MODE_COMPACT, BACKEND_ORJSON)
+        self.assertEqual(loads(serializer.dumps({"n": 2 ** 70})), {"n": 2 ** 70})
+        self.assertEqual(serializer.summary()["fallbacks"], 1)
+
+    def test_unserializable_value_is_an_error(self):
+        for backend in backends():
+            with self.subTest(backend=backend):
+                with self.assertRaises(TypeError):
+                    Serializer(MODE_COMPACT, backend).dumps({"path": object()})
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            Serializer(mode="minified")
+        with self.assertRaises(ValueError):
+            Serializer(backend="ujson")
+
+
+class SerializerFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_serializer_test_")
+        self.path = Path(self.tmp_dir) / "step_001.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_write_and_load_round_trip(self):
+        serializer = Serializer(MODE_COMPACT)
+        with mock.patch.object(serializer_module.os, "fsync") as fsync:
+            written = serializer.write(self.path, SAMPLE, fsync=True)
+        fsync.assert_called_once()
+
+        self.assertEqual(written, self.path.stat().st_size)
+        self.assertEqual(load_file(self.path), SAMPLE)
+        self.assertEqual(serializer.summary()["bytes"], written)
+
+    def test_load_accepts_bom_and_pretty_files(self):
+        with open(self.path, "w", encoding="utf-8-sig") as f:
+            json.dump(SAMPLE, f, ensure_ascii=False, indent=2)
+        self.assertEqual(load_file(self.path), SAMPLE)
+
+
+class GetSerializerTest(unittest.TestCase):
+    def test_mode_per_artifact(self):
+        config = {"serialization": {"mode": MODE_COMPACT, "backend": BACKEND_JSON,
+                                    "modes": {"phase_summary": MODE_PRETTY}}}
+        self.assertEqual(get_serializer(config, "step_log").mode, MODE_COMPACT)
+        self.assertEqual(get_serializer(config, "phase_summary").mode, MODE_PRETTY)
+        self.assertIs(get_serializer(config, "step_log"), get_serializer(config, "job_result"))
+
+    def test_default_is_pretty(self):
+        self.assertEqual(get_serializer({}, "step_log").mode, MODE_PRETTY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+TOS v0.3 テスト - 常駐シェルホスト
+コマンドごとにシェルを起動する従来方式と同じく、前のコマンドの場所・環境変数・変数が残らないことを確認する
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.shell_host import BACKEND_POWERSHELL, BACKEND_SH, ShellHost, _build_powershell_script  # noqa: E402
+
+
+@unittest.skipIf(shutil.which("sh") is None, "sh がありません")
+class ShHostIsolationTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = tempfile.mkdtemp(prefix="tos_shell_host_test_")
+        self.host = ShellHost(BACKEND_SH, cwd=self.cwd)
+
+    def tearDown(self):
+        self.host.close()
+        shutil.rmtree(self.cwd, ignore_errors=True)
+
+    def test_state_does_not_carry_over(self):
+        first = self.host.run("cd / && export TOS_TEST_ENV=1 && TOS_TEST_VAR=1", 30)
+        self.assertEqual(first.returncode, 0)
+
+        second = self.host.run('pwd; echo "env=${TOS_TEST_ENV:-unset} var=${TOS_TEST_VAR:-unset}"', 30)
+        self.assertEqual(second.returncode, 0)
+        lines = second.stdout_text.splitlines()
+        self.assertEqual(Path(lines[0]).resolve(), Path(self.cwd).resolve())
+        self.assertEqual(lines[1], "env=unset var=unset")
+
+
+class PowerShellScriptTest(unittest.TestCase):
+    def test_script_restores_location_environment_and_globals(self):
+        script = _build_powershell_script("Set-Location C:\\", "token").decode("utf-8")
+        # ホストは1行ずつ実行するため、1コマンドは1行に収める
+        self.assertEqual(script.count("\n"), 1)
+        self.assertIn("Push-Location", script)
+        self.assertIn("Pop-Location", script)
+        self.assertIn("[Environment]::SetEnvironmentVariable", script)
+        self.assertIn("Remove-Variable -Name $__tos_n -Scope Global", script)
+        self.assertLess(script.index("Pop-Location"), script.index("__TOS_END_token__"))
+
+
+@unittest.skipIf(shutil.which("powershell") is None, "powershell がありません")
+class PowerShellHostIsolationTest(unittest.TestCase):
+    def test_state_does_not_carry_over(self):
+        host = ShellHost(BACKEND_POWERSHELL)
+        try:
+            before = host.run("(Get-Location).Path", 60).stdout_text.strip()
+            host.run("Set-Location ..; $env:TOS_TEST_ENV = '1'; $global:TosTestVar = 1", 60)
+            after = host.run("(Get-Location).Path; \"$env:TOS_TEST_ENV|$global:TosTestVar\"", 60)
+            lines = after.stdout_text.strip().splitlines()
+            self.assertEqual(lines[0], before)
+            self.assertEqual(lines[1], "|")
+        finally:
+            host.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
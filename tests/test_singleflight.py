@@ -0,0 +1,113 @@
+"""
+TOS v0.3 テスト - シングルフライト
+同じキーの同時呼び出しが1回にまとまり、リーダーの失敗（None）はフォロワーに共有されないことを確認する
+"""
+
+import asyncio
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tos_runtime.singleflight import SingleFlight  # noqa: E402
+
+
+def upstream(*results, delay: float = 0.05):
+    """呼ばれた順に results[i] を返す start_call（呼び出し回数は calls に記録）"""
+    calls = []
+
+    def start_call():
+        outcome = results[min(len(calls), len(results) - 1)]
+        calls.append(outcome)
+
+        async def run():
+            await asyncio.sleep(delay)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        return run()
+
+    return start_call, calls
+
+
+async def run_pair(first: SingleFlight, second: SingleFlight, start_call, key: str = "k"):
+    leader = asyncio.ensure_future(first.run(key, start_call))
+    await asyncio.sleep(0.01)
+    follower = asyncio.ensure_future(second.run(key, start_call))
+    return await asyncio.gather(leader, follower, return_exceptions=True)
+
+
+class InProcessTest(unittest.TestCase):
+    def test_concurrent_calls_share_one_upstream_call(self):
+        flight = SingleFlight()
+        start_call, calls = upstream("result")
+        results = asyncio.run(run_pair(flight, flight, start_call))
+
+        self.assertEqual(results, [("result", "leader"), ("result", "follower")])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.summary()["saved_calls"], 1)
+
+    def test_failed_leader_is_not_shared(self):
+        flight = SingleFlight()
+        start_call, calls = upstream(None, "retried")
+        results = asyncio.run(run_pair(flight, flight, start_call))
+
+        self.assertEqual(results, [(None, "leader"), ("retried", "leader")])
+        self.assertEqual(len(calls), 2)
+
+    def test_exception_reaches_follower(self):
+        flight = SingleFlight()
+        start_call, calls = upstream(RuntimeError("boom"))
+        results = asyncio.run(run_pair(flight, flight, start_call))
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(len(calls), 1)
+
+    def test_disabled(self):
+        flight = SingleFlight(enabled=False)
+        start_call, calls = upstream("result")
+        results = asyncio.run(run_pair(flight, flight, start_call))
+
+        self.assertEqual(results, [("result", "off"), ("result", "off")])
+        self.assertEqual(len(calls), 2)
+
+
+class CrossProcessTest(unittest.TestCase):
+    """lock_dir を共有する2つのインスタンスで別プロセスを模す"""
+
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp(prefix="tos_singleflight_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir, ignore_errors=True)
+
+    def make_pair(self):
+        return (SingleFlight(lock_dir=self.lock_dir, poll_interval_ms=5),
+                SingleFlight(lock_dir=self.lock_dir, poll_interval_ms=5))
+
+    def test_remote_follower_reads_result_slot(self):
+        start_call, calls = upstream("result")
+        results = asyncio.run(run_pair(*self.make_pair(), start_call))
+
+        self.assertEqual(results, [("result", "leader"), ("result", "remote_follower")])
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_leader_leaves_no_slot(self):
+        start_call, calls = upstream(None, "retried")
+        results = asyncio.run(run_pair(*self.make_pair(), start_call))
+
+        self.assertEqual(results, [(None, "leader"), ("retried", "leader")])
+        self.assertEqual(len(calls), 2)
+
+    def test_cross_process_is_opt_in(self):
+        self.assertIsNone(SingleFlight.from_config({}, self.lock_dir).lock_dir)
+        flight = SingleFlight.from_config({"single_flight": {"cross_process": True}}, self.lock_dir)
+        self.assertIsNotNone(flight.lock_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+TOS v0.3 テスト - 起動の軽量化
+import 時に重いモジュールを読み込まないこと、早期終了（job_loop_complete / ステップ1で done）では
+Python の検証（require_python）を行わないことを確認する
+"""
+
+import copy
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+
+HEAVY_MODULES = ("requests", "anthropic")
+RESULT_TEXT = "合計: 10\n平均: 5\n件数: 2\n"
+
+
+class ImportTest(unittest.TestCase):
+    def test_import_does_not_load_api_clients(self):
+        # 他のテストが読み込んだモジュールの影響を受けないよう、新しいプロセスで確認する
+        # （未インストールの環境でも検出できるよう、sys.modules に加えて import の試行も記録する）
+        code = ("import json, sys\n"
+                "attempted = []\n"
+                "class Recorder:\n"
+                "    def find_spec(self, name, path=None, target=None):\n"
+                "        attempted.append(name.split('.')[0])\n"
+                "sys.meta_path.insert(0, Recorder())\n"
+                "import orchestrator_v0_3\n"
+                f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules or m in attempted]))\n")
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True,
+                                timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+
+class EarlyExitTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="tos_startup_test_"))
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            self.config = copy.deepcopy(json.load(f))
+        workspace_dir = self.tmp_dir / "workspace"
+        self.config["workspace_dir"] = str(workspace_dir)
+        self.config["logs_dir"] = str(self.tmp_dir / "logs")
+        self.config["step_wal"]["path"] = str(workspace_dir / "artifacts" / "step_wal.jsonl")
+        self.config["done_conditions"]["checks"][0]["glob"] = str(workspace_dir / "results" / "result_v2.txt")
+        job_loop = self.config["s5_settings"]["job_loop"]
+        job_loop["max_jobs"] = 1
+        job_loop["job_input"] = {"path": ""}
+        job_loop["job_result"] = {"path": str(self.tmp_dir / "job_result.json")}
+        orchestrator.ensure_dirs(self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def run_orchestrator(self, draft_result=(None, None, {})):
+        with mock.patch.object(orchestrator, "check_prerequisites", return_value=("python", "key", "key")), \
+                mock.patch.object(orchestrator, "require_python") as require_python, \
+                mock.patch.object(orchestrator, "make_draft", return_value=draft_result):
+            try:
+                end_reason = orchestrator.run_orchestrator(self.config)
+            except SystemExit as e:
+                end_reason = f"exit ({e.code})"
+        return end_reason, require_python
+
+    def test_job_loop_complete_skips_python_check(self):
+        orchestrator.save_phase_state(self.config, current_phase="done", current_step=1, last_done=True,
+                                      last_done_reason="完了", job_index=2)
+        end_reason, require_python = self.run_orchestrator()
+        self.assertEqual(end_reason, "exit (0)")
+        require_python.assert_not_called()
+
+    def test_done_at_step_1_skips_python_check(self):
+        self.config["s5_settings"]["job_loop"]["enabled"] = False
+        (self.tmp_dir / "workspace" / "results" / "result_v2.txt").write_text(RESULT_TEXT, encoding="utf-8")
+        end_reason, require_python = self.run_orchestrator()
+        self.assertEqual(end_reason, "done")
+        require_python.assert_not_called()
+
+    def test_python_is_checked_before_first_api_call(self):
+        self.config["s5_settings"]["job_loop"]["enabled"] = False
+        _, require_python = self.run_orchestrator()
+        require_python.assert_called_once_with(self.config, "python")
+
+
+if __name__ == "__main__":
+    unittest.main()
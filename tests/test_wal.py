@@ -0,0 +1,114 @@
+"""
+TOS v0.3 テスト - ステップ WAL
+全レコードが適用済みになった時点で WAL が空になり、未適用のレコードだけが残ること、
+再適用はステップログが書き終わっているレコードだけフェーズ状態を進めることを確認する
+"""
+
+import copy
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+import orchestrator_v0_3 as orchestrator  # noqa: E402
+from tos_runtime import wal as wal_module  # noqa: E402
+from tos_runtime.wal import StepWAL  # noqa: E402
+
+STATE = {"current_phase": "execute", "current_step": 1, "last_done": False, "last_done_reason": ""}
+
+
+class StepWALCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="tos_wal_test_")
+        self.path = Path(self.tmp_dir) / "step_wal.jsonl"
+        self.wal = StepWAL(self.path, fsync=False)
+
+    def tearDown(self):
+        self.wal.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_fully_applied_wal_is_truncated(self):
+        for step_num in range(1, 51):
+            seq = self.wal.append({"step_num": step_num, "step_log": {"body": "x" * 1000}, "phase_state": {}})
+            self.wal.mark_applied(seq)
+
+        self.assertEqual(self.path.stat().st_size, 0)
+        self.assertEqual(self.wal.summary()["checkpoints"], 50)
+
+    def test_unapplied_records_survive_checkpoint(self):
+        first = self.wal.append({"step_num": 1})
+        self.wal.mark_applied(first)
+        second = self.wal.append({"step_num": 2})
+        third = self.wal.append({"step_num": 3})
+        self.wal.mark_applied(second)
+        self.wal.close()
+
+        pending = StepWAL(self.path).pending()
+        self.assertEqual([record["seq"] for record in pending], [third])
+
+    def test_checkpoint_is_fsynced(self):
+        self.wal.close()
+        self.wal = StepWAL(self.path, fsync=True)
+        with mock.patch.object(wal_module.os, "fsync") as fsync:
+            first = self.wal.append({"step_num": 1})
+            self.wal.append({"step_num": 2})
+            self.wal.mark_applied(first)
+            self.assertEqual(fsync.call_count, 3)
+            self.wal.mark_applied(first + 1)
+            self.assertEqual(fsync.call_count, 4)
+        self.assertEqual(self.path.stat().st_size, 0)
+
+
+class CommitStepReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="tos_wal_replay_test_"))
+        with open(REPO_DIR / "config_v0_3.json", "r", encoding="utf-8") as f:
+            self.config = copy.deepcopy(json.load(f))
+        (self.tmp_dir / "logs" / "steps").mkdir(parents=True)
+        self.config["logs_dir"] = str(self.tmp_dir / "logs")
+        self.config["workspace_dir"] = str(self.tmp_dir / "workspace")
+        self.config["phase_state_path"] = str(self.tmp_dir / "phase_state.json")
+        self.config["step_wal"] = {"enabled": True, "fsync": False, "path": str(self.tmp_dir / "step_wal.jsonl")}
+        self.wal = orchestrator.get_step_wal_for(self.config)
+
+    def tearDown(self):
+        self.wal.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_record_references_step_log_instead_of_copying_it(self):
+        # ステップログを書いた直後、フェーズ状態を書く前に落ちた
+        with mock.patch.object(orchestrator, "save_phase_state", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                orchestrator.commit_step(self.config, 1, {"phase": "execute", "job_index": 2}, **STATE)
+
+        (record,) = self.wal.pending()
+        self.assertNotIn("step_log", record)
+        self.assertEqual((record["step_num"], record["job_index"]), (1, 2))
+
+        self.assertEqual(orchestrator.replay_step_wal(self.config), 1)
+        self.assertEqual(orchestrator.load_phase_state(self.config)["current_step"], 1)
+        self.assertEqual(self.wal.pending(), [])
+
+    def test_record_without_step_log_is_discarded(self):
+        # WAL のコミット後、ステップログを書く前に落ちた
+        self.wal.append({"step_num": 1, "job_index": None, "phase_state": STATE})
+
+        self.assertEqual(orchestrator.replay_step_wal(self.config), 0)
+        self.assertFalse(orchestrator.get_phase_state_path(self.config).exists())
+        self.assertEqual(self.wal.pending(), [])
+
+    def test_step_log_body_in_record_is_not_written(self):
+        self.wal.append({"step_num": 1, "step_log": {"phase": "execute"}, "phase_state": STATE})
+
+        self.assertEqual(orchestrator.replay_step_wal(self.config), 0)
+        self.assertFalse(orchestrator.step_log_exists(self.config, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+TOS v0.3 ベンチマーク - 起動時間
+orchestrator_v0_3 の import 時間と、早期終了（job_loop_complete / ステップ1で done）の所要時間を計測する
+
+使い方:
+    python tools/bench/import_bench.py [--count N] [--max-import-ms MS] [--max-early-exit-ms MS] [--output FILE]
+
+重いモジュール（requests / anthropic / httpx / asyncio）が import 時や早期終了時に読み込まれた場合、
+および中央値が上限を超えた場合は終了コード 1 を返す（リグレッション検知用）
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run_bench import REPO_DIR, WRITE_RESULT_CODE, prepare_workdir  # noqa: E402
+
+RESULT_FILE = "import_bench_result.json"
+# 早期終了では読み込まれてはならないモジュール
+HEAVY_MODULES = ("requests", "anthropic", "httpx", "asyncio")
+# 早期終了で API に届いてしまった場合に即失敗させるための接続先（discard ポート）
+UNREACHABLE_BASE_URL = "http://127.0.0.1:9"
+
+IMPORT_CODE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import orchestrator_v0_3\n"
+    "elapsed = (time.perf_counter() - started) * 1000\n"
+    "print(json.dumps({'import_ms': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))\n"
+) % (HEAVY_MODULES,)
+
+# name -> config の上書き（phase_state / 結果ファイルは prepare_early_exit で用意する）
+EARLY_EXIT_SCENARIOS = {
+    "job_loop_complete": {"s5_settings": {"job_loop": {"enabled": True, "max_jobs": 1}}},
+    "done_at_step_1": {},
+}
+
+
+def measure_import(count: int) -> list:
+    """新しいプロセスで orchestrator_v0_3 を import する時間を count 回計測する"""
+    samples = []
+    for _ in range(count):
+        result = subprocess.run([sys.executable, "-c", IMPORT_CODE], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            raise RuntimeError(f"import 失敗: {result.stderr.strip()}")
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def prepare_early_exit(workdir: Path, name: str) -> None:
+    """早期終了シナリオの作業ディレクトリを用意する"""
+    prepare_workdir(workdir, UNREACHABLE_BASE_URL, EARLY_EXIT_SCENARIOS[name])
+    with open(workdir / "config_v0_3.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    if name == "job_loop_complete":
+        # max_jobs を超えた job_index から再開させる
+        state_path = workdir / (config.get("phase_state_path")
+                                or f"{config['workspace_dir']}/artifacts/phase_state.json")
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({"current_phase": "S-5", "current_step": 1, "last_done": False, "job_index": 2}, f)
+    else:
+        subprocess.run(["sh", "-c", WRITE_RESULT_CODE], cwd=workdir, check=True)
+
+
+def run_child(workdir: Path) -> None:
+    """子プロセス側: コピーしたオーケストレータの cli() を実行し、所要時間と読み込まれたモジュールを書き出す"""
+    os.environ.setdefault("OPENAI_API_KEY", "bench-dummy")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench-dummy")
+    sys.path.insert(0, str(workdir))
+    sys.argv = [str(workdir / "orchestrator_v0_3.py")]
+    os.chdir(workdir)
+
+    started = time.perf_counter()
+    import orchestrator_v0_3
+    exit_code = 0
+    try:
+        orchestrator_v0_3.cli()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    with open(workdir / RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "exit_code": exit_code,
+            "wall_ms": wall_ms,
+            "heavy": [m for m in HEAVY_MODULES if m in sys.modules],
+            "python_verified": sorted(orchestrator_v0_3._verified_python_paths)
+        }, f)
+
+
+def run_early_exit(name: str, keep: bool) -> dict:
+    """早期終了シナリオを子プロセスで1回実行する（子プロセスの起動時間を含む）"""
+    workdir = Path(tempfile.mkdtemp(prefix=f"tos_import_bench_{name}_"))
+    try:
+        prepare_early_exit(workdir, name)
+        started = time.perf_counter()
+        subprocess.run([sys.executable, str(Path(__file__).resolve()), "--child", str(workdir)],
+                       cwd=workdir, capture_output=True, text=True, timeout=120)
+        process_ms = (time.perf_counter() - started) * 1000
+        with open(workdir / RESULT_FILE, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        result["process_ms"] = process_ms
+        return result
+    finally:
+        if keep:
+            print(f"  作業ディレクトリ: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="TOS v0.3 起動時間ベンチマーク")
+    parser.add_argument("--count", type=int, default=5, help="計測回数")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="import 時間の中央値の上限")
+    parser.add_argument("--max-early-exit-ms", type=float, default=None, help="早期終了のプロセス時間の中央値の上限")
+    parser.add_argument("--output", default=None, help="結果 JSON の出力先")
+    parser.add_argument("--keep", action="store_true", help="作業ディレクトリを削除しない")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(Path(args.child))
+        return
+
+    failures = []
+    imports = measure_import(args.count)
+    import_ms = [s["import_ms"] for s in imports]
+    report = {
+        "import": {
+            "median_ms": statistics.median(import_ms),
+            "min_ms": min(import_ms),
+            "max_ms": max(import_ms),
+            "heavy": sorted({m for s in imports for m in s["heavy"]})
+        },
+        "early_exit": {}
+    }
+    print(f"{'target':<20} {'median':>9} {'min':>9} {'max':>9}  heavy modules")
+    print(f"{'import':<20} {report['import']['median_ms']:>9.1f} {report['import']['min_ms']:>9.1f} "
+          f"{report['import']['max_ms']:>9.1f}  {', '.join(report['import']['heavy']) or '-'}")
+    if report["import"]["heavy"]:
+        failures.append(f"import 時に読み込まれた: {report['import']['heavy']}")
+    if args.max_import_ms is not None and report["import"]["median_ms"] > args.max_import_ms:
+        failures.append(f"import 時間 {report['import']['median_ms']:.1f}ms > {args.max_import_ms}ms")
+
+    for name in EARLY_EXIT_SCENARIOS:
+        runs = [run_early_exit(name, args.keep) for _ in range(args.count)]
+        process_ms = [r["process_ms"] for r in runs]
+        heavy = sorted({m for r in runs for m in r["heavy"]})
+        verified = any(r["python_verified"] for r in runs)
+        entry = {
+            "median_ms": statistics.median(process_ms),
+            "min_ms": min(process_ms),
+            "max_ms": max(process_ms),
+            "wall_ms_median": statistics.median(r["wall_ms"] for r in runs),
+            "exit_codes": sorted({r["exit_code"] for r in runs}),
+            "heavy": heavy,
+            "python_verified": verified
+        }
+        report["early_exit"][name] = entry
+        print(f"{name:<20} {entry['median_ms']:>9.1f} {entry['min_ms']:>9.1f} {entry['max_ms']:>9.1f}  "
+              f"{', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{name}: 読み込まれた: {heavy}")
+        if verified:
+            failures.append(f"{name}: Python 検証のサブプロセスを起動した")
+        if entry["exit_codes"] != [0]:
+            failures.append(f"{name}: 終了コード {entry['exit_codes']}")
+        if args.max_early_exit_ms is not None and entry["median_ms"] > args.max_early_exit_ms:
+            failures.append(f"{name}: {entry['median_ms']:.1f}ms > {args.max_early_exit_ms}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果を出力: {args.output}")
+
+    if failures:
+        print("")
+        for failure in failures:
+            print(f"NG: {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+TOS v0.3 ベンチマーク - モック LLM サーバ
+OpenAI chat-completions / Anthropic messages 形式で定型応答を返すローカル HTTP サーバ
+
+使い方（単体起動）:
+    python tools/bench/mock_llm_server.py --port 8765 --latency-ms 50 --json-failure-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FINAL_COMMANDS = [{"type": "sh", "code": "echo mock"}]
+
+
+class MockSettings:
+    """モック応答の設定
+
+    latency_ms / latency_jitter_ms: 応答までの待ち時間（一様乱数で揺らす）
+    json_failure_rate: JSON ではない応答を返す確率
+    error_rate / error_status / retry_after: HTTP エラー（429 なら Retry-After 付き）を返す確率と内容
+    slow_rate / slow_ms: 応答を slow_ms 遅らせる確率（テールレイテンシの再現）
+    down_providers: 常に 503 を返すプロバイダ（"openai" / "anthropic"、フェイルオーバーの確認用）
+    final_commands: draft / final が返すコマンド
+    """
+
+    def __init__(self, latency_ms: float = 0.0, latency_jitter_ms: float = 0.0,
+                 json_failure_rate: float = 0.0, final_commands: list = None, seed: int = None,
+                 error_rate: float = 0.0, error_status: int = 429, retry_after: float = None,
+                 slow_rate: float = 0.0, slow_ms: float = 0.0, down_providers: list = None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.json_failure_rate = json_failure_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.down_providers = set(down_providers or [])
+        self.final_commands = final_commands if final_commands is not None else list(DEFAULT_FINAL_COMMANDS)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"openai_requests": 0, "anthropic_requests": 0, "json_failures": 0, "http_errors": 0}
+
+    def draw(self) -> tuple:
+        """(待ち秒数, HTTP エラーにするか, JSON を壊すか) を決める"""
+        with self.lock:
+            jitter = self.random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+            if self.random.random() < self.slow_rate:
+                jitter += self.slow_ms
+            error = self.random.random() < self.error_rate
+            fail = self.random.random() < self.json_failure_rate
+        return max(0.0, self.latency_ms + jitter) / 1000, error, fail
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（4文字 = 1トークン）"""
+    return max(1, len(text) // 4)
+
+
+def build_stage_response(settings: MockSettings, prompt: str, provider: str) -> dict:
+    """プロンプトから draft / review / final を判別して応答内容を作る
+
+    フェイルオーバーでどちらのプロバイダにも全ステージが来うるため、プロバイダではなく
+    テンプレートの文言（「最終判断」「improved_commands」）で判別する
+    （draft の履歴にも final_commands が含まれうるためキー名では判別しない）
+    """
+    if "最終判断" not in prompt and "improved_commands" in prompt:
+        return {"review": "mock review", "improved_commands": settings.final_commands, "approval": True}
+    if "最終判断" in prompt:
+        return {"final_commands": settings.final_commands, "summary": "mock final"}
+    return {"thought": "mock draft", "commands": settings.final_commands}
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "TOSMockLLM/0.3"
+    # ヘッダと本文を別々に書くため、Nagle + 遅延 ACK で応答ごとに約 40ms 上乗せされるのを防ぐ
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # ベンチマーク中はアクセスログを出さない
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+
+        settings = self.server.settings
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            provider = "openai"
+        elif path.endswith("/messages"):
+            provider = "anthropic"
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        settings.count(f"{provider}_requests")
+
+        prompt = "".join(
+            m.get("content", "") if isinstance(m.get("content"), str) else json.dumps(m.get("content"))
+            for m in request.get("messages", [])
+        )
+        delay, error, fail = settings.draw()
+        if delay:
+            time.sleep(delay)
+
+        if provider in settings.down_providers:
+            settings.count("http_errors")
+            self._send_json(503, {"type": "error", "error": {"type": "api_error", "message": "mock provider down"}})
+            return
+
+        if error:
+            settings.count("http_errors")
+            headers = {}
+            if settings.retry_after is not None:
+                headers["retry-after"] = str(settings.retry_after)
+            self._send_json(settings.error_status, {
+                "type": "error",
+                "error": {"type": "rate_limit_error" if settings.error_status == 429 else "api_error",
+                          "message": f"mock error {settings.error_status}"}
+            }, headers)
+            return
+
+        if fail:
+            settings.count("json_failures")
+            text = "申し訳ありません。以下が回答です（JSON ではありません）。"
+        else:
+            text = json.dumps(build_stage_response(settings, prompt, provider), ensure_ascii=False)
+
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(text)
+        model = request.get("model", "mock")
+        if provider == "openai":
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": input_tokens,
+                    "completion_tokens": output_tokens,
+                    "total_tokens": input_tokens + output_tokens
+                }
+            })
+        else:
+            self._send_json(200, {
+                "id": f"msg_{uuid.uuid4().hex[:12]}",
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}
+            })
+
+
+class MockLLMServer:
+    """バックグラウンドスレッドで動くモックサーバ"""
+
+    def __init__(self, settings: MockSettings = None, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings or MockSettings()
+        self._server = ThreadingHTTPServer((host, port), MockLLMHandler)
+        self._server.daemon_threads = True
+        self._server.settings = self.settings
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tos-mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="TOS v0.3 モック LLM サーバ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--json-failure-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--down", action="append", choices=["openai", "anthropic"], default=[],
+                        help="常に 503 を返すプロバイダ（複数指定可）")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=None, help="エラー応答の Retry-After 秒数")
+    parser.add_argument("--final-commands", default=None, help="final_commands の JSON 配列")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        json_failure_rate=args.json_failure_rate,
+        final_commands=json.loads(args.final_commands) if args.final_commands else None,
+        seed=args.seed,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        down_providers=args.down
+    )
+    server = MockLLMServer(settings, args.host, args.port)
+    print(f"mock LLM server: {server.base_url}")
+    print(f"  openai_base_url    = {server.base_url}/v1")
+    print(f"  anthropic_base_url = {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
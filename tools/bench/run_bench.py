@@ -0,0 +1,250 @@
+"""
+TOS v0.3 ベンチマーク - エンドツーエンド
+モック LLM サーバに向けてオーケストレータをシナリオごとに実行し、steps/sec・ステージ別レイテンシ・メモリ割り当てを比較する
+
+使い方:
+    python tools/bench/run_bench.py [--scenario NAME ...] [--repeat N] [--latency-ms MS] [--output FILE]
+
+各シナリオは一時ディレクトリにオーケストレータ一式をコピーし、子プロセスで main() を実行する
+（API キーはダミー値、openai_base_url / anthropic_base_url はモックサーバを指す）
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_llm_server import MockLLMServer, MockSettings  # noqa: E402
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+COPY_ITEMS = ("orchestrator_v0_3.py", "tos_runtime", "config_v0_3.json")
+RESULT_FILE = "bench_result.json"
+
+WRITE_RESULT_CODE = (
+    "mkdir -p workspace/results && "
+    "printf '合計: 60\\n平均: 20\\n件数: 3\\n' > workspace/results/result_v2.txt"
+)
+
+# name -> (final_commands, config の上書き, モックの JSON 失敗率)
+SCENARIOS = {
+    "done_at_step_1": (
+        [{"type": "sh", "code": WRITE_RESULT_CODE}],
+        {"max_steps": 3},
+        0.0
+    ),
+    "deny_loop": (
+        [{"type": "sh", "code": "Remove-Item workspace/results/result_v2.txt"}],
+        {"max_steps": 5, "execution_policy": {"stop_on_deny": False}},
+        0.0
+    ),
+    "max_steps_reached": (
+        [{"type": "sh", "code": "echo working"}],
+        {"max_steps": 5},
+        0.0
+    ),
+    "json_failures": (
+        [{"type": "sh", "code": "echo working"}],
+        {"max_steps": 3, "json_retry": 3},
+        0.3
+    ),
+}
+
+
+def merge_config(base: dict, override: dict) -> dict:
+    """dict を再帰的にマージする（override 優先）"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def prepare_workdir(workdir: Path, base_url: str, overrides: dict) -> None:
+    """オーケストレータ一式をコピーし、モックサーバ向けの設定を書き込む"""
+    for item in COPY_ITEMS:
+        src = REPO_DIR / item
+        if src.is_dir():
+            shutil.copytree(src, workdir / item, ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy2(src, workdir / item)
+
+    with open(workdir / "config_v0_3.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config = merge_config(config, {
+        "openai_base_url": f"{base_url}/v1",
+        "anthropic_base_url": base_url,
+        "s5_settings": {"job_loop": {"enabled": False}},
+        # 応答キャッシュが効くと2回目以降の計測がモックに届かないため無効化する
+        "response_cache": {"stages": {"draft": "off", "review": "off", "final": "off"}},
+        "allow_types": ["sh"],
+    })
+    config = merge_config(config, overrides)
+    with open(workdir / "config_v0_3.json", "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    with open(workdir / "tos_python_path.txt", "w", encoding="utf-8") as f:
+        f.write(sys.executable)
+
+
+def run_child(workdir: Path) -> None:
+    """子プロセス側: コピーしたオーケストレータの main() を tracemalloc 下で実行する"""
+    import tracemalloc
+
+    os.environ.setdefault("OPENAI_API_KEY", "bench-dummy")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench-dummy")
+    sys.path.insert(0, str(workdir))
+    sys.argv = [str(workdir / "orchestrator_v0_3.py")]
+    os.chdir(workdir)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    import orchestrator_v0_3
+    exit_code = 0
+    try:
+        orchestrator_v0_3.cli()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    wall_sec = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with open(workdir / RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "exit_code": exit_code,
+            "wall_sec": wall_sec,
+            "alloc_current_bytes": current,
+            "alloc_peak_bytes": peak
+        }, f)
+
+
+def run_scenario(name: str, server: MockLLMServer, keep: bool) -> dict:
+    """1シナリオを子プロセスで1回実行し、結果と phase_summary を集める"""
+    final_commands, overrides, failure_rate = SCENARIOS[name]
+    server.settings.final_commands = final_commands
+    server.settings.json_failure_rate = failure_rate
+
+    workdir = Path(tempfile.mkdtemp(prefix=f"tos_bench_{name}_"))
+    try:
+        prepare_workdir(workdir, server.base_url, overrides)
+        with open(workdir / "orchestrator.log", "w", encoding="utf-8") as log:
+            proc = subprocess.run(
+                [sys.executable, str(Path(__file__).resolve()), "--child", str(workdir)],
+                stdout=log, stderr=subprocess.STDOUT, timeout=600
+            )
+        result_path = workdir / RESULT_FILE
+        if not result_path.exists():
+            return {"scenario": name, "error": f"子プロセス異常終了 (rc={proc.returncode})", "workdir": str(workdir)}
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+
+        summary_path = workdir / "logs" / "phase_summary.json"
+        summary = {}
+        if summary_path.exists():
+            with open(summary_path, "r", encoding="utf-8") as f:
+                summary = json.load(f)
+        steps = summary.get("total_steps", 0)
+        result.update({
+            "scenario": name,
+            "end_reason": summary.get("end_reason"),
+            "total_steps": steps,
+            "steps_per_sec": steps / result["wall_sec"] if result["wall_sec"] > 0 else None,
+            "latency": summary.get("latency", {}),
+            "token_usage": summary.get("token_usage", {})
+        })
+        if keep:
+            result["workdir"] = str(workdir)
+        return result
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def combine_runs(runs: list) -> dict:
+    """繰り返し実行した結果を中央値でまとめる（レイテンシは最後の実行のもの）"""
+    ok = [r for r in runs if "error" not in r]
+    if not ok:
+        return runs[-1]
+    combined = dict(ok[-1])
+    for key in ("wall_sec", "steps_per_sec", "alloc_current_bytes", "alloc_peak_bytes"):
+        values = [r[key] for r in ok if r.get(key) is not None]
+        combined[key] = statistics.median(values) if values else None
+    combined["runs"] = len(ok)
+    return combined
+
+
+def format_ms(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(results: list) -> None:
+    print("")
+    print(f"{'scenario':<20} {'end_reason':<28} {'steps':>5} {'wall_s':>7} {'steps/s':>8} "
+          f"{'peak_MB':>8} {'cur_MB':>7}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['scenario']:<20} ERROR: {r['error']}")
+            continue
+        print(f"{r['scenario']:<20} {str(r['end_reason'])[:28]:<28} {r['total_steps']:>5} "
+              f"{r['wall_sec']:>7.2f} {r['steps_per_sec'] or 0:>8.2f} "
+              f"{r['alloc_peak_bytes'] / 1048576:>8.2f} {r['alloc_current_bytes'] / 1048576:>7.2f}")
+
+    print("")
+    print(f"{'scenario':<20} {'stage':<12} {'count':>5} {'p50_ms':>9} {'p95_ms':>9} {'max_ms':>9}")
+    for r in results:
+        for stage, stats in r.get("latency", {}).items():
+            if not stats.get("count"):
+                continue
+            print(f"{r['scenario']:<20} {stage:<12} {stats['count']:>5} {format_ms(stats['p50_ms']):>9} "
+                  f"{format_ms(stats['p95_ms']):>9} {format_ms(stats['max_ms']):>9}")
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="TOS v0.3 エンドツーエンドベンチマーク")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="実行するシナリオ（複数指定可、省略時は全シナリオ）")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="モック応答の待ち時間")
+    parser.add_argument("--latency-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="結果 JSON の出力先")
+    parser.add_argument("--keep", action="store_true", help="作業ディレクトリを削除しない")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(Path(args.child))
+        return
+
+    settings = MockSettings(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms, seed=args.seed)
+    results = []
+    with MockLLMServer(settings) as server:
+        print(f"mock LLM server: {server.base_url}")
+        for name in args.scenario or list(SCENARIOS):
+            runs = []
+            for i in range(args.repeat):
+                print(f"[{name}] run {i + 1}/{args.repeat}")
+                runs.append(run_scenario(name, server, args.keep))
+            results.append(combine_runs(runs))
+        mock_stats = dict(server.settings.stats)
+
+    print_report(results)
+    print("")
+    print(f"mock requests: {mock_stats}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"scenarios": results, "mock": mock_stats}, f, ensure_ascii=False, indent=2)
+        print(f"結果を出力: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+TOS v0.3 ベンチマーク - 常駐シェルホスト
+コマンドごとにインタプリタを起動する従来方式と、常駐シェルホストの所要時間を比較する
+
+使い方:
+    python tools/bench/shell_host_bench.py [--backend sh|powershell] [--count N] [--code CODE]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from tos_runtime.shell_host import BACKEND_SH, BACKENDS, ShellHost  # noqa: E402
+
+DEFAULT_CODE = {
+    "sh": "echo bench >/dev/null",
+    "powershell": "Write-Output bench | Out-Null"
+}
+
+
+def bench_subprocess(backend: str, code: str, count: int) -> list:
+    """従来方式: コマンドごとに sh -c / powershell -Command を起動する"""
+    if backend == BACKEND_SH:
+        argv = ["sh", "-c", code]
+    else:
+        argv = ["powershell", "-Command", code]
+    durations = []
+    for _ in range(count):
+        started = time.perf_counter()
+        subprocess.run(argv, capture_output=True, text=True, timeout=60)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def bench_host(backend: str, code: str, count: int) -> tuple:
+    """常駐シェルホスト: 起動1回 + コマンド count 回"""
+    host = ShellHost(backend)
+    started = time.perf_counter()
+    host.start()
+    startup = time.perf_counter() - started
+    durations = []
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            host.run(code, 60)
+            durations.append(time.perf_counter() - started)
+    finally:
+        host.close()
+    return startup, durations
+
+
+def describe(durations: list) -> str:
+    ordered = sorted(durations)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f"total={sum(durations):.3f}s mean={statistics.mean(durations) * 1000:.2f}ms "
+            f"p95={p95 * 1000:.2f}ms")
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="常駐シェルホストのベンチマーク")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND_SH)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--code", default=None)
+    args = parser.parse_args(argv)
+
+    code = args.code or DEFAULT_CODE[args.backend]
+    print(f"backend={args.backend} count={args.count} code={code!r}")
+
+    spawn = bench_subprocess(args.backend, code, args.count)
+    print(f"subprocess : {describe(spawn)}")
+
+    startup, hosted = bench_host(args.backend, code, args.count)
+    print(f"shell_host : {describe(hosted)} (host startup {startup * 1000:.2f}ms)")
+
+    total_hosted = startup + sum(hosted)
+    if total_hosted > 0:
+        print(f"speedup    : x{sum(spawn) / total_hosted:.2f}")
+
+
+if __name__ == "__main__":
+    main()
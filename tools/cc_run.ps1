@@ -191,14 +191,43 @@ if ($Clean) {
   if (Test-Path $phaseSummary) {
     Remove-Item -Path $phaseSummary -Force
   }
+  # Delete phase_aggregate.json (phase_summary sidecar)
+  $phaseAggregate = Join-Path $Root "logs\phase_aggregate.json"
+  if (Test-Path $phaseAggregate) {
+    Remove-Item -Path $phaseAggregate -Force
+  }
   if (Test-Path $phaseState) {
     Remove-Item -Path $phaseState -Force
   }
+  # Delete the step journal (step_log.backend=journal answers step existence from its index)
+  $journalDir = Join-Path $Root "logs\journal"
+  if (Test-Path $journalDir) {
+    Remove-Item -Path $journalDir -Recurse -Force
+  }
+  # Delete step_wal.jsonl (uncommitted step log / phase_state transitions would be replayed on start)
+  $stepWal = Join-Path $Root "workspace\artifacts\step_wal.jsonl"
+  if (Test-Path $stepWal) {
+    Remove-Item -Path $stepWal -Force
+  }
+  # Delete job_payload blobs referenced by the step logs (job_payload_ref)
+  $payloadsDir = Join-Path $Root "workspace\artifacts\payloads"
+  if (Test-Path $payloadsDir) {
+    Remove-Item -Path $payloadsDir -Recurse -Force
+  }
   # KL: Delete job_result.json
   $jobResultPath = Join-Path $Root "workspace\artifacts\job_result.json"
   if (Test-Path $jobResultPath) {
     Remove-Item -Path $jobResultPath -Force
   }
+  # Delete per-job state of job_loop.parallel (logs\jobs) and its merged summary
+  $jobsDir = Join-Path $Root "logs\jobs"
+  if (Test-Path $jobsDir) {
+    Remove-Item -Path $jobsDir -Recurse -Force
+  }
+  $jobLoopSummary = Join-Path $Root "logs\job_loop_summary.json"
+  if (Test-Path $jobLoopSummary) {
+    Remove-Item -Path $jobLoopSummary -Force
+  }
   Write-Host "cleanup done"
 }
 
@@ -0,0 +1,4 @@
+"""
+TOS v0.3 ランタイム拡張
+orchestrator_v0_3.py から利用する実行基盤
+"""
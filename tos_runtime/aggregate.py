@@ -0,0 +1,352 @@
+"""
+TOS v0.3 ランタイム - phase_summary 集計サイドカー
+write_step_log のたびに集計を更新し、phase_summary をステップファイルの再読込なしで生成する
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from .instrumentation import summarize_latencies
+from .journal import journal_record_name
+from .serializer import load_file
+
+# 2: レコードに timing（所要時間・トークン使用量）を追加
+AGGREGATE_VERSION = 2
+STEP_FILE_PREFIX = "step_"
+STEP_FILE_SUFFIX = ".json"
+
+# phase_summary.steps に出力するキー
+STEP_INFO_KEYS = ("step_num", "phase", "done", "done_reason", "timestamp", "error", "message", "stopped")
+
+# final_phase_result に出力するキー
+PHASE_RESULT_KEYS = (
+    "next_phase_name",
+    "next_phase_done_condition",
+    "next_instruction_id",
+    "next_instruction_summary",
+    "next_instruction_inputs",
+    "next_instruction_expected_outputs"
+)
+
+COUNTER_KEYS = ("success_count", "fail_count", "denied_count", "fatal_error_count", "stopped_count")
+
+# 所要時間をロールアップするステージ
+TIMED_STAGES = ("draft", "review", "final")
+
+
+def is_step_file_name(name: str) -> bool:
+    """step_*.json に一致するファイル名か"""
+    return name.startswith(STEP_FILE_PREFIX) and name.endswith(STEP_FILE_SUFFIX)
+
+
+def extract_step_timing(step_data: dict) -> dict:
+    """prompts_used.<stage>.timing と command_results の duration_ms からロールアップ用の値を取り出す"""
+    prompts_used = step_data.get("prompts_used") or {}
+    stage_ms = {}
+    api_attempt_ms = []
+    api_retries = 0
+    json_retries = 0
+    tokens = {"input_tokens": 0, "output_tokens": 0}
+    for stage in TIMED_STAGES:
+        timing = (prompts_used.get(stage) or {}).get("timing")
+        if not timing:
+            continue
+        stage_ms[stage] = timing.get("total_ms")
+        api_attempt_ms.extend(
+            entry["duration_ms"] for entry in timing.get("spans", []) if entry.get("name") == "api_attempt")
+        api_retries += timing.get("api_retries", 0)
+        json_retries += timing.get("json_retries", 0)
+        usage = timing.get("usage") or {}
+        for key in tokens:
+            tokens[key] += usage.get(key, 0)
+
+    execution = step_data.get("execution") or {}
+    command_ms = [
+        result["duration_ms"] for result in execution.get("command_results", [])
+        if result.get("duration_ms") is not None
+    ]
+    if not stage_ms and not command_ms:
+        return None
+    return {
+        "stage_ms": stage_ms,
+        "api_attempt_ms": api_attempt_ms,
+        "api_retries": api_retries,
+        "json_retries": json_retries,
+        "command_ms": command_ms,
+        "tokens": tokens
+    }
+
+
+def make_step_record(step_data: dict) -> dict:
+    """ステップログから集計に必要な項目だけを取り出す"""
+    record = {key: step_data.get(key) for key in STEP_INFO_KEYS}
+    record["stopped"] = step_data.get("stopped", False)
+    if step_data.get("done"):
+        record["phase_result"] = {key: step_data.get(key) for key in PHASE_RESULT_KEYS}
+    timing = extract_step_timing(step_data)
+    if timing is not None:
+        record["timing"] = timing
+    return record
+
+
+def render_timing(records: list) -> tuple:
+    """ステップのレコード群から (latency ロールアップ, トークン使用量) を作る"""
+    samples = {stage: [] for stage in TIMED_STAGES}
+    samples["api_attempt"] = []
+    samples["command"] = []
+    usage = {"input_tokens": 0, "output_tokens": 0, "api_retries": 0, "json_retries": 0}
+    for record in records:
+        timing = record.get("timing")
+        if not timing:
+            continue
+        for stage, value in timing.get("stage_ms", {}).items():
+            if value is not None and stage in samples:
+                samples[stage].append(value)
+        samples["api_attempt"].extend(timing.get("api_attempt_ms", []))
+        samples["command"].extend(timing.get("command_ms", []))
+        usage["api_retries"] += timing.get("api_retries", 0)
+        usage["json_retries"] += timing.get("json_retries", 0)
+        for key in ("input_tokens", "output_tokens"):
+            usage[key] += timing.get("tokens", {}).get(key, 0)
+    latency = {name: summarize_latencies(values) for name, values in samples.items()}
+    return latency, usage
+
+
+def step_counter_deltas(record: dict) -> dict:
+    """1ステップ分のカウンタ増分（write_phase_summary の集計規則と同じ）"""
+    phase = record.get("phase")
+    deltas = {}
+    if record.get("stopped"):
+        # stopped=true は success_count に含めず、deny / fatal_error は別途数える
+        deltas["stopped_count"] = 1
+        if phase == "deny":
+            deltas["denied_count"] = 1
+        elif phase == "fatal_error":
+            deltas["fatal_error_count"] = 1
+    else:
+        if phase == "error":
+            deltas["fail_count"] = 1
+        elif phase == "deny":
+            deltas["denied_count"] = 1
+        elif phase == "fatal_error":
+            deltas["fatal_error_count"] = 1
+        elif phase in ["execute", "done"]:
+            deltas["success_count"] = 1
+    return deltas
+
+
+def read_step_file(path) -> dict:
+    """ステップログを読み込む。失敗時は None"""
+    try:
+        return load_file(path)
+    except Exception as e:
+        print(f"ステップログ読み込みエラー: {path} - {e}")
+        return None
+
+
+class PhaseAggregate:
+    """ステップログの集計サイドカー
+
+    records: ファイル名 -> {"size", "mtime_ns", "record"}（ジャーナル形式は "location" も持つ）
+    counters: COUNTER_KEYS の累計（レコードの追加・置換・削除のたびに増減）
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.counters = {key: 0 for key in COUNTER_KEYS}
+
+    @classmethod
+    def load(cls, path):
+        """サイドカーを読み込む。存在しない・壊れている場合は None"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"集計サイドカー読み込みエラー: {path} - {e}")
+            return None
+        if data.get("version") != AGGREGATE_VERSION:
+            return None
+
+        aggregate = cls()
+        aggregate.records = data.get("records", {})
+        for key in COUNTER_KEYS:
+            aggregate.counters[key] = data.get("counters", {}).get(key, 0)
+        return aggregate
+
+    def save(self, path) -> None:
+        """サイドカーを一時ファイル経由で書き込む"""
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        data = {
+            "version": AGGREGATE_VERSION,
+            "counters": self.counters,
+            "records": self.records
+        }
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _add_counters(self, record: dict, sign: int) -> None:
+        for key, delta in step_counter_deltas(record).items():
+            self.counters[key] += sign * delta
+
+    def discard(self, name: str) -> None:
+        """ファイル名に対応するレコードを取り除く"""
+        entry = self.records.pop(name, None)
+        if entry is not None:
+            self._add_counters(entry["record"], -1)
+
+    def apply(self, name: str, step_data: dict, size: int = None, mtime_ns: int = None,
+              location: list = None) -> None:
+        """ステップログ1件を反映する（同名ファイルは置換）
+
+        location はジャーナル上の位置 [segment, offset]（ファイル形式では None）
+        """
+        self.discard(name)
+        record = make_step_record(step_data)
+        entry = {"size": size, "mtime_ns": mtime_ns, "record": record}
+        if location is not None:
+            entry["location"] = location
+        self.records[name] = entry
+        self._add_counters(record, 1)
+
+    def reconcile(self, steps_dir, check_stat: bool = True) -> bool:
+        """ステップディレクトリと突き合わせ、差分のあるファイルだけ読み直す
+
+        既定では (size, mtime_ns) が変わったファイルも読み直す（ロールバック・手動編集・
+        並列ジョブによる同名ファイルの書き換えを拾うため）。
+        check_stat=False の場合はファイル名の一覧のみで比較する（stat も内容の読込も行わない）
+
+        Returns:
+            bool: サイドカーを更新したか
+        """
+        steps_dir = Path(steps_dir)
+        on_disk = {}
+        if steps_dir.exists():
+            for entry in os.scandir(steps_dir):
+                if is_step_file_name(entry.name):
+                    on_disk[entry.name] = entry
+
+        changed = False
+        for name in list(self.records):
+            if name not in on_disk:
+                self.discard(name)
+                changed = True
+
+        for name, dir_entry in on_disk.items():
+            entry = self.records.get(name)
+            if entry is not None and not check_stat:
+                continue
+            st = dir_entry.stat()
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+            if entry is not None and entry.get("size") == size and entry.get("mtime_ns") == mtime_ns:
+                continue
+            step_data = read_step_file(steps_dir / name)
+            if step_data is None:
+                if entry is not None:
+                    self.discard(name)
+                    changed = True
+                continue
+            self.apply(name, step_data, size, mtime_ns)
+            changed = True
+        return changed
+
+    def reconcile_journal(self, journal) -> bool:
+        """ステップジャーナルの索引と突き合わせ、索引上の位置が変わったレコードだけ読む
+
+        Returns:
+            bool: サイドカーを更新したか
+        """
+        on_index = {}
+        for key in journal.keys():
+            on_index[journal_record_name(*key)] = key
+
+        changed = False
+        for name in list(self.records):
+            if name not in on_index:
+                self.discard(name)
+                changed = True
+
+        for name, key in on_index.items():
+            segment, offset, length = journal.location(*key)
+            entry = self.records.get(name)
+            if entry is not None and entry.get("location") == [segment, offset]:
+                continue
+            step_data = journal.read(*key)
+            if step_data is None:
+                continue
+            self.apply(name, step_data, size=length, location=[segment, offset])
+            changed = True
+        return changed
+
+    @classmethod
+    def rebuild(cls, steps_dir) -> "PhaseAggregate":
+        """ステップファイルからサイドカーを作り直す"""
+        aggregate = cls()
+        aggregate.reconcile(steps_dir)
+        return aggregate
+
+    @classmethod
+    def rebuild_from_journal(cls, journal) -> "PhaseAggregate":
+        """ステップジャーナルからサイドカーを作り直す"""
+        aggregate = cls()
+        aggregate.reconcile_journal(journal)
+        return aggregate
+
+    def render(self) -> dict:
+        """phase_summary の集計部分を生成する（ファイル名順）"""
+        steps = []
+        denied_steps = []
+        fatal_error_steps = []
+        stopped_steps = []
+        final_done = False
+        final_phase_result = None
+
+        for name in sorted(self.records):
+            record = self.records[name]["record"]
+            phase = record.get("phase")
+            steps.append({key: record.get(key) for key in STEP_INFO_KEYS})
+
+            if record.get("stopped"):
+                stopped_steps.append({
+                    "step_num": record.get("step_num"),
+                    "phase": phase,
+                    "reason": record.get("done_reason")
+                })
+            if phase == "deny":
+                denied_steps.append({
+                    "step_num": record.get("step_num"),
+                    "reason": record.get("done_reason"),
+                    "message": record.get("message")
+                })
+            elif phase == "fatal_error":
+                fatal_error_steps.append({
+                    "step_num": record.get("step_num"),
+                    "reason": record.get("done_reason"),
+                    "error": record.get("error")
+                })
+
+            if record.get("done"):
+                final_done = True
+                final_phase_result = record.get("phase_result")
+
+        latency, usage = render_timing(self.records[name]["record"] for name in sorted(self.records))
+
+        rendered = {"total_steps": len(steps)}
+        rendered.update(self.counters)
+        rendered.update({
+            "final_done": final_done,
+            "final_phase_result": final_phase_result,
+            "denied_steps": denied_steps,
+            "fatal_error_steps": fatal_error_steps,
+            "stopped_steps": stopped_steps,
+            "steps": steps,
+            "latency": latency,
+            "token_usage": usage
+        })
+        return rendered
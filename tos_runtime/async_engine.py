@@ -0,0 +1,152 @@
+"""
+TOS v0.3 ランタイム - 非同期実行エンジン
+ブロッキングなAPI呼び出しをスレッドプールに逃がし、同時実行数を制限する
+"""
+
+import contextvars
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# run_sync から駆動しているコルーチンか（ループ上に並行するコルーチンが無い）
+_driven_by_run_sync = contextvars.ContextVar("tos_async_driven_by_run_sync", default=False)
+
+
+class AsyncEngine:
+    """asyncio ベースの実行エンジン
+
+    - run_blocking: ブロッキング関数を実行する。run_sync から駆動している場合は並行するコルーチンが無いため
+      その場で呼び出し、それ以外（asyncio から並行に呼ばれる場合）は run_concurrent と同じ
+    - run_concurrent: ブロッキング関数を executor 上で実行（セマフォで同時実行数を制限）。
+      run_sync から駆動していても他の処理と並行させたい呼び出し（ヘッジ）に使う
+    - run_sync: 同期コードからコルーチンを実行（スレッドごとにイベントループを再利用）
+    - shutdown: executor と、run_sync が作ったすべてのスレッドのイベントループを解放する
+
+    asyncio の import は重いため、実際にコルーチンを動かすまで読み込まない（早期終了の起動を軽くする）
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # asyncio.Semaphore はイベントループに紐づくため、ループごとに保持する
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._local = threading.local()
+        self._loops = weakref.WeakSet()
+        self._loops_lock = threading.Lock()
+        self.stats = {"inline_calls": 0, "executor_calls": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="tos-async"
+                )
+            return self._executor
+
+    def _get_semaphore(self) -> "asyncio.Semaphore":
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """ブロッキング関数を実行する
+
+        run_sync から駆動している場合は executor を経由せずにその場で呼び出す（スレッドの乗り換えを省く）
+        """
+        if _driven_by_run_sync.get():
+            with self._executor_lock:
+                self.stats["inline_calls"] += 1
+            return func(*args, **kwargs)
+        return await self.run_concurrent(func, *args, **kwargs)
+
+    async def run_concurrent(self, func, *args, **kwargs):
+        """ブロッキング関数を executor 上で実行する
+
+        contextvars は呼び出し元のコンテキストをコピーして引き継ぐ
+        """
+        import asyncio
+
+        with self._executor_lock:
+            self.stats["executor_calls"] += 1
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, func, *args, **kwargs)
+        async with self._get_semaphore():
+            return await loop.run_in_executor(self._get_executor(), call)
+
+    def run_sync(self, coro):
+        """同期コードからコルーチンを実行する
+
+        実行中のイベントループがあるスレッドからは呼べない（await を使うこと）
+        """
+        import asyncio
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            coro.close()
+            raise RuntimeError("run_sync はイベントループ実行中のスレッドから呼び出せません")
+
+        loop = getattr(self._local, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            self._local.loop = loop
+            with self._loops_lock:
+                self._loops.add(loop)
+        token = _driven_by_run_sync.set(True)
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            _driven_by_run_sync.reset(token)
+
+    def shutdown(self) -> None:
+        """executor と、run_sync が作ったイベントループ（実行中のものを除く）を解放する"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        with self._loops_lock:
+            loops = list(self._loops)
+        for loop in loops:
+            if not loop.is_closed() and not loop.is_running():
+                loop.close()
+                with self._loops_lock:
+                    self._loops.discard(loop)
+
+    def summary(self) -> dict:
+        with self._executor_lock:
+            return dict(self.stats, max_concurrency=self.max_concurrency)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(config: dict = None) -> AsyncEngine:
+    """プロセス共通の AsyncEngine を取得する
+
+    初回呼び出し時の config["async_engine"]["max_concurrency"] で上限が決まる
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            settings = (config or {}).get("async_engine", {})
+            _engine = AsyncEngine(settings.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+        return _engine
+
+
+def peek_engine():
+    """生成済みの AsyncEngine を返す（未生成なら None）"""
+    return _engine
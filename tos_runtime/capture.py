@@ -0,0 +1,226 @@
+"""
+TOS v0.3 ランタイム - コマンド出力キャプチャ
+stdout/stderr を逐次読み取り、先頭 + 末尾のみをメモリに保持する（全量は任意でファイルへ退避）
+"""
+
+import codecs
+import locale
+import os
+import subprocess
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# 既定はステップログの従来形式（先頭 1000 文字のみ、末尾なし）
+DEFAULT_MAX_CHARS = 1000
+# 1文字は最大 4 バイト（UTF-8）なので、これだけ保持すれば先頭 max_chars 文字を必ず復元できる
+DEFAULT_HEAD_BYTES = DEFAULT_MAX_CHARS * 4
+DEFAULT_TAIL_BYTES = 0
+READ_CHUNK_SIZE = 65536
+# 末尾の切り出し位置が文字の途中だった場合に読み飛ばす最大バイト数
+MAX_CHAR_BYTES = 4
+
+
+class BoundedCapture:
+    """先頭 head_bytes と末尾 tail_bytes だけを保持する出力バッファ
+
+    - head_bytes=None の場合は全量を保持する
+    - max_chars を指定すると、text() は先頭・末尾をそれぞれ max_chars 文字までに切る
+    - spill_path を指定すると、保持しきれなくなった時点でファイルを作り全量を書き出す
+      （収まった場合はファイルを作らない）
+    """
+
+    def __init__(self, head_bytes: int = DEFAULT_HEAD_BYTES, tail_bytes: int = DEFAULT_TAIL_BYTES,
+                 spill_path=None, max_chars: int = None):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.max_chars = max_chars
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self.dropped_bytes = 0
+        self.spilled = False
+        self._chars_truncated = False
+        self._spill_file = None
+        self._lock = threading.Lock()
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        with self._lock:
+            self.total_bytes += len(chunk)
+            if self.head_bytes is None:
+                self.head.extend(chunk)
+                return
+            if self._spill_file is not None:
+                self._spill_file.write(chunk)
+
+            room = self.head_bytes - len(self.head)
+            if room > 0:
+                self.head.extend(chunk[:room])
+                chunk = chunk[room:]
+                if not chunk:
+                    return
+
+            self.tail.extend(chunk)
+            overflow = len(self.tail) - self.tail_bytes
+            if overflow > 0:
+                if self.spill_path is not None and self._spill_file is None:
+                    # 初めて捨てる直前に退避ファイルを作り、それまでの全量を書き出す
+                    self._open_spill()
+                del self.tail[:overflow]
+                self.dropped_bytes += overflow
+
+    def _open_spill(self) -> None:
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        self._spill_file = open(self.spill_path, "wb")
+        self._spill_file.write(bytes(self.head))
+        self._spill_file.write(bytes(self.tail))
+        self.spilled = True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+    @property
+    def truncated(self) -> bool:
+        """出力の一部を捨てたか（text() で max_chars に切った場合を含む）"""
+        return self.dropped_bytes > 0 or self._chars_truncated
+
+    def text(self, encoding: str = None) -> str:
+        """保持している出力を文字列にする
+
+        改行は subprocess の text=True と同じく \\n に揃える。
+        バイト単位の切れ目が多バイト文字の途中に来ても、その文字は置換文字にせず落とす。
+        末尾を保持している場合だけ、省略部分を区切り行で示す
+        """
+        encoding = encoding or locale.getpreferredencoding(False)
+        with self._lock:
+            if not self.dropped_bytes:
+                return self._limit_head(_decode(bytes(self.head) + bytes(self.tail), encoding))
+            head = self._limit_head(_decode_head(bytes(self.head), encoding))
+            self._chars_truncated = True
+            if not self.tail:
+                return head
+            tail = _decode_tail(bytes(self.tail), encoding)
+            if self.max_chars is not None:
+                tail = tail[-self.max_chars:]
+            return f"{head}\n... [{self.dropped_bytes} bytes omitted] ...\n{tail}"
+
+    def _limit_head(self, text: str) -> str:
+        if self.max_chars is not None and len(text) > self.max_chars:
+            self._chars_truncated = True
+            return text[:self.max_chars]
+        return text
+
+
+def _normalize_newlines(text: str) -> str:
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _decode(data: bytes, encoding: str) -> str:
+    return _normalize_newlines(data.decode(encoding, errors="replace"))
+
+
+def _decode_head(data: bytes, encoding: str) -> str:
+    """後ろで切れたバイト列を復号する（末尾の書きかけの文字は落とす）"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    return _normalize_newlines(decoder.decode(data, final=False))
+
+
+def _decode_tail(data: bytes, encoding: str) -> str:
+    """前で切れたバイト列を復号する（先頭の文字の途中のバイトは読み飛ばす）"""
+    for skip in range(min(MAX_CHAR_BYTES, len(data))):
+        try:
+            return _normalize_newlines(data[skip:].decode(encoding))
+        except UnicodeDecodeError:
+            continue
+    return _decode(data, encoding)
+
+
+class CaptureSettings:
+    """command_capture 設定"""
+
+    def __init__(self, head_bytes: int = DEFAULT_HEAD_BYTES, tail_bytes: int = DEFAULT_TAIL_BYTES,
+                 spill: bool = False, spill_dir=None, max_chars: int = DEFAULT_MAX_CHARS):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.max_chars = max_chars
+        self.spill = spill
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+
+    @classmethod
+    def from_config(cls, config: dict, base_dir) -> "CaptureSettings":
+        settings = config.get("command_capture", {})
+        workspace_dir = config.get("workspace_dir", "workspace")
+        spill_dir = settings.get("spill_dir", f"{workspace_dir}/results/command_output")
+        return cls(
+            head_bytes=settings.get("head_bytes", DEFAULT_HEAD_BYTES),
+            tail_bytes=settings.get("tail_bytes", DEFAULT_TAIL_BYTES),
+            spill=settings.get("spill", False),
+            spill_dir=Path(base_dir) / spill_dir,
+            max_chars=settings.get("max_chars", DEFAULT_MAX_CHARS)
+        )
+
+    def new_pair(self) -> tuple:
+        """1コマンド分の (stdout, stderr) キャプチャを作る"""
+        stem = None
+        if self.spill and self.spill_dir is not None:
+            stem = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        captures = []
+        for stream in ("stdout", "stderr"):
+            spill_path = self.spill_dir / f"{stem}_{stream}.log" if stem else None
+            captures.append(BoundedCapture(self.head_bytes, self.tail_bytes, spill_path, self.max_chars))
+        return tuple(captures)
+
+
+def _pump(stream, capture: BoundedCapture) -> None:
+    fd = stream.fileno()
+    while True:
+        try:
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+        except OSError:
+            break
+        if not chunk:
+            break
+        capture.write(chunk)
+
+
+def run_captured(argv: list, timeout: float, stdout_capture: BoundedCapture,
+                 stderr_capture: BoundedCapture, cwd: str = None) -> int:
+    """subprocess.run(capture_output=True) の代わりに、出力を逐次キャプチャへ流して実行する
+
+    Returns:
+        int: 終了コード
+
+    Raises:
+        subprocess.TimeoutExpired: timeout 超過（プロセスは終了させる）
+    """
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+    readers = [
+        threading.Thread(target=_pump, args=(process.stdout, stdout_capture), daemon=True),
+        threading.Thread(target=_pump, args=(process.stderr, stderr_capture), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    join_timeout = None
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        # 孫プロセスがパイプを握ったままの場合に備え、読み取りの待ちは打ち切る
+        join_timeout = 5
+        raise
+    finally:
+        for reader in readers:
+            reader.join(join_timeout)
+        process.stdout.close()
+        process.stderr.close()
+        stdout_capture.close()
+        stderr_capture.close()
+    return returncode
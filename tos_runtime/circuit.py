@@ -0,0 +1,236 @@
+"""
+TOS v0.3 ランタイム - サーキットブレーカー
+プロバイダごとに closed / open / half_open を管理し、障害中は API を呼ばずに即失敗させる（状態はファイルに保存して実行間で共有）
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_OPEN_SEC = 60
+DEFAULT_HALF_OPEN_MAX_CALLS = 1
+DEFAULT_MAX_TRANSITIONS = 100
+STATE_VERSION = 1
+
+# ブレーカーの失敗として数えるエラー種別（429 はプロバイダが応答しているため数えない）
+DEFAULT_TRIP_ON = ("server", "transient")
+
+
+class CircuitOpenError(Exception):
+    """回路が open のため呼び出さなかった"""
+
+    def __init__(self, provider: str, retry_in_sec: float):
+        super().__init__(f"{provider} のサーキットブレーカーが open（あと {retry_in_sec:.0f} 秒で再試行）")
+        self.provider = provider
+        self.retry_in_sec = retry_in_sec
+
+
+class CircuitBreakerRegistry:
+    """プロバイダごとのサーキットブレーカー
+
+    - closed: 連続失敗が failure_threshold に達したら open
+    - open: open_sec の間は check() が CircuitOpenError を送出する。経過後は half_open
+    - half_open: half_open_max_calls 件だけ試行を通し、成功で closed、失敗で再び open
+      （trip_on 以外の失敗 = 429 / 4xx はプロバイダが応答したので成功と同じく closed。
+      結果を記録しない試行は release() で枠を返す）
+
+    状態は state_path に一時ファイル + os.replace で保存し、ファイルが更新されていれば読み直す
+    （連続実行・並列ジョブのプロセス間で共有する。厳密な排他はしない）
+    """
+
+    def __init__(self, state_path, enabled: bool = False, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 open_sec: float = DEFAULT_OPEN_SEC, half_open_max_calls: int = DEFAULT_HALF_OPEN_MAX_CALLS,
+                 trip_on: tuple = DEFAULT_TRIP_ON):
+        self.state_path = Path(state_path)
+        self.enabled = enabled
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_sec = open_sec
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.trip_on = tuple(trip_on)
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._transitions = []
+        self._loaded_mtime_ns = None
+        # half_open の試行枠はプロセス内でのみ数える
+        self._half_open_inflight = {}
+        self.stats = {"rejected": 0, "transitions": 0, "trips": 0}
+
+    @classmethod
+    def from_config(cls, config: dict, base_dir) -> "CircuitBreakerRegistry":
+        settings = config.get("circuit_breaker", {})
+        workspace_dir = config.get("workspace_dir", "workspace")
+        state_path = settings.get("state_path", f"{workspace_dir}/artifacts/circuit_state.json")
+        return cls(
+            state_path=Path(base_dir) / state_path,
+            enabled=settings.get("enabled", False),
+            failure_threshold=settings.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+            open_sec=settings.get("open_sec", DEFAULT_OPEN_SEC),
+            half_open_max_calls=settings.get("half_open_max_calls", DEFAULT_HALF_OPEN_MAX_CALLS),
+            trip_on=settings.get("trip_on", DEFAULT_TRIP_ON)
+        )
+
+    def _reload(self) -> None:
+        try:
+            mtime_ns = self.state_path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns == self._loaded_mtime_ns:
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"サーキットブレーカー状態の読み込みエラー: {self.state_path} - {e}")
+            return
+        self._providers = data.get("providers", {})
+        self._transitions = data.get("transitions", [])
+        self._loaded_mtime_ns = mtime_ns
+
+    def _save(self) -> None:
+        data = {
+            "version": STATE_VERSION,
+            "updated_at": datetime.now().isoformat(),
+            "providers": self._providers,
+            "transitions": self._transitions[-DEFAULT_MAX_TRANSITIONS:]
+        }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+        self._loaded_mtime_ns = self.state_path.stat().st_mtime_ns
+
+    def _entry(self, provider: str) -> dict:
+        return self._providers.setdefault(provider, {"state": STATE_CLOSED, "failures": 0, "opened_at": None})
+
+    def _transition(self, provider: str, entry: dict, new_state: str, reason: str) -> None:
+        old_state = entry["state"]
+        entry["state"] = new_state
+        if new_state == STATE_OPEN:
+            entry["opened_at"] = time.time()
+            self.stats["trips"] += 1
+        elif new_state == STATE_CLOSED:
+            entry["opened_at"] = None
+            entry["failures"] = 0
+        self._half_open_inflight[provider] = 0
+        self._transitions.append({
+            "provider": provider,
+            "from": old_state,
+            "to": new_state,
+            "reason": reason,
+            "at": datetime.now().isoformat(),
+            "pid": os.getpid()
+        })
+        self.stats["transitions"] += 1
+        print(f"サーキットブレーカー: {provider} {old_state} -> {new_state} ({reason})")
+
+    def check(self, provider: str) -> None:
+        """呼び出し前の確認（open なら CircuitOpenError）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._reload()
+            entry = self._entry(provider)
+            if entry["state"] == STATE_OPEN:
+                remaining = (entry["opened_at"] or 0) + self.open_sec - time.time()
+                if remaining > 0:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(provider, remaining)
+                self._transition(provider, entry, STATE_HALF_OPEN, f"open から {self.open_sec} 秒経過")
+                self._save()
+            if entry["state"] == STATE_HALF_OPEN:
+                inflight = self._half_open_inflight.get(provider, 0)
+                if inflight >= self.half_open_max_calls:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(provider, 0)
+                self._half_open_inflight[provider] = inflight + 1
+
+    def record_success(self, provider: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._reload()
+            entry = self._entry(provider)
+            if entry["state"] != STATE_CLOSED:
+                self._transition(provider, entry, STATE_CLOSED, "試行成功")
+                self._save()
+            elif entry["failures"]:
+                entry["failures"] = 0
+                self._save()
+
+    def record_failure(self, provider: str, error_class: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._reload()
+            entry = self._entry(provider)
+            if error_class not in self.trip_on:
+                # 429 / 4xx はプロバイダが応答しているので、half_open の試行は完了（回復）とみなす
+                if entry["state"] == STATE_HALF_OPEN:
+                    self._transition(provider, entry, STATE_CLOSED, f"half_open の試行に応答あり ({error_class})")
+                    self._save()
+                return
+            entry["failures"] = entry.get("failures", 0) + 1
+            if entry["state"] == STATE_HALF_OPEN:
+                self._transition(provider, entry, STATE_OPEN, f"half_open の試行が失敗 ({error_class})")
+            elif entry["state"] == STATE_CLOSED and entry["failures"] >= self.failure_threshold:
+                self._transition(provider, entry, STATE_OPEN, f"連続失敗 {entry['failures']} 回 ({error_class})")
+            self._save()
+
+    def release(self, provider: str) -> None:
+        """check() で取った half_open の試行枠を、結果を記録せずに返す（取り消し・想定外の例外）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            inflight = self._half_open_inflight.get(provider, 0)
+            if inflight > 0:
+                self._half_open_inflight[provider] = inflight - 1
+
+    def raise_if_open(self, provider: str) -> None:
+        """open なら CircuitOpenError（half_open の試行枠は消費しない。リトライのバックオフ前に使う）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            # 他のプロセスが記録した open も拾う
+            self._reload()
+            entry = self._entry(provider)
+            if entry["state"] == STATE_OPEN:
+                raise CircuitOpenError(provider, max(0.0, (entry["opened_at"] or 0) + self.open_sec - time.time()))
+
+    def state_of(self, provider: str) -> str:
+        with self._lock:
+            self._reload()
+            return self._entry(provider)["state"]
+
+    def summary(self) -> dict:
+        with self._lock:
+            states = {p: {"state": e["state"], "failures": e.get("failures", 0)} for p, e in self._providers.items()}
+            return dict(self.stats, providers=states)
+
+
+_registry_source = None
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breakers(config: dict, base_dir) -> CircuitBreakerRegistry:
+    """config から構築した CircuitBreakerRegistry を取得する（同じ config オブジェクトには一度だけ構築）"""
+    global _registry_source, _registry
+    with _registry_lock:
+        if _registry is None or _registry_source is not config:
+            _registry = CircuitBreakerRegistry.from_config(config, base_dir)
+            _registry_source = config
+        return _registry
+
+
+def peek_circuit_breakers():
+    """構築済みの CircuitBreakerRegistry を返す（未構築なら None）"""
+    return _registry
@@ -0,0 +1,182 @@
+"""
+TOS v0.3 ランタイム - プロバイダクライアントレジストリ
+requests.Session / Anthropic クライアントをプロセス内で使い回す
+"""
+
+import threading
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 8
+DEFAULT_KEEP_ALIVE_EXPIRY_SEC = 30
+
+
+class ProviderClientRegistry:
+    """プロバイダごとのクライアントを1プロセス1つに保つレジストリ
+
+    - OpenAI: 接続プール付きの requests.Session（keep-alive）
+    - Anthropic: (api_key, base_url) ごとに anthropic.Anthropic を1つ
+    """
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 keep_alive: bool = True,
+                 keep_alive_expiry_sec: float = DEFAULT_KEEP_ALIVE_EXPIRY_SEC):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.keep_alive_expiry_sec = keep_alive_expiry_sec
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._anthropic_clients = {}
+        self._counters = {
+            "sessions_created": 0,
+            "session_reuses": 0,
+            "http_requests": 0,
+            "anthropic_clients_created": 0,
+            "anthropic_client_reuses": 0
+        }
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ProviderClientRegistry":
+        settings = config.get("provider_clients", {})
+        return cls(
+            pool_connections=settings.get("pool_connections", DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=settings.get("pool_maxsize", DEFAULT_POOL_MAXSIZE),
+            keep_alive=settings.get("keep_alive", True),
+            keep_alive_expiry_sec=settings.get("keep_alive_expiry_sec", DEFAULT_KEEP_ALIVE_EXPIRY_SEC)
+        )
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def get_session(self):
+        """接続プール付きの requests.Session を取得する"""
+        with self._lock:
+            if self._session is not None:
+                self._counters["session_reuses"] += 1
+                return self._session
+
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+
+            self._session = session
+            self._counters["sessions_created"] += 1
+            return session
+
+    def post(self, url: str, **kwargs):
+        """プール済みセッションで POST する"""
+        session = self.get_session()
+        self._count("http_requests")
+        return session.post(url, **kwargs)
+
+    def get_anthropic_client(self, api_key: str, **client_kwargs):
+        """(api_key, base_url) ごとに1つの anthropic.Anthropic を取得する
+
+        base_url 以外の client_kwargs は初回生成時のみ反映される
+        （呼び出し元の dict は変更しない）
+        """
+        client_kwargs = dict(client_kwargs)
+        client_key = (api_key, client_kwargs.get("base_url"))
+        with self._lock:
+            client = self._anthropic_clients.get(client_key)
+            if client is not None:
+                self._counters["anthropic_client_reuses"] += 1
+                return client
+
+            import anthropic
+            try:
+                import httpx
+            except ImportError:
+                httpx = None
+
+            # DefaultHttpxClient が無い古い SDK や httpx が無い環境では SDK 既定の接続プールを使う
+            http_client_cls = getattr(anthropic, "DefaultHttpxClient", None)
+            if httpx is not None and http_client_cls is not None and "http_client" not in client_kwargs:
+                limits = httpx.Limits(
+                    max_connections=self.pool_maxsize,
+                    max_keepalive_connections=self.pool_maxsize if self.keep_alive else 0,
+                    keepalive_expiry=self.keep_alive_expiry_sec if self.keep_alive else 0
+                )
+                client_kwargs["http_client"] = http_client_cls(limits=limits)
+            client = anthropic.Anthropic(api_key=api_key, **client_kwargs)
+            self._anthropic_clients[client_key] = client
+            self._counters["anthropic_clients_created"] += 1
+            return client
+
+    def _http_pool_stats(self) -> dict:
+        """urllib3 の接続プールから接続数とリクエスト数を集計する"""
+        connections_opened = 0
+        pooled_requests = 0
+        session = self._session
+        if session is None:
+            return {"connections_opened": 0, "pooled_requests": 0, "connections_reused": 0}
+
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                connections_opened += pool.num_connections
+                pooled_requests += pool.num_requests
+
+        return {
+            "connections_opened": connections_opened,
+            "pooled_requests": pooled_requests,
+            "connections_reused": max(0, pooled_requests - connections_opened)
+        }
+
+    def stats(self) -> dict:
+        """接続再利用のカウンタを返す"""
+        with self._lock:
+            stats = dict(self._counters)
+            http_stats = self._http_pool_stats()
+        stats.update(http_stats)
+        stats["pool_maxsize"] = self.pool_maxsize
+        stats["keep_alive"] = self.keep_alive
+        return stats
+
+    def close(self) -> None:
+        """保持しているクライアントを閉じる"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            for client in self._anthropic_clients.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            self._anthropic_clients = {}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry(config: dict = None) -> ProviderClientRegistry:
+    """プロセス共通の ProviderClientRegistry を取得する"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderClientRegistry.from_config(config or {})
+        return _registry
+
+
+def peek_client_registry():
+    """生成済みのレジストリを返す（未生成なら None、生成はしない）"""
+    return _registry
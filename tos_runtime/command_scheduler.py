@@ -0,0 +1,110 @@
+"""
+TOS v0.3 ランタイム - コマンド並列スケジューラ
+final_commands の depends_on / parallel_group から依存関係を作り、上限付きワーカーで実行する
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def build_dependencies(commands: list) -> list:
+    """各コマンドが完了を待つコマンド番号の集合を返す
+
+    規則:
+    - 連続する同じ parallel_group のコマンドは1つのステージとして並行実行する
+    - parallel_group の無いコマンドは単独のステージ
+    - 各ステージは直前のステージの全コマンド完了を待つ（逐次実行と同じ順序）
+    - depends_on (id のリスト) を持つコマンドは、直前ステージの代わりに指定 id の完了だけを待つ
+      （自分より前のコマンドの id のみ有効）
+    """
+    ids = {}
+    dependencies = []
+    previous_stage = set()
+    current_stage = set()
+    current_group = None
+
+    for index, cmd in enumerate(commands):
+        group = cmd.get("parallel_group")
+        if group is None or group != current_group:
+            if current_stage:
+                previous_stage = current_stage
+            current_stage = set()
+            current_group = group
+
+        depends_on = cmd.get("depends_on")
+        if depends_on is None:
+            deps = set(previous_stage)
+        else:
+            if isinstance(depends_on, str):
+                depends_on = [depends_on]
+            deps = set()
+            for dep_id in depends_on:
+                if dep_id in ids:
+                    deps.add(ids[dep_id])
+                else:
+                    print(f"depends_on '{dep_id}' は先行コマンドに存在しないため無視します (index={index})")
+
+        dependencies.append(deps)
+        current_stage.add(index)
+        if cmd.get("id") is not None:
+            ids[cmd.get("id")] = index
+
+    return dependencies
+
+
+def run_dependency_graph(commands: list, runner, max_workers: int = DEFAULT_MAX_WORKERS) -> tuple:
+    """依存関係に従ってコマンドを並行実行する
+
+    Args:
+        commands: final_commands
+        runner: runner(index) -> (result, failed: bool)。ワーカースレッドから呼ばれる
+        max_workers: 同時実行数の上限
+
+    Returns:
+        tuple: (results: 入力順の runner 結果（未実行は None）,
+                skipped: fail fast で実行しなかったコマンド番号 -> 失敗した parallel_group)
+    """
+    count = len(commands)
+    dependencies = build_dependencies(commands)
+    results = [None] * count
+    finished = set()
+    started = set()
+    skipped = {}
+    failed_groups = set()
+
+    max_workers = max(1, int(max_workers))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tos-cmd") as pool:
+        running = {}
+        while len(finished) < count:
+            for index in range(count):
+                if index in started or not dependencies[index] <= finished:
+                    continue
+                # キューに積みすぎると fail fast で止められないため、空きワーカー分だけ投入する
+                if len(running) >= max_workers:
+                    break
+                group = commands[index].get("parallel_group")
+                if group is not None and group in failed_groups:
+                    # 同じグループ内で失敗があれば未開始のコマンドは実行しない
+                    started.add(index)
+                    finished.add(index)
+                    skipped[index] = group
+                    continue
+                started.add(index)
+                running[pool.submit(runner, index)] = index
+
+            if not running:
+                # 依存が満たせないコマンドは無い構造だが、念のため無限待ちを避ける
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                result, failed = future.result()
+                results[index] = result
+                finished.add(index)
+                group = commands[index].get("parallel_group")
+                if failed and group is not None:
+                    failed_groups.add(group)
+
+    return results, skipped
@@ -0,0 +1,341 @@
+"""
+TOS v0.3 ランタイム - done 条件エンジン
+config の done_conditions（成果物 glob・必須キーワード/正規表現・JSON パス）でフェーズ完了を判定する
+"""
+
+import codecs
+import glob
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_REGEX_OVERLAP_CHARS = 4096
+DEFAULT_CACHE_SIZE = 256
+
+# BOM -> エンコーディング（長い BOM を先に判定する）
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+def detect_encoding(head: bytes) -> tuple:
+    """先頭バイトからエンコーディングを判定する
+
+    Returns:
+        tuple: (encoding, bom_length)。BOM が無い場合は utf-8（NUL の並びから UTF-16 を推定）
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            # utf-8-sig は BOM をデコーダ側で取り除く
+            return encoding, 0 if encoding == "utf-8-sig" else len(bom)
+    sample = head[:4096]
+    if len(sample) >= 2 and sample.count(b"\x00") * 4 >= len(sample):
+        # BOM 無し UTF-16: ASCII 部分の上位バイトが NUL になる位置で判定
+        if sample[1::2].count(b"\x00") >= sample[0::2].count(b"\x00"):
+            return "utf-16-le", 0
+        return "utf-16-be", 0
+    return "utf-8", 0
+
+
+def iter_text_chunks(path, chunk_size: int = DEFAULT_CHUNK_SIZE, fallback_encoding: str = "cp932"):
+    """ファイルを chunk_size バイトずつ読み、デコード済みの文字列を順に返す
+
+    BOM 無しで UTF-8 として不正なバイト列に当たった場合は fallback_encoding で先頭から読み直す
+    """
+    with open(path, "rb") as f:
+        head = f.read(chunk_size)
+        encoding, skip = detect_encoding(head)
+        try:
+            yield from _decode_chunks(f, head[skip:], encoding, chunk_size)
+            return
+        except UnicodeDecodeError:
+            if encoding != "utf-8":
+                raise
+        f.seek(0)
+        yield _RESTART
+        yield from _decode_chunks(f, f.read(chunk_size), fallback_encoding, chunk_size)
+
+
+# iter_text_chunks が読み直しを始めたことを示す目印
+_RESTART = object()
+
+
+def _decode_chunks(f, first: bytes, encoding: str, chunk_size: int):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    data = first
+    while data:
+        text = decoder.decode(data)
+        if text:
+            yield text
+        data = f.read(chunk_size)
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def read_text(path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """エンコーディングを判定してファイル全体を読む"""
+    parts = []
+    for text in iter_text_chunks(path, chunk_size):
+        if text is _RESTART:
+            parts = []
+            continue
+        parts.append(text)
+    return "".join(parts)
+
+
+def scan_text(path, keywords: list, patterns: list, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              overlap_chars: int = DEFAULT_REGEX_OVERLAP_CHARS) -> tuple:
+    """ファイルをチャンク単位で走査し、キーワードと正規表現の出現を調べる
+
+    チャンク境界をまたぐ一致は、直前チャンク末尾の overlap 文字を持ち越して検出する
+    （正規表現は overlap_chars より長い一致を取りこぼすことがある）
+
+    Returns:
+        tuple: (見つからなかったキーワード, 一致しなかったパターン文字列)
+    """
+    missing_keywords = list(keywords)
+    missing_patterns = list(patterns)
+    compiled = {p: re.compile(p) for p in patterns}
+    keyword_overlap = max((len(k) for k in keywords), default=1) - 1
+    overlap = max(keyword_overlap, overlap_chars if patterns else 0)
+
+    carry = ""
+    for text in iter_text_chunks(path, chunk_size):
+        if text is _RESTART:
+            missing_keywords = list(keywords)
+            missing_patterns = list(patterns)
+            carry = ""
+            continue
+        window = carry + text
+        missing_keywords = [k for k in missing_keywords if k not in window]
+        missing_patterns = [p for p in missing_patterns if not compiled[p].search(window)]
+        if not missing_keywords and not missing_patterns:
+            break
+        carry = window[-overlap:] if overlap > 0 else ""
+    return missing_keywords, missing_patterns
+
+
+def resolve_json_path(data, path: str):
+    """"$.a.b[0].c" 形式のパスで値を取り出す
+
+    Returns:
+        tuple: (found: bool, value)
+    """
+    tokens = re.findall(r"[^.\[\]]+|\[\d+\]", path[1:] if path.startswith("$") else path)
+    current = data
+    for token in tokens:
+        if token.startswith("["):
+            index = int(token[1:-1])
+            if not isinstance(current, list) or index >= len(current):
+                return False, None
+            current = current[index]
+        else:
+            if not isinstance(current, dict) or token not in current:
+                return False, None
+            current = current[token]
+    return True, current
+
+
+def check_json_paths(path, json_checks: list, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """JSON パス条件を評価し、満たさなかった条件の説明を返す
+
+    条件: {"path": "$.a.b"} は存在確認、"equals" で値の一致、"not_empty": true で空でないこと
+    """
+    try:
+        data = json.loads(read_text(path, chunk_size))
+    except ValueError as e:
+        return [f"JSON として読めない: {e}"]
+
+    failures = []
+    for check in json_checks:
+        json_path = check.get("path", "$")
+        found, value = resolve_json_path(data, json_path)
+        if not found:
+            failures.append(f"{json_path} が存在しない")
+        elif "equals" in check and value != check["equals"]:
+            failures.append(f"{json_path} = {value!r} (期待値 {check['equals']!r})")
+        elif check.get("not_empty") and value in (None, "", [], {}):
+            failures.append(f"{json_path} が空")
+    return failures
+
+
+class DoneCheck:
+    """done_conditions.checks の1要素"""
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.glob = spec["glob"]
+        self.keywords = list(spec.get("keywords", []))
+        regex = spec.get("regex", [])
+        self.patterns = [regex] if isinstance(regex, str) else list(regex)
+        self.json_checks = list(spec.get("json", []))
+        # match: any = いずれかのファイルが満たせばよい / all = 全ファイルが満たす必要がある
+        self.match = spec.get("match", "any")
+        self.description = spec.get("description", self.glob)
+
+
+class DoneResult:
+    """判定結果"""
+
+    def __init__(self, done: bool, reason: str, details: list):
+        self.done = done
+        self.reason = reason
+        self.details = details
+
+
+class DoneConditionEngine:
+    """done 条件エンジン
+
+    ファイル単位の判定結果を (check 番号, path, size, mtime_ns) をキーにキャッシュし、
+    成果物が変わらない限りファイルを読み直さない
+    """
+
+    def __init__(self, checks: list, base_dir, mode: str = "all", done_reason: str = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, overlap_chars: int = DEFAULT_REGEX_OVERLAP_CHARS,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        self.checks = [DoneCheck(spec) for spec in checks]
+        self.base_dir = Path(base_dir)
+        self.mode = mode
+        self.done_reason = done_reason
+        self.chunk_size = chunk_size
+        self.overlap_chars = overlap_chars
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"evaluations": 0, "file_checks": 0, "cache_hits": 0}
+
+    @classmethod
+    def from_config(cls, config: dict, base_dir, default_checks: list = None,
+                    default_reason: str = None) -> "DoneConditionEngine":
+        settings = config.get("done_conditions", {})
+        return cls(
+            checks=settings.get("checks", default_checks or []),
+            base_dir=base_dir,
+            mode=settings.get("mode", "all"),
+            done_reason=settings.get("done_reason", default_reason),
+            chunk_size=settings.get("chunk_size", DEFAULT_CHUNK_SIZE),
+            overlap_chars=settings.get("regex_overlap_chars", DEFAULT_REGEX_OVERLAP_CHARS),
+            cache_size=settings.get("cache_size", DEFAULT_CACHE_SIZE)
+        )
+
+    def _check_file(self, index: int, check: DoneCheck, path: str) -> list:
+        """1ファイルを判定し、満たさなかった条件の説明を返す（空なら合格）"""
+        st = os.stat(path)
+        key = (index, path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            self.stats["file_checks"] += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return cached
+
+        failures = []
+        if check.keywords or check.patterns:
+            missing_keywords, missing_patterns = scan_text(
+                path, check.keywords, check.patterns, self.chunk_size, self.overlap_chars)
+            if missing_keywords:
+                failures.append(f"必須キーワード不足 {missing_keywords}")
+            if missing_patterns:
+                failures.append(f"正規表現に一致しない {missing_patterns}")
+        if check.json_checks:
+            failures.extend(check_json_paths(path, check.json_checks, self.chunk_size))
+
+        with self._lock:
+            self._cache[key] = failures
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return failures
+
+    def _evaluate_check(self, index: int, check: DoneCheck) -> dict:
+        pattern = str(self.base_dir / check.glob)
+        paths = sorted(glob.glob(pattern, recursive=True))
+        if not paths:
+            return {"check": check.description, "passed": False, "reason": f"{check.glob} が存在しない"}
+
+        failed = {}
+        passed = []
+        for path in paths:
+            try:
+                failures = self._check_file(index, check, path)
+            except (OSError, UnicodeDecodeError) as e:
+                failures = [f"読み込みエラー: {e}"]
+            if failures:
+                failed[path] = failures
+            else:
+                passed.append(path)
+                if check.match == "any":
+                    break
+
+        ok = bool(passed) if check.match == "any" else not failed
+        reasons = []
+        for path, failures in failed.items():
+            rel = os.path.relpath(path, self.base_dir)
+            reasons.append(f"{rel}: {', '.join(failures)}")
+        return {
+            "check": check.description,
+            "passed": ok,
+            "reason": "; ".join(reasons) if not ok else "条件クリア",
+            "files": [os.path.relpath(p, self.base_dir) for p in passed]
+        }
+
+    def evaluate(self) -> DoneResult:
+        """全条件を評価する（mode=all は全条件、any はいずれかの条件を満たせば done）"""
+        with self._lock:
+            self.stats["evaluations"] += 1
+        details = []
+        for index, check in enumerate(self.checks):
+            detail = self._evaluate_check(index, check)
+            details.append(detail)
+            if self.mode == "all" and not detail["passed"]:
+                break
+            if self.mode == "any" and detail["passed"]:
+                break
+
+        if not self.checks:
+            done = False
+        elif self.mode == "any":
+            done = any(d["passed"] for d in details)
+        else:
+            done = len(details) == len(self.checks) and all(d["passed"] for d in details)
+
+        if done:
+            reason = self.done_reason or "done 条件をすべて満たした"
+        else:
+            reason = "; ".join(d["reason"] for d in details if not d["passed"]) or "done 条件が未定義"
+        return DoneResult(done, reason, details)
+
+    def summary(self) -> dict:
+        """統計情報を返す"""
+        with self._lock:
+            return dict(self.stats, cached_files=len(self._cache))
+
+
+_engine_source = None
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_done_engine(config: dict, base_dir, default_checks: list = None,
+                    default_reason: str = None) -> DoneConditionEngine:
+    """config から構築した DoneConditionEngine を取得する（同じ config オブジェクトには一度だけ構築）"""
+    global _engine_source, _engine
+    with _engine_lock:
+        if _engine is None or _engine_source is not config:
+            _engine = DoneConditionEngine.from_config(config, base_dir, default_checks, default_reason)
+            _engine_source = config
+        return _engine
+
+
+def peek_done_engine():
+    """構築済みのエンジンを返す（未構築なら None）"""
+    return _engine
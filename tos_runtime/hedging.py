@@ -0,0 +1,190 @@
+"""
+TOS v0.3 ランタイム - ヘッジリクエスト
+直近レイテンシのパーセンタイルを過ぎても応答が無い呼び出しに複製を送り、先に返った方を採用する
+"""
+
+import threading
+import time
+from collections import deque
+
+from tos_runtime.instrumentation import percentile
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 200
+DEFAULT_MAX_EXTRA_RATE = 0.05
+DEFAULT_MIN_DELAY_MS = 0
+DEFAULT_STAGES = ("draft", "final")
+
+
+class HedgePolicy:
+    """ヘッジの判定とレート上限
+
+    - レイテンシ標本は (provider, stage) ごとに直近 window 件を保持する（一次リクエストの完了時間のみ。
+      ヘッジで短縮された値を混ぜると閾値が下がり続けるため）
+    - ヘッジ数は対象呼び出し数の max_extra_rate 倍を超えない
+    """
+
+    def __init__(self, enabled: bool = False, stages: tuple = DEFAULT_STAGES, percentile: float = DEFAULT_PERCENTILE,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, window: int = DEFAULT_WINDOW,
+                 max_extra_rate: float = DEFAULT_MAX_EXTRA_RATE, min_delay_ms: float = DEFAULT_MIN_DELAY_MS):
+        self.enabled = enabled
+        self.stages = tuple(stages)
+        self.percentile = percentile
+        self.min_samples = max(1, min_samples)
+        self.window = window
+        self.max_extra_rate = max_extra_rate
+        self.min_delay_ms = min_delay_ms
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "eligible_calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "losers_cancelled": 0,
+            "skipped_warmup": 0,
+            "skipped_rate_cap": 0
+        }
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HedgePolicy":
+        settings = config.get("hedging", {})
+        return cls(
+            enabled=settings.get("enabled", False),
+            stages=settings.get("stages", DEFAULT_STAGES),
+            percentile=settings.get("percentile", DEFAULT_PERCENTILE),
+            min_samples=settings.get("min_samples", DEFAULT_MIN_SAMPLES),
+            window=settings.get("window", DEFAULT_WINDOW),
+            max_extra_rate=settings.get("max_extra_rate", DEFAULT_MAX_EXTRA_RATE),
+            min_delay_ms=settings.get("min_delay_ms", DEFAULT_MIN_DELAY_MS)
+        )
+
+    def applies_to(self, stage: str) -> bool:
+        return self.enabled and stage in self.stages
+
+    def record_latency(self, key: tuple, latency_ms: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency_ms)
+
+    def record_outcome(self, hedge_won: bool, cancelled: int = 0) -> None:
+        """ヘッジした呼び出しの結果（ヘッジが勝ったか、打ち切った側の数）を記録する"""
+        with self._lock:
+            if hedge_won:
+                self.stats["hedge_wins"] += 1
+            self.stats["losers_cancelled"] += cancelled
+
+    def plan(self, key: tuple):
+        """この呼び出しのヘッジ待ち秒数を決める（ヘッジしない場合は None）
+
+        ヘッジする場合はこの時点でレート上限の枠を予約する
+        """
+        with self._lock:
+            self.stats["eligible_calls"] += 1
+            samples = self._samples.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                self.stats["skipped_warmup"] += 1
+                return None
+            if self.stats["hedged"] + 1 > self.max_extra_rate * self.stats["eligible_calls"]:
+                self.stats["skipped_rate_cap"] += 1
+                return None
+            self.stats["hedged"] += 1
+            delay_ms = max(self.min_delay_ms, percentile(list(samples), self.percentile))
+        return delay_ms / 1000
+
+    def release(self) -> None:
+        """plan() で予約した枠を返す（閾値前に一次リクエストが返った場合）"""
+        with self._lock:
+            self.stats["hedged"] -= 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = dict(self.stats)
+            summary["samples"] = {f"{k[0]}/{k[1]}": len(v) for k, v in self._samples.items()}
+            return summary
+
+
+async def run_hedged(policy: HedgePolicy, key: tuple, start_request) -> tuple:
+    """start_request(cancel_event) で一次リクエストを開始し、閾値を過ぎたら同じものをもう1つ送る
+
+    start_request は awaitable を返す関数。cancel_event（threading.Event）がセットされたら
+    呼び出し側はリトライや待機を打ち切る（実行中の HTTP 呼び出し自体は中断できない）
+
+    Returns:
+        tuple: (result, hedge_info)。hedge_info は {"hedged", "winner", "delay_ms"}
+    """
+    import asyncio
+
+    info = {"hedged": False, "winner": "primary", "delay_ms": None}
+    primary_cancel = threading.Event()
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(start_request(primary_cancel))
+
+    def _record_primary(task):
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            policy.record_latency(key, (time.perf_counter() - started) * 1000)
+
+    primary.add_done_callback(_record_primary)
+
+    delay = policy.plan(key)
+    if delay is None:
+        return await primary, info
+
+    info["delay_ms"] = round(delay * 1000, 3)
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        policy.release()
+        return primary.result(), info
+
+    info["hedged"] = True
+    hedge_cancel = threading.Event()
+    hedge = asyncio.ensure_future(start_request(hedge_cancel))
+    cancels = {primary: primary_cancel, hedge: hedge_cancel}
+    pending = {primary, hedge}
+    errors = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # 同時に終わった場合は一次リクエストを優先する
+            for task in sorted(done, key=lambda t: t is not primary):
+                error = task.exception()
+                if error is not None:
+                    # 例外も失敗（None）と同じく扱い、もう一方を待つ
+                    # （half_open の枠を一次リクエストが持っていると、ヘッジは CircuitOpenError で即失敗する）
+                    errors.append(error)
+                    continue
+                result = task.result()
+                if result is not None:
+                    info["winner"] = "primary" if task is primary else "hedge"
+                    return result, info
+        # 両方とも失敗した。どちらかが例外なら最初の例外を送出する
+        if errors:
+            raise errors[0]
+        return None, info
+    finally:
+        for task in pending:
+            cancels[task].set()
+            task.cancel()
+        policy.record_outcome(info["winner"] == "hedge", cancelled=len(pending))
+
+
+_policy_source = None
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy(config: dict) -> HedgePolicy:
+    """config から構築した HedgePolicy を取得する（同じ config オブジェクトには一度だけ構築）"""
+    global _policy_source, _policy
+    with _policy_lock:
+        if _policy is None or _policy_source is not config:
+            _policy = HedgePolicy.from_config(config)
+            _policy_source = config
+        return _policy
+
+
+def peek_hedge_policy():
+    """構築済みの HedgePolicy を返す（未構築なら None）"""
+    return _policy
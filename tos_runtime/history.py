@@ -0,0 +1,154 @@
+"""
+TOS v0.3 ランタイム - コンテキスト履歴
+直近 K ステップはそのまま、それより古いステップは要約行に畳み込み、予算内に収めた履歴を draft プロンプトへ渡す
+"""
+
+import json
+import math
+
+DEFAULT_KEEP_RECENT = 3
+DEFAULT_BUDGET = 2000
+DEFAULT_DIGEST_SUMMARY_CHARS = 80
+BUDGET_UNITS = ("tokens", "chars")
+ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（ASCII は4文字 = 1トークン、それ以外は1文字 = 1トークン）
+
+    UTF-8 のバイト数と文字数の差から非 ASCII 文字数を見積もるため、文字単位のループを回さない
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    non_ascii = min(chars, (len(text.encode("utf-8")) - chars) // 2)
+    return math.ceil((chars - non_ascii) / 4 + non_ascii)
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit <= 0:
+        return ""
+    if len(text) <= limit:
+        return text
+    return text[:max(0, limit - 1)] + ELLIPSIS
+
+
+class HistoryManager:
+    """context["history"] の管理
+
+    - append したエントリのうち直近 keep_recent 件はそのまま保持する
+    - 窓から外れたエントリはその時点で1行の要約 ("step N: ...") に畳み込む
+    - render() は budget（tokens または chars）を超えないよう、古い要約行から順に省く
+    """
+
+    def __init__(self, keep_recent: int = DEFAULT_KEEP_RECENT, budget: int = DEFAULT_BUDGET,
+                 budget_unit: str = "tokens", digest_summary_chars: int = DEFAULT_DIGEST_SUMMARY_CHARS):
+        if budget_unit not in BUDGET_UNITS:
+            raise ValueError(f"context_history.budget_unit が不正: {budget_unit} ({'/'.join(BUDGET_UNITS)})")
+        self.keep_recent = max(1, keep_recent)
+        self.budget = budget
+        self.budget_unit = budget_unit
+        self.digest_summary_chars = digest_summary_chars
+        self.recent = []
+        self.digest_lines = []
+        self.entries = 0
+        # 全エントリをそのまま直列化した場合のサイズ（圧縮率の分母）
+        self._raw_chars = 0
+        self._raw_tokens = 0
+        self._rendered = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HistoryManager":
+        settings = config.get("context_history", {})
+        return cls(
+            keep_recent=settings.get("keep_recent", DEFAULT_KEEP_RECENT),
+            budget=settings.get("budget", DEFAULT_BUDGET),
+            budget_unit=settings.get("budget_unit", "tokens"),
+            digest_summary_chars=settings.get("digest_summary_chars", DEFAULT_DIGEST_SUMMARY_CHARS)
+        )
+
+    def measure(self, text: str) -> int:
+        return estimate_tokens(text) if self.budget_unit == "tokens" else len(text)
+
+    def append(self, entry: dict) -> None:
+        """1ステップ分のエントリを追加する（{"step": N, "summary": "..."}）"""
+        serialized = json.dumps(entry, ensure_ascii=False)
+        self._raw_chars += len(serialized) + 2
+        self._raw_tokens += estimate_tokens(serialized) + 1
+        self.entries += 1
+        self.recent.append(entry)
+        while len(self.recent) > self.keep_recent:
+            self._fold(self.recent.pop(0))
+        self._rendered = None
+
+    def _digest_line(self, entry: dict) -> str:
+        summary = str(entry.get("summary", "")).replace("\n", " ")
+        return f"step {entry.get('step')}: {_truncate(summary, self.digest_summary_chars)}"
+
+    def _fold(self, entry: dict) -> None:
+        self.digest_lines.append(self._digest_line(entry))
+
+    def _build(self, digest_lines: list, omitted: int, recent: list) -> list:
+        history = []
+        if digest_lines or omitted:
+            # 要約行自体が step 番号を持つため見出しは付けない（短いサマリでも元より小さく保つ）
+            digest = {"digest": digest_lines}
+            if omitted:
+                digest["omitted_steps"] = omitted
+            history.append(digest)
+        history.extend(recent)
+        return history
+
+    def render(self) -> tuple:
+        """プロンプト用の履歴を作る（append されるまで結果を使い回す）
+
+        Returns:
+            tuple: (history_json, stats)
+        """
+        if self._rendered is not None:
+            return self._rendered
+
+        lines = list(self.digest_lines)
+        recent = list(self.recent)
+        omitted = 0
+
+        history_json = json.dumps(self._build(lines, omitted, recent), ensure_ascii=False)
+        while self.budget and self.measure(history_json) > self.budget:
+            if lines:
+                # 最も古い要約行から省く
+                lines.pop(0)
+                omitted += 1
+            elif len(recent) > 1:
+                # 要約行が尽きたら直近窓の古い方を要約行に畳み込む（次の周回で省かれうる）
+                entry = recent.pop(0)
+                lines.append(self._digest_line(entry))
+            else:
+                # 最後の1件は summary を予算に合わせて切り詰める
+                entry = dict(recent[0])
+                summary = str(entry.get("summary", ""))
+                over = self.measure(history_json) - self.budget
+                shorter = _truncate(summary, len(summary) - max(over, 1) - 1)
+                if shorter == summary or not summary:
+                    break
+                entry["summary"] = shorter
+                recent = [entry]
+            history_json = json.dumps(self._build(lines, omitted, recent), ensure_ascii=False)
+
+        rendered_chars = len(history_json)
+        rendered_tokens = estimate_tokens(history_json)
+        raw_chars = self._raw_chars if self.entries else 2
+        stats = {
+            "entries": self.entries,
+            "verbatim": len(recent),
+            "digested": len(lines),
+            "omitted": omitted,
+            "budget": self.budget,
+            "budget_unit": self.budget_unit,
+            "raw_chars": raw_chars,
+            "raw_tokens": self._raw_tokens,
+            "rendered_chars": rendered_chars,
+            "rendered_tokens": rendered_tokens,
+            "compaction_ratio": round(rendered_chars / raw_chars, 4) if raw_chars else 1.0
+        }
+        self._rendered = (history_json, stats)
+        return self._rendered
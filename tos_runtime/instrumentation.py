@@ -0,0 +1,100 @@
+"""
+TOS v0.3 ランタイム - 計測
+ステージ・API 試行・JSON リトライの所要時間とトークン使用量を contextvars 経由で記録する
+"""
+
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+_current_recorder = contextvars.ContextVar("tos_span_recorder", default=None)
+
+
+class SpanRecorder:
+    """1回の呼び出し（ステージ）で発生したスパンとトークン使用量を集める
+
+    AsyncEngine は contextvars を引き継ぐため、executor 上の API 呼び出しからも記録できる
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.usage = {"input_tokens": 0, "output_tokens": 0}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float, attrs: dict) -> None:
+        entry = {"name": name, "duration_ms": round(duration_ms, 3)}
+        entry.update(attrs)
+        with self._lock:
+            self.spans.append(entry)
+
+    def add_usage(self, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            self.usage["input_tokens"] += input_tokens or 0
+            self.usage["output_tokens"] += output_tokens or 0
+
+    def durations(self, name: str) -> list:
+        with self._lock:
+            return [span["duration_ms"] for span in self.spans if span["name"] == name]
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return sum(1 for span in self.spans if span["name"] == name)
+
+
+@contextmanager
+def recording(recorder: SpanRecorder = None):
+    """with ブロック内のスパンを recorder に記録する"""
+    recorder = recorder or SpanRecorder()
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """所要時間を計測し、記録中の SpanRecorder があれば追加する
+
+    yield する dict に書き込んだ項目はスパンの属性として記録される。例外時は error に型名を入れる
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        recorder = _current_recorder.get()
+        if recorder is not None:
+            recorder.add(name, (time.perf_counter() - started) * 1000, attrs)
+
+
+def record_usage(input_tokens: int, output_tokens: int) -> None:
+    """記録中の SpanRecorder にトークン使用量を加算する"""
+    recorder = _current_recorder.get()
+    if recorder is not None:
+        recorder.add_usage(input_tokens, output_tokens)
+
+
+def percentile(values: list, q: float) -> float:
+    """最近順位法によるパーセンタイル（values は昇順でなくてよい）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(values: list) -> dict:
+    """p50 / p95 / max のロールアップ"""
+    if not values:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "max_ms": max(values)
+    }
@@ -0,0 +1,188 @@
+"""
+TOS v0.3 ランタイム - インタプリタ検証キャッシュ
+tos_python_path.txt の Python を (パス, サイズ, mtime) で検証済みとしてファイルに記録し、変わらない限りプローブを省く
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+from datetime import datetime
+from pathlib import Path
+
+CACHE_VERSION = 1
+DEFAULT_PROBE_TIMEOUT_SEC = 10
+
+# 1回の起動で必要な情報をまとめて取る（バージョンだけでなく、後続の機能が使う実行環境の情報も）
+PROBE_CODE = (
+    "import json, platform, sys\n"
+    "print(json.dumps({\n"
+    "    'version': platform.python_version(),\n"
+    "    'version_info': list(sys.version_info[:3]),\n"
+    "    'implementation': platform.python_implementation(),\n"
+    "    'platform': sys.platform,\n"
+    "    'machine': platform.machine(),\n"
+    "    'bits': 64 if sys.maxsize > 2 ** 32 else 32,\n"
+    "    'executable': sys.executable,\n"
+    "    'prefix': sys.prefix,\n"
+    "    'is_venv': sys.prefix != getattr(sys, 'base_prefix', sys.prefix),\n"
+    "    'filesystem_encoding': sys.getfilesystemencoding(),\n"
+    "    'stdout_encoding': getattr(sys.stdout, 'encoding', None)\n"
+    "}))\n"
+)
+
+
+def interpreter_key(python_path: str):
+    """キャッシュキー (パス, サイズ, mtime_ns) を返す（ファイルが見つからなければ None）
+
+    PATH 上のコマンド名（python など）は実体のパスに解決してから stat する
+    """
+    resolved = python_path if os.path.isfile(python_path) else shutil.which(python_path)
+    if not resolved:
+        return None
+    try:
+        st = os.stat(resolved)
+    except OSError:
+        return None
+    return {"path": python_path, "resolved": str(resolved), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def probe_interpreter(python_path: str, timeout_sec: float = DEFAULT_PROBE_TIMEOUT_SEC):
+    """Python を1回起動して実行環境の情報を得る（起動できなければ None）"""
+    try:
+        result = subprocess.run(
+            [python_path, "-c", PROBE_CODE],
+            capture_output=True,
+            text=True,
+            timeout=timeout_sec
+        )
+    except Exception as e:
+        print(f"Python検証失敗: {e}")
+        return None
+    if result.returncode != 0:
+        print(f"Python検証失敗: rc={result.returncode} {result.stderr.strip()[:200]}")
+        return None
+    try:
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError) as e:
+        print(f"Python検証失敗: 応答を解釈できません - {e}")
+        return None
+
+
+class InterpreterCache:
+    """インタプリタ検証結果のキャッシュ
+
+    - 成功した検証のみ記録する（失敗は次回もプローブする）
+    - パスごとに1件。サイズか mtime が変わったら（インタプリタの入れ替え・更新）プローブし直す
+    """
+
+    def __init__(self, cache_path, probe_timeout_sec: float = DEFAULT_PROBE_TIMEOUT_SEC):
+        self.cache_path = Path(cache_path)
+        self.probe_timeout_sec = probe_timeout_sec
+        self._lock = threading.Lock()
+        self._entries = None
+        self._verified = {}
+        self.stats = {"cache_hits": 0, "probes": 0, "probe_failures": 0}
+
+    @classmethod
+    def from_config(cls, config: dict, base_dir) -> "InterpreterCache":
+        settings = config.get("interpreter_cache", {})
+        workspace_dir = config.get("workspace_dir", "workspace")
+        cache_path = settings.get("path", f"{workspace_dir}/artifacts/interpreter_cache.json")
+        return cls(
+            Path(base_dir) / cache_path,
+            probe_timeout_sec=settings.get("probe_timeout_sec", DEFAULT_PROBE_TIMEOUT_SEC)
+        )
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            self._entries = {}
+            if self.cache_path.exists():
+                try:
+                    with open(self.cache_path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    if data.get("version") == CACHE_VERSION:
+                        self._entries = data.get("entries", {})
+                except (OSError, ValueError) as e:
+                    print(f"インタプリタキャッシュ読み込みエラー: {self.cache_path} - {e}")
+        return self._entries
+
+    def _save(self) -> None:
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "entries": self._entries}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            # キャッシュが書けなくても検証自体は成功している
+            print(f"インタプリタキャッシュ書き込みエラー: {self.cache_path} - {e}")
+
+    def verify(self, python_path: str):
+        """python_path を検証し、実行環境の情報（capabilities）を返す（無効なら None）
+
+        Returns:
+            dict: capabilities に "cached"（キャッシュから得たか）を加えたもの
+        """
+        if not python_path:
+            return None
+        key = interpreter_key(python_path)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(python_path)
+            if (key is not None and entry is not None
+                    and entry.get("size") == key["size"] and entry.get("mtime_ns") == key["mtime_ns"]
+                    and entry.get("resolved") == key["resolved"]):
+                self.stats["cache_hits"] += 1
+                capabilities = dict(entry["capabilities"], cached=True)
+                self._verified[python_path] = capabilities
+                return capabilities
+
+        self.stats["probes"] += 1
+        capabilities = probe_interpreter(python_path, self.probe_timeout_sec)
+        if capabilities is None:
+            self.stats["probe_failures"] += 1
+            return None
+
+        with self._lock:
+            if key is not None:
+                self._entries[python_path] = dict(key, capabilities=capabilities,
+                                                  verified_at=datetime.now().isoformat())
+                self._save()
+            capabilities = dict(capabilities, cached=False)
+            self._verified[python_path] = capabilities
+        return capabilities
+
+    def capabilities(self, python_path: str):
+        """このプロセスで検証済みの python_path の情報を返す（未検証なら None。プローブはしない）"""
+        with self._lock:
+            return self._verified.get(python_path)
+
+    def summary(self) -> dict:
+        with self._lock:
+            interpreters = {
+                path: {key: caps.get(key) for key in ("version", "implementation", "platform", "bits", "cached")}
+                for path, caps in self._verified.items()
+            }
+            return dict(self.stats, interpreters=interpreters)
+
+
+_cache_source = None
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_interpreter_cache(config: dict, base_dir) -> InterpreterCache:
+    """config から構築した InterpreterCache を取得する（同じ config オブジェクトには一度だけ構築）"""
+    global _cache_source, _cache
+    with _cache_lock:
+        if _cache is None or _cache_source is not config:
+            _cache = InterpreterCache.from_config(config, base_dir)
+            _cache_source = config
+        return _cache
+
+
+def peek_interpreter_cache():
+    """構築済みの InterpreterCache を返す（未構築なら None）"""
+    return _cache
@@ -0,0 +1,234 @@
+"""
+TOS v0.3 ランタイム - ステップジャーナル
+ステップログを追記専用のセグメントファイルに書き、(job_index, step_num) のオフセット索引で引く
+"""
+
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+
+DEFAULT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+SEGMENT_PREFIX = "segment_"
+SEGMENT_SUFFIX = ".jsonl"
+INDEX_FILE = "index.bin"
+
+# 索引レコード: job_index(int32, None は -1), step_num(int32), segment(uint32), offset(uint64), length(uint32)
+INDEX_RECORD = struct.Struct("<iiIQI")
+NO_JOB_INDEX = -1
+
+
+def journal_record_name(job_index, step_num: int) -> str:
+    """集計サイドカーで使うレコード名（従来のファイル名と同じ並び順になる）"""
+    if job_index is None:
+        return f"step_{step_num:03d}.json"
+    return f"job_{job_index:03d}/step_{step_num:03d}.json"
+
+
+def _sort_key(key: tuple) -> tuple:
+    job_index, step_num = key
+    return (NO_JOB_INDEX if job_index is None else job_index, step_num)
+
+
+class StepJournal:
+    """追記専用のステップジャーナル
+
+    - セグメント: 1行1レコードの JSONL。segment_max_bytes を超えたら次のセグメントへ
+    - 索引: 固定長 (24 bytes) レコードの追記。同じキーは後のレコードが有効
+    - 起動時に索引を読み、セグメント末尾を越える（書き込み途中の）エントリは無視する
+    """
+
+    def __init__(self, journal_dir, segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES):
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.index_path = self.journal_dir / INDEX_FILE
+        self._lock = threading.Lock()
+        self._index = {}
+        # 記録済みの step_num（job_index を問わない存在確認用）
+        self._step_nums = set()
+        self._current_segment = 1
+        self._load_index()
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.journal_dir / f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}"
+
+    def _segment_numbers(self) -> list:
+        numbers = []
+        for entry in os.scandir(self.journal_dir):
+            name = entry.name
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(numbers)
+
+    def _load_index(self) -> None:
+        data = self.index_path.read_bytes() if self.index_path.exists() else b""
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        if usable != len(data):
+            print(f"ジャーナル索引の末尾を切り詰めます: {self.index_path}")
+            os.truncate(self.index_path, usable)
+
+        segment_sizes = {}
+        for offset in range(0, usable, INDEX_RECORD.size):
+            job_index, step_num, segment, record_offset, length = INDEX_RECORD.unpack_from(data, offset)
+            if segment not in segment_sizes:
+                path = self._segment_path(segment)
+                segment_sizes[segment] = path.stat().st_size if path.exists() else 0
+            if record_offset + length > segment_sizes[segment]:
+                continue
+            key = (None if job_index == NO_JOB_INDEX else job_index, step_num)
+            self._index[key] = (segment, record_offset, length)
+            self._step_nums.add(step_num)
+
+        numbers = self._segment_numbers()
+        self._current_segment = numbers[-1] if numbers else 1
+
+    def append(self, job_index, step_num: int, data: dict, fsync: bool = False) -> Path:
+        """ステップログを1件追記する
+
+        Args:
+            fsync: データと索引をそれぞれ fsync する（索引が残ってデータが失われることがない）
+
+        Returns:
+            Path: 書き込んだセグメントファイル
+        """
+        record = {"job_index": job_index, "step_num": step_num, "data": data}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._lock:
+            path = self._segment_path(self._current_segment)
+            size = path.stat().st_size if path.exists() else 0
+            if size and size + len(line) > self.segment_max_bytes:
+                self._current_segment += 1
+                path = self._segment_path(self._current_segment)
+
+            # データを先に書き、索引は後から追記する（途中で落ちても索引が未書き込みを指さない）
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(self.index_path, "ab") as f:
+                f.write(INDEX_RECORD.pack(
+                    NO_JOB_INDEX if job_index is None else job_index,
+                    step_num, self._current_segment, offset, len(line)))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            self._index[(job_index, step_num)] = (self._current_segment, offset, len(line))
+            self._step_nums.add(step_num)
+        return path
+
+    def exists(self, job_index, step_num: int) -> bool:
+        """索引のみで存在確認する（ファイルアクセスなし）"""
+        return (job_index, step_num) in self._index
+
+    def has_step(self, step_num: int) -> bool:
+        """job_index を問わず step_num が記録済みか（ファイル形式の step_NNN.json の有無に相当）"""
+        return step_num in self._step_nums
+
+    def read(self, job_index, step_num: int):
+        """1件を索引経由でランダムリードする。存在しなければ None"""
+        location = self._index.get((job_index, step_num))
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            raw = f.read(length)
+        return json.loads(raw.decode("utf-8"))["data"]
+
+    def location(self, job_index, step_num: int):
+        """索引上の位置 (segment, offset, length)。存在しなければ None"""
+        return self._index.get((job_index, step_num))
+
+    def keys(self) -> list:
+        """(job_index, step_num) を job_index, step_num 順で返す"""
+        with self._lock:
+            return sorted(self._index, key=_sort_key)
+
+    def job_indexes(self) -> list:
+        """記録されている job_index の一覧"""
+        return sorted({key[0] for key in self.keys()}, key=lambda j: NO_JOB_INDEX if j is None else j)
+
+    def rebuild_index(self) -> int:
+        """セグメントを走査して索引を作り直す（索引が欠損・破損した場合の復旧用）
+
+        Returns:
+            int: 索引に登録したレコード数
+        """
+        with self._lock:
+            index = {}
+            packed = []
+            for segment in self._segment_numbers():
+                offset = 0
+                with open(self._segment_path(segment), "rb") as f:
+                    for line in f:
+                        length = len(line)
+                        if line.endswith(b"\n"):
+                            try:
+                                record = json.loads(line.decode("utf-8"))
+                            except ValueError:
+                                record = None
+                            if record is not None:
+                                key = (record.get("job_index"), record.get("step_num"))
+                                index[key] = (segment, offset, length)
+                                packed.append(INDEX_RECORD.pack(
+                                    NO_JOB_INDEX if key[0] is None else key[0],
+                                    key[1], segment, offset, length))
+                        offset += length
+
+            tmp_path = self.index_path.with_name(f"{INDEX_FILE}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(packed))
+            os.replace(tmp_path, self.index_path)
+            self._index = index
+            self._step_nums = {key[1] for key in index}
+            return len(index)
+
+    def export(self, steps_dir, job_index=None) -> list:
+        """従来形式の step_NNN.json を書き出す
+
+        job_index 未指定で複数ジョブがある場合は steps_dir/job_NNN/ に分けて出力する
+
+        Returns:
+            list: 出力したファイルのパス
+        """
+        steps_dir = Path(steps_dir)
+        keys = self.keys()
+        if job_index is not None:
+            keys = [key for key in keys if key[0] == job_index]
+        split_by_job = job_index is None and len({key[0] for key in keys}) > 1
+
+        written = []
+        for key in keys:
+            out_dir = steps_dir
+            if split_by_job and key[0] is not None:
+                out_dir = steps_dir / f"job_{key[0]:03d}"
+            out_dir.mkdir(parents=True, exist_ok=True)
+            out_file = out_dir / f"step_{key[1]:03d}.json"
+            with open(out_file, "w", encoding="utf-8") as f:
+                json.dump(self.read(*key), f, ensure_ascii=False, indent=2)
+            written.append(out_file)
+        return written
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_step_journal(journal_dir, segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES) -> StepJournal:
+    """ディレクトリごとに1つの StepJournal を取得する"""
+    key = str(Path(journal_dir).resolve())
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = StepJournal(journal_dir, segment_max_bytes)
+            _journals[key] = journal
+        return journal
@@ -0,0 +1,105 @@
+"""
+TOS v0.3 ランタイム - job_payload メモ
+job_payload の JSON 化・正規化・ハッシュを1回だけ行い、内容アドレスのブロブとして1度だけ保存する
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+DEFAULT_INLINE_MAX_CHARS = 2000
+TRUNCATED_SUFFIX = "...(truncated)"
+REF_PREFIX = "sha256:"
+
+
+class PayloadMemo:
+    """1つの job_payload の表現をまとめて保持する
+
+    - prompt_json: プロンプトに埋め込む JSON（従来の json.dumps と同じ。応答キャッシュのキーを変えない）
+    - canonical: キー順を揃えた compact な JSON（UTF-8）。ハッシュとブロブの内容に使う
+    - ref: "sha256:<canonical のハッシュ>"。同じ内容なら実行・ジョブをまたいで同じ値になる
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.prompt_json = json.dumps(payload, ensure_ascii=False)
+        self.size = len(self.prompt_json)
+        self.canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True,
+                                    separators=(",", ":")).encode("utf-8")
+        self.digest = hashlib.sha256(self.canonical).hexdigest()
+        self.ref = f"{REF_PREFIX}{self.digest}"
+        self._lock = threading.Lock()
+        self._previews = {}
+        self._stored = {}
+        self.stats = {"uses": 0, "blob_writes": 0, "blob_hits": 0}
+
+    def use(self) -> None:
+        with self._lock:
+            self.stats["uses"] += 1
+
+    def preview(self, max_chars: int) -> str:
+        """ステップログに載せる文字列（max_chars を超える場合は切り詰める）"""
+        with self._lock:
+            preview = self._previews.get(max_chars)
+            if preview is None:
+                if self.size > max_chars:
+                    preview = self.prompt_json[:max_chars] + TRUNCATED_SUFFIX
+                else:
+                    preview = self.prompt_json
+                self._previews[max_chars] = preview
+            return preview
+
+    def store(self, blob_dir) -> Path:
+        """<blob_dir>/<sha256>.json に保存する（同じ内容のブロブがあれば書かない）"""
+        blob_dir = Path(blob_dir)
+        with self._lock:
+            blob_path = self._stored.get(blob_dir)
+            if blob_path is not None:
+                return blob_path
+            blob_path = blob_dir / f"{self.digest}.json"
+            if blob_path.exists():
+                self.stats["blob_hits"] += 1
+            else:
+                blob_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = blob_path.with_name(f"{blob_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(self.canonical)
+                os.replace(tmp_path, blob_path)
+                self.stats["blob_writes"] += 1
+            self._stored[blob_dir] = blob_path
+            return blob_path
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.stats, ref=self.ref, size=self.size, canonical_bytes=len(self.canonical))
+
+
+def blob_path_for(blob_dir, ref: str) -> Path:
+    """job_payload_ref からブロブのパスを得る"""
+    if not ref.startswith(REF_PREFIX):
+        raise ValueError(f"job_payload_ref が不正: {ref}")
+    return Path(blob_dir) / f"{ref[len(REF_PREFIX):]}.json"
+
+
+_memo_source = None
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_payload_memo(payload):
+    """payload に対応する PayloadMemo を取得する（同じ payload オブジェクトには一度だけ構築。None なら None）"""
+    global _memo_source, _memo
+    if payload is None:
+        return None
+    with _memo_lock:
+        if _memo is None or _memo_source is not payload:
+            _memo = PayloadMemo(payload)
+            _memo_source = payload
+        return _memo
+
+
+def peek_payload_memo():
+    """構築済みの PayloadMemo を返す（未構築なら None）"""
+    return _memo
@@ -0,0 +1,186 @@
+"""
+TOS v0.3 ランタイム - フェーズ状態マネージャ
+phase_state.json をメモリ上に保持し、一時ファイル + os.replace で書き込む（fsync と書き込みのまとめはポリシーで制御）
+"""
+
+import atexit
+import os
+import threading
+import time
+from pathlib import Path
+
+from .serializer import Serializer, get_serializer, load_file
+
+FSYNC_ALWAYS = "always"      # 毎回 fsync する
+FSYNC_DURABLE = "durable"    # durable=True の保存（終了状態など）のみ fsync する
+FSYNC_NEVER = "never"        # fsync しない（os.replace による原子性のみ）
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_DURABLE, FSYNC_NEVER)
+
+DEFAULT_PREVIOUS_PHASE = "S-4"
+
+
+def fsync_dir(path: Path) -> None:
+    """ディレクトリエントリ（os.replace の結果）を永続化する（Windows では何もしない）"""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class PhaseStateManager:
+    """1つの phase_state.json の管理
+
+    - previous_phase は読み込んだ状態（無ければ S-4）を保持し、保存のたびにファイルを読み直さない
+    - 書き込みは同じディレクトリの一時ファイルに書いてから os.replace する（途中で落ちても壊れない）
+    - coalesce=True の場合、durable=False の保存はメモリに留め、次の durable な保存か flush() でまとめて書く
+    - 書き出しの形式（compact / pretty）は serializer で決まる。読み込みはどちらの形式でもよい
+    """
+
+    def __init__(self, path, fsync: str = FSYNC_DURABLE, coalesce: bool = False, serializer: Serializer = None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"phase_state.fsync が不正: {fsync} ({'/'.join(FSYNC_POLICIES)})")
+        self.path = Path(path)
+        self.fsync = fsync
+        self.coalesce = coalesce
+        self.serializer = serializer or Serializer()
+        self._lock = threading.Lock()
+        self._state = None
+        self._loaded = False
+        self._dirty = False
+        self.stats = {"saves": 0, "writes": 0, "coalesced": 0, "fsyncs": 0, "write_ms": 0.0}
+
+    def load(self, refresh: bool = False):
+        """ファイルから状態を読み込む（読み込み済みなら refresh=True の場合のみ読み直す）
+
+        Returns:
+            dict: フェーズ状態。存在しない場合は None
+        """
+        with self._lock:
+            if self._loaded and not refresh:
+                return dict(self._state) if self._state is not None else None
+            if self._dirty:
+                # 書き込み保留中の状態の方が新しい
+                return dict(self._state)
+            self._loaded = True
+            self._state = None
+            if not self.path.exists():
+                return None
+            self._state = load_file(self.path)
+            return dict(self._state)
+
+    def _previous_phase(self) -> str:
+        if not self._loaded:
+            self._loaded = True
+            try:
+                self._state = load_file(self.path)
+            except (OSError, ValueError):
+                self._state = None
+        previous_phase = (self._state or {}).get("previous_phase")
+        return previous_phase if previous_phase is not None else DEFAULT_PREVIOUS_PHASE
+
+    def save(self, fields: dict, durable: bool = True) -> bool:
+        """状態を更新して保存する（previous_phase はこちらで補う）
+
+        Args:
+            fields: previous_phase 以外の状態
+            durable: 耐久化ポイント（fsync=durable で fsync する。coalesce 時も必ず書き込む）
+
+        Returns:
+            bool: ファイルに書き込んだか（coalesce で保留した場合は False）
+        """
+        with self._lock:
+            state = {"current_phase": fields.get("current_phase"), "previous_phase": self._previous_phase()}
+            state.update({k: v for k, v in fields.items() if k != "previous_phase"})
+            self._state = state
+            self.stats["saves"] += 1
+            if self.coalesce and not durable:
+                self._dirty = True
+                self.stats["coalesced"] += 1
+                return False
+            self._write(durable)
+            return True
+
+    @property
+    def pending(self) -> bool:
+        """coalesce で書き込みを保留している状態があるか"""
+        return self._dirty
+
+    def flush(self, durable: bool = True) -> bool:
+        """保留中の状態があれば書き込む"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._write(durable)
+            return True
+
+    def _write(self, durable: bool) -> None:
+        sync = self.fsync == FSYNC_ALWAYS or (self.fsync == FSYNC_DURABLE and durable)
+        started = time.perf_counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.serializer.write(tmp_path, self._state, fsync=sync)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            # 書きかけの一時ファイルを残さない（phase_state.json は前の内容のまま）
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise
+        if sync:
+            fsync_dir(self.path.parent)
+            self.stats["fsyncs"] += 1
+        self._dirty = False
+        self.stats["writes"] += 1
+        self.stats["write_ms"] += (time.perf_counter() - started) * 1000
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.stats, write_ms=round(self.stats["write_ms"], 3), fsync=self.fsync,
+                        coalesce=self.coalesce, pending=self._dirty)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_phase_state_manager(config: dict, path) -> PhaseStateManager:
+    """path ごとの PhaseStateManager を取得する（ポリシーは初回の config["phase_state"] で決まる）"""
+    path = Path(path)
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            settings = config.get("phase_state", {})
+            manager = PhaseStateManager(
+                path,
+                fsync=settings.get("fsync", FSYNC_DURABLE),
+                coalesce=settings.get("coalesce", False),
+                serializer=get_serializer(config, "phase_state")
+            )
+            _managers[path] = manager
+        return manager
+
+
+def flush_phase_states() -> None:
+    """保留中の書き込みをすべて書き出す（終了時・ジョブワーカーの終了時に呼ぶ）"""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        try:
+            manager.flush()
+        except Exception as e:
+            print(f"フェーズ状態の書き出しエラー: {manager.path} - {e}")
+
+
+def peek_phase_state_managers() -> dict:
+    """生成済みの PhaseStateManager（path -> manager）を返す"""
+    with _managers_lock:
+        return dict(_managers)
+
+
+# プロセス終了時（sys.exit を含む）に保留中の状態を失わないようにする
+atexit.register(flush_phase_states)
@@ -0,0 +1,207 @@
+"""
+TOS v0.3 ランタイム - 実行ポリシーエンジン
+設定から一度だけ構築し、コマンドの allow/deny 判定を共有する
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict, deque
+
+DEFAULT_VERDICT_CACHE_SIZE = 1024
+
+
+class AhoCorasickMatcher:
+    """Aho-Corasick 法による複数部分文字列マッチャ
+
+    テキストを1回走査するだけで全キーワードの出現を検出するため、
+    キーワード数が増えても走査コストは変わらない。
+    空文字列のキーワードは `"" in text` と同じくどのテキストにも一致する
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = list(keywords)
+        # goto[state] = {char: next_state}, fail[state], out[state] = キーワード番号の最小値
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]
+        # 空キーワードはオートマトンに載せず、最小の番号だけを覚えておく
+        self._empty_index = None
+        for index, keyword in enumerate(self.keywords):
+            if not keyword:
+                if self._empty_index is None:
+                    self._empty_index = index
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                    self._goto[state][ch] = nxt
+                state = nxt
+            if self._out[state] is None or index < self._out[state]:
+                self._out[state] = index
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                # 接尾辞として含まれるキーワードも出力に含める（最小番号を保持）
+                inherited = self._out[self._fail[nxt]]
+                if inherited is not None and (self._out[nxt] is None or inherited < self._out[nxt]):
+                    self._out[nxt] = inherited
+
+    def find_first(self, text: str):
+        """text に含まれるキーワードのうち、リスト上で最も前にあるものの番号を返す"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        best = self._empty_index
+        if best == 0:
+            return best
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found = out[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+
+class ExecutionPolicy:
+    """コンパイル済みの実行ポリシー
+
+    判定順序は check_allowlist と同じ:
+    default_action -> deny_if_contains -> allow_types -> deny_patterns
+    """
+
+    def __init__(self, default_action: str = "allow", deny_if_contains: list = None,
+                 allow_types: list = None, deny_patterns: list = None,
+                 verdict_cache_size: int = DEFAULT_VERDICT_CACHE_SIZE):
+        self.default_action = default_action
+        self.deny_if_contains = list(deny_if_contains or [])
+        self.allow_types = list(allow_types if allow_types is not None else ["powershell"])
+        self._allow_type_set = set(self.allow_types)
+        self.deny_patterns = list(deny_patterns or [])
+
+        self._contains_matcher = AhoCorasickMatcher(self.deny_if_contains)
+        self._compiled_patterns = [re.compile(p, re.IGNORECASE) for p in self.deny_patterns]
+        # 全パターンを1つの選択正規表現にまとめる（コンパイルできない組み合わせは個別判定）
+        # まとめるとグループ番号がずれて後方参照（\1 など）が別のグループを指すため、
+        # グループを持つパターンが1つでもあればまとめない
+        self._combined_pattern = None
+        if self.deny_patterns and all(compiled.groups == 0 for compiled in self._compiled_patterns):
+            try:
+                self._combined_pattern = re.compile(
+                    "|".join(f"(?:{p})" for p in self.deny_patterns), re.IGNORECASE)
+            except re.error:
+                self._combined_pattern = None
+
+        self._verdict_cache_size = verdict_cache_size
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"checks": 0, "cache_hits": 0}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ExecutionPolicy":
+        exec_policy = config.get("execution_policy", {})
+        return cls(
+            default_action=exec_policy.get("default_action", "allow"),
+            deny_if_contains=exec_policy.get("deny_if_contains", []),
+            allow_types=config.get("allow_types", ["powershell"]),
+            deny_patterns=config.get("deny_patterns", []),
+            verdict_cache_size=exec_policy.get("verdict_cache_size", DEFAULT_VERDICT_CACHE_SIZE)
+        )
+
+    def _first_matching_pattern(self, code: str):
+        if self._combined_pattern is not None and not self._combined_pattern.search(code):
+            return None
+        # 一致した場合のみ、設定順で最初に一致したパターンを特定する
+        for pattern, compiled in zip(self.deny_patterns, self._compiled_patterns):
+            if compiled.search(code):
+                return pattern
+        return None
+
+    def _evaluate(self, cmd_type: str, code: str) -> tuple:
+        if self.default_action == "deny":
+            return False, "execution_policy.default_action=deny", None
+
+        index = self._contains_matcher.find_first(code)
+        if index is not None:
+            keyword = self.deny_if_contains[index]
+            return False, f"deny_if_contains '{keyword}' に一致", keyword
+
+        if cmd_type not in self._allow_type_set:
+            return False, f"type '{cmd_type}' は許可されていない (allow_types: {self.allow_types})", None
+
+        pattern = self._first_matching_pattern(code)
+        if pattern is not None:
+            return False, f"禁止パターン '{pattern}' に一致", pattern
+
+        return True, "allowlist通過", None
+
+    def check(self, cmd_type: str, code: str) -> tuple:
+        """コマンドを判定する（同一コマンドの判定結果はキャッシュから返す）
+
+        Returns:
+            tuple: (allowed: bool, reason: str, matched: str or None)
+        """
+        key = hashlib.sha256(f"{cmd_type}\0{code}".encode("utf-8")).digest()
+        with self._lock:
+            self.stats["checks"] += 1
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return verdict
+
+        verdict = self._evaluate(cmd_type, code)
+
+        with self._lock:
+            self._verdicts[key] = verdict
+            if len(self._verdicts) > self._verdict_cache_size:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+    def summary(self) -> dict:
+        """統計情報を返す"""
+        with self._lock:
+            return dict(self.stats, cached_verdicts=len(self._verdicts))
+
+
+_policy_source = None
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_execution_policy(config: dict) -> ExecutionPolicy:
+    """config から構築した ExecutionPolicy を取得する
+
+    同じ config オブジェクトに対しては一度だけ構築する
+    """
+    global _policy_source, _policy
+    with _policy_lock:
+        if _policy is None or _policy_source is not config:
+            _policy = ExecutionPolicy.from_config(config)
+            _policy_source = config
+        return _policy
+
+
+def peek_execution_policy():
+    """構築済みのポリシーを返す（未構築なら None）"""
+    return _policy
@@ -0,0 +1,194 @@
+"""
+TOS v0.3 ランタイム - LLM応答キャッシュ
+hash(model, template_name, prompt, temperature) をキーにしたオンディスクキャッシュ
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+CACHE_POLICY_OFF = "off"
+CACHE_POLICY_READ_THROUGH = "read_through"
+CACHE_POLICY_RECORD_ONLY = "record_only"
+CACHE_POLICIES = (CACHE_POLICY_OFF, CACHE_POLICY_READ_THROUGH, CACHE_POLICY_RECORD_ONLY)
+
+DEFAULT_TTL_SEC = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+def make_cache_key(model: str, template_name: str, prompt: str, temperature) -> str:
+    """キャッシュキー（sha256 hex）を生成する"""
+    material = json.dumps([model, template_name, prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """コンテンツアドレス方式の応答キャッシュ
+
+    - 1エントリ1ファイル: <cache_dir>/<key[:2]>/<key>.json
+    - TTL: created_at から ttl_sec を過ぎたエントリは無効
+    - LRU: 合計サイズが max_bytes を超えたら最終アクセス(mtime)が古い順に削除
+    """
+
+    def __init__(self, cache_dir, ttl_sec: float = DEFAULT_TTL_SEC, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> [size, last_access]（初回アクセス時にディレクトリを走査して構築）
+        self._entries = None
+        self._total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "discards": 0}
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_entries(self) -> None:
+        if self._entries is not None:
+            return
+        self._entries = {}
+        self._total_bytes = 0
+        if not self.cache_dir.exists():
+            return
+        for sub in self.cache_dir.iterdir():
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub):
+                if not entry.name.endswith(".json"):
+                    continue
+                st = entry.stat()
+                self._entries[entry.name[:-5]] = [st.st_size, st.st_mtime]
+                self._total_bytes += st.st_size
+
+    def _remove(self, key: str) -> None:
+        info = self._entries.pop(key, None)
+        if info is not None:
+            self._total_bytes -= info[0]
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str):
+        """キャッシュを参照する。ヒットしなければ None"""
+        with self._lock:
+            self._load_entries()
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+
+            if self.ttl_sec and time.time() - entry.get("created_at", 0) > self.ttl_sec:
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            # LRU のため最終アクセス時刻を更新
+            now = time.time()
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            self._entries[key][1] = now
+            self.stats["hits"] += 1
+            return entry.get("response")
+
+    def put(self, key: str, response: str, meta: dict = None) -> None:
+        """応答を保存し、必要なら LRU で追い出す"""
+        entry = dict(meta or {})
+        entry["key"] = key
+        entry["created_at"] = time.time()
+        entry["response"] = response
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+
+        with self._lock:
+            self._load_entries()
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            old = self._entries.get(key)
+            if old is not None:
+                self._total_bytes -= old[0]
+            self._entries[key] = [len(data), entry["created_at"]]
+            self._total_bytes += len(data)
+            self.stats["stores"] += 1
+            self._evict_locked()
+
+    def discard(self, key: str) -> bool:
+        """エントリを削除する（採用できなかった応答を次回以降に返さないため）
+
+        Returns:
+            bool: エントリが存在したか
+        """
+        with self._lock:
+            self._load_entries()
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self.stats["discards"] += 1
+            return True
+
+    def _evict_locked(self) -> None:
+        if not self.max_bytes or self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda kv: kv[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def summary(self) -> dict:
+        """統計情報を返す"""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries or {}), total_bytes=self._total_bytes)
+
+
+def get_stage_policy(config: dict, stage: str) -> str:
+    """ステージごとのキャッシュポリシーを取得する（未設定は off）"""
+    settings = config.get("response_cache", {})
+    policy = settings.get("stages", {}).get(stage, CACHE_POLICY_OFF)
+    if policy not in CACHE_POLICIES:
+        print(f"response_cache: 不明なポリシー '{policy}' (stage={stage})。off として扱います")
+        return CACHE_POLICY_OFF
+    return policy
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache(config: dict, base_dir) -> ResponseCache:
+    """プロセス共通の ResponseCache を取得する"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = config.get("response_cache", {})
+            cache_dir = settings.get("dir") or str(
+                Path(config.get("workspace_dir", "workspace")) / "artifacts" / "response_cache")
+            _cache = ResponseCache(
+                Path(base_dir) / cache_dir,
+                ttl_sec=settings.get("ttl_sec", DEFAULT_TTL_SEC),
+                max_bytes=settings.get("max_bytes", DEFAULT_MAX_BYTES)
+            )
+        return _cache
+
+
+def peek_response_cache():
+    """生成済みのキャッシュを返す（未生成なら None）"""
+    return _cache
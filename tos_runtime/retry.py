@@ -0,0 +1,334 @@
+"""
+TOS v0.3 ランタイム - リトライ / レート制御
+プロバイダごとのトークンバケット（リクエスト数・トークン数）と、エラー種別ごとのリトライ予算・decorrelated jitter・Retry-After 対応
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+DEFAULT_BASE_DELAY_SEC = 1.0
+DEFAULT_MAX_DELAY_SEC = 30.0
+DEFAULT_RATE_LIMIT_RETRIES = 4
+
+# エラー種別
+ERROR_RATE_LIMIT = "rate_limit"   # 429
+ERROR_SERVER = "server"           # 5xx / 529 overloaded
+ERROR_TRANSIENT = "transient"     # 接続エラー・タイムアウトなど HTTP ステータスの無い失敗
+ERROR_CLIENT = "client"           # 429 / 408 以外の 4xx（リトライしても結果は変わらない）
+ERROR_CLASSES = (ERROR_RATE_LIMIT, ERROR_SERVER, ERROR_TRANSIENT, ERROR_CLIENT)
+
+
+class TokenBucket:
+    """補充レート rate_per_sec・容量 capacity のトークンバケット
+
+    reserve() は先に残量を差し引き（負になりうる）、残量が 0 に戻るまでの待ち秒数を返す。
+    待ちを予約として扱うため、同時に呼ばれても同じ瞬間に一斉に再開しない
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            # 容量を超える要求は容量分として扱う（永久に待たない）
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def refund(self, amount: float) -> None:
+        """見積もりとの差分を戻す（amount が負なら追加で差し引く）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+
+class ProviderLimiter:
+    """1プロバイダ分のレート制御
+
+    - requests_per_minute / tokens_per_minute が None の場合はその軸を制限しない
+    - Retry-After を受け取ったら pause_until() で同じプロバイダの後続呼び出しもまとめて待たせる
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause_until(self, deadline: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, deadline)
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """リクエスト1件分の枠を確保し、必要な時間だけ待つ
+
+        Returns:
+            float: 待った秒数
+        """
+        with self._lock:
+            wait = max(0.0, self._paused_until - time.monotonic())
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """応答の usage で見積もりとの差分を精算する"""
+        if self.tokens is not None and actual_tokens is not None and estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+
+class DecorrelatedJitter:
+    """decorrelated jitter によるバックオフ: sleep = min(cap, uniform(base, prev * 3))"""
+
+    def __init__(self, base: float = DEFAULT_BASE_DELAY_SEC, cap: float = DEFAULT_MAX_DELAY_SEC, rng=None):
+        self.base = base
+        self.cap = cap
+        self._prev = base
+        self._random = rng or random
+
+    def next(self) -> float:
+        self._prev = min(self.cap, self._random.uniform(self.base, self._prev * 3))
+        return self._prev
+
+
+def _error_response(error: Exception):
+    return getattr(error, "response", None)
+
+
+def error_status(error: Exception):
+    """例外から HTTP ステータスを取り出す（requests.HTTPError / anthropic.APIStatusError を想定）"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(_error_response(error), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: Exception) -> str:
+    """例外をエラー種別に分類する"""
+    status = error_status(error)
+    if status is None:
+        return ERROR_TRANSIENT
+    if status == 429:
+        return ERROR_RATE_LIMIT
+    if status >= 500 or status == 408:
+        return ERROR_SERVER
+    return ERROR_CLIENT
+
+
+def parse_retry_after(error: Exception):
+    """Retry-After（秒 / HTTP-date）または retry-after-ms ヘッダから待ち秒数を得る（無ければ None）"""
+    headers = getattr(_error_response(error), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryExhausted(Exception):
+    """リトライ予算を使い切った（最後の例外を cause に持つ）"""
+
+    def __init__(self, provider: str, error_class: str, attempts: int, last_error: Exception):
+        super().__init__(f"{provider}: {error_class} のリトライ予算を使い切った ({attempts} 回試行): {last_error}")
+        self.provider = provider
+        self.error_class = error_class
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class RetryCancelled(Exception):
+    """cancel_event がセットされたため試行を打ち切った（ヘッジで負けた側など）"""
+
+
+class RetryScheduler:
+    """プロバイダ呼び出しのリトライとレート制御
+
+    call() に渡す attempt(retry_count) は (結果, 実トークン数) を返す関数。
+    retry_on に該当する例外はエラー種別ごとの予算（1回の call あたりのリトライ回数）の範囲で再試行する
+    """
+
+    def __init__(self, limits: dict = None, budgets: dict = None,
+                 base_delay_sec: float = DEFAULT_BASE_DELAY_SEC, max_delay_sec: float = DEFAULT_MAX_DELAY_SEC,
+                 seed: int = None):
+        self.budgets = {
+            ERROR_RATE_LIMIT: DEFAULT_RATE_LIMIT_RETRIES,
+            ERROR_SERVER: 2,
+            ERROR_TRANSIENT: 2,
+            ERROR_CLIENT: 0
+        }
+        self.budgets.update(budgets or {})
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self._limits = limits or {}
+        self._limiters = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RetryScheduler":
+        policy = config.get("api_retry_policy", {})
+        api_retry = config.get("api_retry", 2)
+        budgets = {ERROR_SERVER: api_retry, ERROR_TRANSIENT: api_retry}
+        budgets.update({k: v for k, v in policy.get("budgets", {}).items() if v is not None})
+        return cls(
+            limits=config.get("api_rate_limits", {}),
+            budgets=budgets,
+            base_delay_sec=policy.get("base_delay_sec", DEFAULT_BASE_DELAY_SEC),
+            max_delay_sec=policy.get("max_delay_sec", DEFAULT_MAX_DELAY_SEC)
+        )
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        with self._lock:
+            limiter = self._limiters.get(provider)
+            if limiter is None:
+                limits = self._limits.get(provider) or {}
+                limiter = ProviderLimiter(limits.get("requests_per_minute"), limits.get("tokens_per_minute"))
+                self._limiters[provider] = limiter
+                self._stats[provider] = {
+                    "calls": 0,
+                    "attempts": 0,
+                    "retries": {cls: 0 for cls in ERROR_CLASSES},
+                    "retry_after_honored": 0,
+                    "gave_up": 0,
+                    "rate_limit_wait_sec": 0.0,
+                    "backoff_wait_sec": 0.0
+                }
+            return limiter
+
+    def _count(self, provider: str, key: str, amount=1, error_class: str = None) -> None:
+        with self._lock:
+            stats = self._stats[provider]
+            if error_class is not None:
+                stats[key][error_class] += amount
+            else:
+                stats[key] += amount
+
+    def _rng_jitter(self) -> DecorrelatedJitter:
+        with self._lock:
+            seed = self._random.random()
+        return DecorrelatedJitter(self.base_delay_sec, self.max_delay_sec, random.Random(seed))
+
+    def call(self, provider: str, attempt, estimated_tokens: int = 0, retry_on: tuple = (Exception,),
+             label: str = None, cancel_event=None, breaker=None):
+        """attempt を実行し、失敗時はエラー種別の予算内でリトライする
+
+        cancel_event（threading.Event）がセットされると、次の試行やバックオフの待ちに入らず打ち切る
+        breaker（CircuitBreakerRegistry）を渡すと各試行の前に回路を確認し、結果を記録する
+
+        Raises:
+            RetryExhausted: 予算を使い切った、またはリトライ対象外の種別（client）だった
+            RetryCancelled: cancel_event がセットされた
+            CircuitOpenError: 回路が open（試行前に即失敗。リトライ中に open になった場合も含む）
+            retry_on に該当しない例外はそのまま送出する
+        """
+        label = label or provider
+        limiter = self.limiter(provider)
+        jitter = self._rng_jitter()
+        used = {cls: 0 for cls in ERROR_CLASSES}
+        self._count(provider, "calls")
+        retry_count = 0
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RetryCancelled(f"{provider}: 呼び出しを取り消した")
+            if breaker is not None:
+                breaker.check(provider)
+            waited = limiter.acquire(estimated_tokens)
+            if waited:
+                self._count(provider, "rate_limit_wait_sec", waited)
+            self._count(provider, "attempts")
+            try:
+                result, actual_tokens = attempt(retry_count)
+            except retry_on as e:
+                # 失敗した呼び出しのトークンは消費されていない扱いで返却する
+                limiter.settle(estimated_tokens, 0)
+                error_class = classify_error(e)
+                print(f"{label} API呼び出し失敗: {e}")
+                if breaker is not None:
+                    breaker.record_failure(provider, error_class)
+                    # 今の失敗で open になったらバックオフせずに打ち切る
+                    breaker.raise_if_open(provider)
+                if used[error_class] >= self.budgets.get(error_class, 0):
+                    self._count(provider, "gave_up")
+                    raise RetryExhausted(provider, error_class, retry_count + 1, e) from e
+
+                used[error_class] += 1
+                retry_count += 1
+                self._count(provider, "retries", error_class=error_class)
+                delay = jitter.next()
+                retry_after = parse_retry_after(e)
+                if retry_after is not None:
+                    # サーバ指定の待ちは下限として守り、同じプロバイダの他の呼び出しも待たせる
+                    delay = max(delay, retry_after)
+                    limiter.pause_until(time.monotonic() + retry_after)
+                    self._count(provider, "retry_after_honored")
+                print(f"リトライ {used[error_class]}/{self.budgets[error_class]} "
+                      f"({error_class}, {delay:.1f}秒待機)")
+                if cancel_event is not None:
+                    cancel_event.wait(delay)
+                else:
+                    time.sleep(delay)
+                self._count(provider, "backoff_wait_sec", delay)
+                continue
+            except BaseException:
+                # retry_on に該当しない例外は結果を記録しないため、half_open の試行枠だけ返す
+                if breaker is not None:
+                    breaker.release(provider)
+                raise
+            limiter.settle(estimated_tokens, actual_tokens)
+            if breaker is not None:
+                breaker.record_success(provider)
+            return result
+
+    def summary(self) -> dict:
+        """プロバイダごとの統計情報を返す"""
+        with self._lock:
+            summary = {}
+            for provider, stats in self._stats.items():
+                entry = dict(stats, retries=dict(stats["retries"]))
+                entry["rate_limit_wait_sec"] = round(stats["rate_limit_wait_sec"], 3)
+                entry["backoff_wait_sec"] = round(stats["backoff_wait_sec"], 3)
+                summary[provider] = entry
+            return summary
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_retry_scheduler(config: dict = None) -> RetryScheduler:
+    """プロセス共通の RetryScheduler を取得する"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RetryScheduler.from_config(config or {})
+        return _scheduler
+
+
+def peek_retry_scheduler():
+    """生成済みの RetryScheduler を返す（未生成なら None）"""
+    return _scheduler
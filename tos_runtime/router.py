@@ -0,0 +1,163 @@
+"""
+TOS v0.3 ランタイム - プロバイダルーター
+ステージごとの優先順位と、直近のレイテンシ EWMA・エラー率からプロバイダの試行順を決める
+"""
+
+import threading
+import time
+
+PROVIDERS = ("openai", "anthropic")
+DEFAULT_STAGE_PRIORITIES = {
+    "draft": ["openai", "anthropic"],
+    "review": ["anthropic", "openai"],
+    "final": ["openai", "anthropic"]
+}
+DEFAULT_EWMA_ALPHA = 0.2
+DEFAULT_MIN_SAMPLES = 3
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_PRIORITY_BIAS_MS = 2000
+DEFAULT_RECOVERY_SEC = 60
+# max_error_rate を超えたプロバイダに加えるスコア（他に候補があれば後回しになる）
+UNHEALTHY_PENALTY = 1e9
+
+
+class ProviderHealth:
+    """1プロバイダ分のレイテンシ EWMA とエラー率 EWMA"""
+
+    def __init__(self):
+        self.samples = 0
+        self.latency_ewma_ms = None
+        self.error_ewma = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.last_call_at = None
+
+    def update(self, alpha: float, latency_ms: float, ok: bool) -> None:
+        self.last_call_at = time.monotonic()
+        self.calls += 1
+        self.samples += 1
+        if not ok:
+            self.failures += 1
+        self.error_ewma = (1 - alpha) * self.error_ewma + alpha * (0.0 if ok else 1.0)
+        if self.latency_ewma_ms is None:
+            self.latency_ewma_ms = latency_ms
+        else:
+            self.latency_ewma_ms = (1 - alpha) * self.latency_ewma_ms + alpha * latency_ms
+
+
+class ProviderRouter:
+    """ステージごとのプロバイダ選択
+
+    スコア = レイテンシ EWMA / (1 - エラー率 EWMA) + 優先順位 × priority_bias_ms（小さいほど先に試す）
+    - 標本が min_samples 件未満のプロバイダはレイテンシ項を 0 とする（優先順位のみで並ぶ）
+    - エラー率 EWMA が max_error_rate を超えたプロバイダは最後に回す
+      （最後の呼び出しから recovery_sec 経過したら優先順位どおりに戻して再度試す）
+    """
+
+    def __init__(self, enabled: bool = False, stage_priorities: dict = None, failover: bool = True,
+                 ewma_alpha: float = DEFAULT_EWMA_ALPHA, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 max_error_rate: float = DEFAULT_MAX_ERROR_RATE, priority_bias_ms: float = DEFAULT_PRIORITY_BIAS_MS,
+                 prompt_overrides: dict = None, recovery_sec: float = DEFAULT_RECOVERY_SEC):
+        self.enabled = enabled
+        self.stage_priorities = dict(DEFAULT_STAGE_PRIORITIES)
+        self.stage_priorities.update(stage_priorities or {})
+        self.failover = failover
+        self.ewma_alpha = ewma_alpha
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.priority_bias_ms = priority_bias_ms
+        self.prompt_overrides = prompt_overrides or {}
+        self.recovery_sec = recovery_sec
+        self._health = {provider: ProviderHealth() for provider in PROVIDERS}
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "rerouted": 0, "failovers": 0}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ProviderRouter":
+        settings = config.get("provider_routing", {})
+        return cls(
+            enabled=settings.get("enabled", False),
+            stage_priorities=settings.get("stages"),
+            failover=settings.get("failover", True),
+            ewma_alpha=settings.get("ewma_alpha", DEFAULT_EWMA_ALPHA),
+            min_samples=settings.get("min_samples", DEFAULT_MIN_SAMPLES),
+            max_error_rate=settings.get("max_error_rate", DEFAULT_MAX_ERROR_RATE),
+            priority_bias_ms=settings.get("priority_bias_ms", DEFAULT_PRIORITY_BIAS_MS),
+            prompt_overrides=settings.get("prompt_overrides"),
+            recovery_sec=settings.get("recovery_sec", DEFAULT_RECOVERY_SEC)
+        )
+
+    def _score(self, provider: str, index: int) -> float:
+        health = self._health.setdefault(provider, ProviderHealth())
+        score = index * self.priority_bias_ms
+        if health.samples >= self.min_samples:
+            score += health.latency_ewma_ms / max(0.05, 1 - health.error_ewma)
+            if (health.error_ewma > self.max_error_rate
+                    and time.monotonic() - health.last_call_at < self.recovery_sec):
+                score += UNHEALTHY_PENALTY
+        return score
+
+    def order(self, stage: str, default_provider: str) -> list:
+        """ステージで試すプロバイダの順序を返す
+
+        無効時は default_provider のみ。failover=false の場合は先頭の1つのみ
+        """
+        if not self.enabled:
+            return [default_provider]
+        priorities = list(self.stage_priorities.get(stage) or [default_provider])
+        with self._lock:
+            scored = sorted(
+                ((self._score(provider, index), index, provider) for index, provider in enumerate(priorities)))
+            self.stats["routed"] += 1
+            ordered = [provider for _, _, provider in scored]
+            if ordered[0] != priorities[0]:
+                self.stats["rerouted"] += 1
+        return ordered if self.failover else ordered[:1]
+
+    def record(self, provider: str, latency_ms: float, ok: bool) -> None:
+        """1回のステージ呼び出し（プロバイダ内のリトライを含む）の結果を反映する"""
+        with self._lock:
+            self._health.setdefault(provider, ProviderHealth()).update(self.ewma_alpha, latency_ms, ok)
+
+    def count_failover(self) -> None:
+        with self._lock:
+            self.stats["failovers"] += 1
+
+    def template_for(self, config: dict, template_name: str, provider: str) -> str:
+        """プロバイダ別のテンプレート（provider_routing.prompt_overrides）があればそれを返す"""
+        override = self.prompt_overrides.get(provider, {}).get(template_name)
+        return override if override is not None else config.get(template_name, "")
+
+    def summary(self) -> dict:
+        with self._lock:
+            providers = {}
+            for provider, health in self._health.items():
+                if not health.calls:
+                    continue
+                providers[provider] = {
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "latency_ewma_ms": round(health.latency_ewma_ms, 3),
+                    "error_ewma": round(health.error_ewma, 4)
+                }
+            return dict(self.stats, providers=providers)
+
+
+_router_source = None
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router(config: dict) -> ProviderRouter:
+    """config から構築した ProviderRouter を取得する（同じ config オブジェクトには一度だけ構築）"""
+    global _router_source, _router
+    with _router_lock:
+        if _router is None or _router_source is not config:
+            _router = ProviderRouter.from_config(config)
+            _router_source = config
+        return _router
+
+
+def peek_provider_router():
+    """構築済みの ProviderRouter を返す（未構築なら None）"""
+    return _router
@@ -0,0 +1,163 @@
+"""
+TOS v0.3 ランタイム - JSON シリアライザ
+ステップログ・フェーズ状態・サマリなどの成果物を compact / pretty で書き出す（orjson があれば使う）
+"""
+
+import json
+import os
+import threading
+import time
+
+MODE_COMPACT = "compact"    # 区切りの空白・改行なし
+MODE_PRETTY = "pretty"      # インデント 2（従来の形式）
+MODES = (MODE_COMPACT, MODE_PRETTY)
+
+BACKEND_AUTO = "auto"       # orjson が import できれば orjson、無ければ json
+BACKEND_ORJSON = "orjson"
+BACKEND_JSON = "json"
+BACKENDS = (BACKEND_AUTO, BACKEND_ORJSON, BACKEND_JSON)
+
+_orjson = None
+_orjson_checked = False
+
+
+def _load_orjson():
+    """orjson を初回のみ import する（未インストールなら None）"""
+    global _orjson, _orjson_checked
+    if not _orjson_checked:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = None
+        _orjson_checked = True
+    return _orjson
+
+
+def resolve_backend(backend: str) -> str:
+    """実際に使うバックエンド名を返す（orjson 指定で未インストールなら json）"""
+    if backend not in BACKENDS:
+        raise ValueError(f"serialization.backend が不正: {backend} ({'/'.join(BACKENDS)})")
+    if backend == BACKEND_JSON:
+        return BACKEND_JSON
+    if _load_orjson() is not None:
+        return BACKEND_ORJSON
+    if backend == BACKEND_ORJSON:
+        print("serialization.backend=orjson ですが orjson がインストールされていません。json を使います")
+    return BACKEND_JSON
+
+
+def loads(data):
+    """JSON を読み込む（compact / pretty のどちらも、str / bytes のどちらも受け付ける）"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data.startswith(b"\xef\xbb\xbf"):
+        # PowerShell などで BOM 付きで保存し直されたファイル
+        data = data[3:]
+    orjson = _load_orjson()
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson が受け付けない入力（NaN など json モジュールの拡張）は json で読み直す
+            pass
+    return json.loads(data.decode("utf-8"))
+
+
+def load_file(path):
+    """JSON ファイルを読み込む（形式は問わない）"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+class Serializer:
+    """成果物の JSON 書き出し
+
+    - 出力は UTF-8（ensure_ascii=False 相当）。pretty は従来の json.dump(indent=2) と同じ見た目
+    - orjson が扱えない値（64bit を超える整数など）は json で書き直す（fallbacks に計上）
+    - 文字列化できない値は json と同じく str() にせず TypeError にする（呼び出し側の不具合を隠さない）
+    """
+
+    def __init__(self, mode: str = MODE_PRETTY, backend: str = BACKEND_AUTO):
+        if mode not in MODES:
+            raise ValueError(f"serialization.mode が不正: {mode} ({'/'.join(MODES)})")
+        self.mode = mode
+        self.backend = resolve_backend(backend)
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "bytes": 0, "fallbacks": 0, "dump_ms": 0.0}
+
+    def _dumps_json(self, obj) -> bytes:
+        if self.mode == MODE_PRETTY:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj) -> bytes:
+        """obj を JSON（UTF-8 バイト列）にする"""
+        started = time.perf_counter()
+        fallback = False
+        if self.backend == BACKEND_ORJSON:
+            orjson = _orjson
+            option = orjson.OPT_NON_STR_KEYS
+            if self.mode == MODE_PRETTY:
+                option |= orjson.OPT_INDENT_2
+            try:
+                data = orjson.dumps(obj, option=option)
+            except orjson.JSONEncodeError:
+                fallback = True
+                data = self._dumps_json(obj)
+        else:
+            data = self._dumps_json(obj)
+        with self._lock:
+            self.stats["dump_ms"] += (time.perf_counter() - started) * 1000
+            if fallback:
+                self.stats["fallbacks"] += 1
+        return data
+
+    def write(self, path, obj, fsync: bool = False) -> int:
+        """obj を path に書き出す
+
+        Returns:
+            int: 書き込んだバイト数
+        """
+        data = self.dumps(obj)
+        with open(path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        with self._lock:
+            self.stats["writes"] += 1
+            self.stats["bytes"] += len(data)
+        return len(data)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.stats, dump_ms=round(self.stats["dump_ms"], 3), mode=self.mode, backend=self.backend)
+
+
+_serializers = {}
+_serializers_lock = threading.Lock()
+
+
+def get_serializer(config: dict, artifact: str = None) -> Serializer:
+    """成果物の種類（step_log / phase_state / phase_summary / job_result など）に対応する Serializer を取得する
+
+    mode は config["serialization"]["modes"][artifact]、無ければ config["serialization"]["mode"]。
+    同じ (mode, backend) の Serializer は共有する
+    """
+    settings = config.get("serialization", {})
+    mode = settings.get("modes", {}).get(artifact) or settings.get("mode", MODE_PRETTY)
+    backend = settings.get("backend", BACKEND_AUTO)
+    key = (mode, backend)
+    with _serializers_lock:
+        serializer = _serializers.get(key)
+        if serializer is None:
+            serializer = Serializer(mode=mode, backend=backend)
+            _serializers[key] = serializer
+        return serializer
+
+
+def peek_serializers() -> dict:
+    """生成済みの Serializer（"mode/backend" -> serializer）を返す"""
+    with _serializers_lock:
+        return {f"{serializer.mode}/{serializer.backend}": serializer for serializer in _serializers.values()}
@@ -0,0 +1,412 @@
+"""
+TOS v0.3 ランタイム - 常駐シェルホスト
+シェルを1度だけ起動し、パイプ経由でコマンドを流して rc/stdout/stderr を番兵行で切り出す
+"""
+
+import base64
+import locale
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+from .capture import BoundedCapture
+
+BACKEND_POWERSHELL = "powershell"
+BACKEND_SH = "sh"
+BACKENDS = (BACKEND_POWERSHELL, BACKEND_SH)
+
+SENTINEL_PREFIX = "__TOS_END_"
+READ_CHUNK_SIZE = 65536
+
+# PowerShell ホストでコマンド実行後に値を戻さない自動変数（実行結果そのもの・PowerShell が管理するもの）
+POWERSHELL_UNRESTORED_VARIABLES = (
+    "$", "?", "^", "_", "args", "Error", "input", "LASTEXITCODE", "Matches", "MyInvocation",
+    "PSItem", "PWD", "StackTrace", "this", "foreach", "switch", "PSBoundParameters", "PSCmdlet",
+    "Event", "EventArgs", "EventSubscriber", "Sender"
+)
+
+
+class ShellHostResult:
+    """1コマンド分の実行結果（出力は BoundedCapture）"""
+
+    def __init__(self, returncode, stdout: BoundedCapture, stderr: BoundedCapture, encoding: str,
+                 timed_out: bool = False, host_exited: bool = False, duration_sec: float = 0.0):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.encoding = encoding
+        self.timed_out = timed_out
+        self.host_exited = host_exited
+        self.duration_sec = duration_sec
+
+    @property
+    def stdout_text(self) -> str:
+        return self.stdout.text(self.encoding)
+
+    @property
+    def stderr_text(self) -> str:
+        return self.stderr.text(self.encoding)
+
+
+class _PendingCommand:
+    """実行中コマンドの出力キャプチャと完了通知
+
+    番兵の一部かもしれない末尾のバイト列だけを window に残し、それ以外はキャプチャへ流す
+    """
+
+    def __init__(self, token: str, stdout: BoundedCapture, stderr: BoundedCapture):
+        self.marker = f"\n{SENTINEL_PREFIX}{token}__".encode("ascii")
+        self.stdout = stdout
+        self.stderr = stderr
+        self.stdout_window = bytearray()
+        self.stderr_window = bytearray()
+        self.returncode = None
+        self.stdout_done = threading.Event()
+        self.stderr_done = threading.Event()
+
+
+def _build_sh_script(code: str, token: str) -> bytes:
+    """sh 用: コードを単一引用符で渡し、サブシェルで eval して番兵を出力する"""
+    quoted = "'" + code.replace("'", "'\\''") + "'"
+    end = f"{SENTINEL_PREFIX}{token}__"
+    script = (
+        f"( eval {quoted} ) </dev/null\n"
+        "__tos_rc=$?\n"
+        f"printf '\\n%s %d\\n' '{end}' \"$__tos_rc\"\n"
+        f"printf '\\n%s\\n' '{end}' >&2\n"
+    )
+    return script.encode("utf-8")
+
+
+def _build_powershell_script(code: str, token: str) -> bytes:
+    """PowerShell 用: コードを Base64 で1行に収め、スクリプトブロックとして実行して番兵を出力する
+
+    従来の「コマンドごとに powershell -Command」と同じく前のコマンドの影響を残さないよう、
+    実行前の場所（Push-Location / Pop-Location とプロセスのカレントディレクトリ）・環境変数・グローバル変数を
+    記録し、実行後に戻す（sh の ( eval ... ) に相当）
+    """
+    encoded = base64.b64encode(code.encode("utf-8")).decode("ascii")
+    end = f"{SENTINEL_PREFIX}{token}__"
+    keep = ", ".join(f"'{name}'" for name in POWERSHELL_UNRESTORED_VARIABLES)
+    script = (
+        f"$__tos_code = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String('{encoded}')); "
+        "$global:LASTEXITCODE = 0; $__tos_ok = $true; "
+        f"$__tos_keep = @({keep}); "
+        "$__tos_env = [Environment]::GetEnvironmentVariables(); "
+        "$__tos_dir = [Environment]::CurrentDirectory; "
+        "$__tos_vars = @{}; "
+        "foreach ($__tos_v in @(Get-Variable -Scope Global)) { $__tos_vars[$__tos_v.Name] = $__tos_v.Value }; "
+        "Push-Location; "
+        "try { & ([ScriptBlock]::Create($__tos_code)) | Out-String -Stream | "
+        "ForEach-Object { [Console]::Out.WriteLine($_) }; $__tos_ok = $? } "
+        "catch { $__tos_ok = $false; [Console]::Error.WriteLine($_.ToString()) } "
+        "finally { "
+        "Pop-Location; [Environment]::CurrentDirectory = $__tos_dir; "
+        "foreach ($__tos_k in @([Environment]::GetEnvironmentVariables().Keys)) { "
+        "if (-not $__tos_env.Contains($__tos_k)) { [Environment]::SetEnvironmentVariable($__tos_k, $null) } }; "
+        "foreach ($__tos_k in @($__tos_env.Keys)) { [Environment]::SetEnvironmentVariable($__tos_k, $__tos_env[$__tos_k]) }; "
+        "foreach ($__tos_v in @(Get-Variable -Scope Global)) { "
+        "$__tos_n = $__tos_v.Name; "
+        "if ($__tos_n.StartsWith('__tos_') -or $__tos_keep -contains $__tos_n -or "
+        "($__tos_v.Options -band [Management.Automation.ScopedItemOptions]'ReadOnly, Constant')) { continue }; "
+        "if (-not $__tos_vars.ContainsKey($__tos_n)) { "
+        "Remove-Variable -Name $__tos_n -Scope Global -Force -ErrorAction SilentlyContinue } "
+        "elseif (-not [object]::ReferenceEquals($__tos_v.Value, $__tos_vars[$__tos_n])) { "
+        "Set-Variable -Name $__tos_n -Scope Global -Value $__tos_vars[$__tos_n] -Force -ErrorAction SilentlyContinue } } }; "
+        "$__tos_rc = if ($LASTEXITCODE) { $LASTEXITCODE } elseif ($__tos_ok) { 0 } else { 1 }; "
+        f"[Console]::Out.WriteLine(''); [Console]::Out.WriteLine('{end} ' + $__tos_rc); [Console]::Out.Flush(); "
+        f"[Console]::Error.WriteLine(''); [Console]::Error.WriteLine('{end}'); [Console]::Error.Flush()\n"
+    )
+    return script.encode("utf-8")
+
+
+class ShellHost:
+    """常駐シェルプロセス
+
+    - run() はコマンドを1件ずつ処理する（同一ホストへの同時投入はロックで直列化）
+    - 番兵が timeout 内に返らない場合はホストを強制終了し、次回の run() で再起動する
+    - コマンド内の exit などでホストが終了した場合も、終了コードを返して次回再起動する
+    """
+
+    def __init__(self, backend: str = BACKEND_POWERSHELL, cwd: str = None, encoding: str = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"未対応のシェルホスト backend: {backend}")
+        self.backend = backend
+        self.cwd = cwd
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self._process = None
+        self._pending = None
+        self._state_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._readers = []
+        self.stats = {"hosts_started": 0, "restarts": 0, "commands": 0, "timeouts": 0, "host_exits": 0}
+
+    def _argv(self) -> list:
+        if self.backend == BACKEND_SH:
+            return ["sh"]
+        return ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"]
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """ホストを起動する（起動済みなら何もしない）"""
+        if self.is_alive():
+            return
+        if self.stats["hosts_started"]:
+            # タイムアウトやコマンド内の exit で終了したホストの再起動
+            self.stats["restarts"] += 1
+        kwargs = {}
+        if os.name == "posix":
+            kwargs["start_new_session"] = True
+        elif hasattr(subprocess, "CREATE_NEW_PROCESS_GROUP"):
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        self._process = subprocess.Popen(
+            self._argv(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            bufsize=0,
+            **kwargs
+        )
+        self._readers = [
+            threading.Thread(target=self._read_loop, args=(self._process, self._process.stdout, True),
+                             name="tos-shell-stdout", daemon=True),
+            threading.Thread(target=self._read_loop, args=(self._process, self._process.stderr, False),
+                             name="tos-shell-stderr", daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+        self.stats["hosts_started"] += 1
+
+    def _read_loop(self, process, stream, is_stdout: bool) -> None:
+        fd = stream.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, READ_CHUNK_SIZE)
+            except OSError:
+                chunk = b""
+            with self._state_lock:
+                pending = self._pending if self._process is process else None
+                if not chunk:
+                    # ホスト終了: 残りを流して待っているコマンドを解放する
+                    if pending is not None:
+                        window = pending.stdout_window if is_stdout else pending.stderr_window
+                        (pending.stdout if is_stdout else pending.stderr).write(bytes(window))
+                        window.clear()
+                        (pending.stdout_done if is_stdout else pending.stderr_done).set()
+                    return
+                if pending is None:
+                    continue
+                self._feed(pending, chunk, is_stdout)
+
+    def _feed(self, pending: _PendingCommand, chunk: bytes, is_stdout: bool) -> None:
+        capture = pending.stdout if is_stdout else pending.stderr
+        window = pending.stdout_window if is_stdout else pending.stderr_window
+        done = pending.stdout_done if is_stdout else pending.stderr_done
+        if done.is_set():
+            return
+        window.extend(chunk)
+        pos = window.find(pending.marker)
+        if pos < 0:
+            keep = len(pending.marker)
+            if len(window) > keep:
+                capture.write(bytes(window[:-keep]))
+                del window[:-keep]
+            return
+        if is_stdout:
+            # 番兵行は "<marker> <rc>\n"。改行が届くまで待つ
+            line_end = window.find(b"\n", pos + len(pending.marker))
+            if line_end < 0:
+                return
+            try:
+                pending.returncode = int(window[pos + len(pending.marker):line_end].strip() or b"0")
+            except ValueError:
+                pending.returncode = None
+        capture.write(bytes(window[:pos]))
+        window.clear()
+        done.set()
+
+    def _kill(self) -> None:
+        process = self._process
+        if process is None:
+            return
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (OSError, ProcessLookupError):
+            pass
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        with self._state_lock:
+            self._process = None
+            self._pending = None
+
+    def run(self, code: str, timeout: float, stdout: BoundedCapture = None,
+            stderr: BoundedCapture = None) -> ShellHostResult:
+        """コマンドを1件実行する
+
+        stdout / stderr を省略した場合は全量を保持するキャプチャを使う
+        """
+        if stdout is None:
+            stdout = BoundedCapture(head_bytes=None)
+        if stderr is None:
+            stderr = BoundedCapture(head_bytes=None)
+        with self._run_lock:
+            self.start()
+
+            token = uuid.uuid4().hex
+            pending = _PendingCommand(token, stdout, stderr)
+            if self.backend == BACKEND_SH:
+                script = _build_sh_script(code, token)
+            else:
+                script = _build_powershell_script(code, token)
+
+            started = time.monotonic()
+            with self._state_lock:
+                self._pending = pending
+            try:
+                self._process.stdin.write(script)
+                self._process.stdin.flush()
+            except OSError:
+                pass
+
+            deadline = started + timeout
+            finished = pending.stdout_done.wait(timeout) and pending.stderr_done.wait(
+                max(0.0, deadline - time.monotonic()))
+            duration = time.monotonic() - started
+            self.stats["commands"] += 1
+
+            if not finished:
+                self.stats["timeouts"] += 1
+                self._kill()
+                stdout.close()
+                stderr.close()
+                return ShellHostResult(None, stdout, stderr, self.encoding,
+                                       timed_out=True, duration_sec=duration)
+
+            stdout.close()
+            stderr.close()
+
+            with self._state_lock:
+                self._pending = None
+
+            if pending.returncode is None:
+                # 番兵の前にホストが終了した（exit 等）
+                self.stats["host_exits"] += 1
+                try:
+                    returncode = self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._kill()
+                    returncode = None
+                return ShellHostResult(returncode, stdout, stderr, self.encoding,
+                                       host_exited=True, duration_sec=duration)
+
+            return ShellHostResult(pending.returncode, stdout, stderr, self.encoding, duration_sec=duration)
+
+    def close(self) -> None:
+        """ホストを終了する"""
+        with self._run_lock:
+            process = self._process
+            if process is None:
+                return
+            try:
+                process.stdin.close()
+                process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+            with self._state_lock:
+                self._process = None
+                self._pending = None
+
+
+class ShellHostPool:
+    """backend ごとの待機ホストを保持するプール
+
+    acquire() で待機中のホストを借り、release() で戻す。並列実行時はワーカーごとに別ホストになる
+    """
+
+    def __init__(self, cwd: str = None):
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._all = []
+        # 終了済みホストの統計（scope=step でホストを作り直しても累計を残す）
+        self._closed_stats = {"hosts": 0, "hosts_started": 0, "restarts": 0, "commands": 0,
+                              "timeouts": 0, "host_exits": 0}
+
+    def acquire(self, backend: str) -> ShellHost:
+        with self._lock:
+            idle = self._idle.setdefault(backend, [])
+            if idle:
+                return idle.pop()
+            host = ShellHost(backend, cwd=self.cwd)
+            self._all.append(host)
+            return host
+
+    def release(self, host: ShellHost) -> None:
+        with self._lock:
+            self._idle.setdefault(host.backend, []).append(host)
+
+    def close_all(self) -> None:
+        with self._lock:
+            hosts = list(self._all)
+            self._all = []
+            self._idle = {}
+        for host in hosts:
+            host.close()
+            with self._lock:
+                self._closed_stats["hosts"] += 1
+                for key, value in host.stats.items():
+                    self._closed_stats[key] += value
+
+    def summary(self) -> dict:
+        """全ホストの統計を合算する"""
+        with self._lock:
+            hosts = list(self._all)
+            total = dict(self._closed_stats)
+        total["hosts"] += len(hosts)
+        for host in hosts:
+            for key, value in host.stats.items():
+                total[key] += value
+        return total
+
+
+def backend_for_type(cmd_type: str):
+    """コマンド type に対応するシェル backend（対応しない type は None）"""
+    if cmd_type in BACKENDS:
+        return cmd_type
+    return None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_shell_host_pool(cwd: str = None) -> ShellHostPool:
+    """プロセス共通の ShellHostPool を取得する
+
+    cwd が変わった場合（プロセスプールのワーカーが別のジョブを実行する場合）は、
+    起動済みのホストを終了してプールを作り直す
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.cwd != cwd:
+            _pool.close_all()
+            _pool = None
+        if _pool is None:
+            _pool = ShellHostPool(cwd=cwd)
+        return _pool
+
+
+def peek_shell_host_pool():
+    """作成済みのプールを返す（未作成なら None）"""
+    return _pool
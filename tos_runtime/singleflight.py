@@ -0,0 +1,267 @@
+"""
+TOS v0.3 ランタイム - シングルフライト
+同じリクエストが同時に複数走る場合に上流への呼び出しを1回にまとめる（プロセス内 + ロックファイルによる同一ホストのプロセス間）
+"""
+
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_POLL_INTERVAL_MS = 50
+DEFAULT_LOCK_TIMEOUT_SEC = 900
+DEFAULT_WAIT_TIMEOUT_SEC = 900
+DEFAULT_RESULT_TTL_SEC = 60
+
+# リーダーが結果を出さずに終わった（失敗で None・取り消しなど）ことをフォロワーに伝える
+_LEADER_ABORTED = object()
+
+
+def _pid_alive(pid: int) -> bool:
+    """同一ホスト上のプロセスが生きているか（判定できない環境では生きているとみなす）"""
+    if os.name == "nt" or not pid:
+        # Windows の os.kill はシグナル 0 でもプロセスを終了させるため使わない
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class SingleFlight:
+    """同一キーの実行中リクエストを1回の上流呼び出しにまとめる
+
+    - プロセス内: 最初の呼び出し（リーダー）の結果を、実行中に来た同じキーの呼び出し（フォロワー）が受け取る。
+      イベントループはスレッドごとに別のため、concurrent.futures.Future で受け渡す
+    - プロセス間（lock_dir 指定時）: <key>.lock を排他作成できたプロセスがリーダーになり、
+      結果を <key>.result.json（結果スロット）に書いてからロックを外す。
+      ロックを見つけたプロセスはロックが消えるまで待ち、待ち始めた後に書かれた結果スロットを使う
+    - リーダーが結果を残さずに終わった場合（失敗して None を返した場合を含む）、フォロワーは自分で呼び出す
+    - 例外はプロセス内のフォロワーにはそのまま伝え、プロセス間では共有しない
+    """
+
+    def __init__(self, enabled: bool = True, lock_dir=None, poll_interval_ms: float = DEFAULT_POLL_INTERVAL_MS,
+                 lock_timeout_sec: float = DEFAULT_LOCK_TIMEOUT_SEC, wait_timeout_sec: float = DEFAULT_WAIT_TIMEOUT_SEC,
+                 result_ttl_sec: float = DEFAULT_RESULT_TTL_SEC):
+        self.enabled = enabled
+        self.lock_dir = Path(lock_dir) if lock_dir else None
+        self.poll_interval_sec = poll_interval_ms / 1000
+        self.lock_timeout_sec = lock_timeout_sec
+        self.wait_timeout_sec = wait_timeout_sec
+        self.result_ttl_sec = result_ttl_sec
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "upstream_calls": 0,
+            "coalesced_local": 0,
+            "coalesced_remote": 0,
+            "remote_wait_timeouts": 0,
+            "stale_locks_broken": 0
+        }
+
+    @classmethod
+    def from_config(cls, config: dict, base_dir) -> "SingleFlight":
+        settings = config.get("single_flight", {})
+        lock_dir = None
+        if settings.get("cross_process", False):
+            workspace_dir = config.get("workspace_dir", "workspace")
+            lock_dir = Path(base_dir) / settings.get("lock_dir", f"{workspace_dir}/artifacts/singleflight")
+        return cls(
+            enabled=settings.get("enabled", True),
+            lock_dir=lock_dir,
+            poll_interval_ms=settings.get("poll_interval_ms", DEFAULT_POLL_INTERVAL_MS),
+            lock_timeout_sec=settings.get("lock_timeout_sec", DEFAULT_LOCK_TIMEOUT_SEC),
+            wait_timeout_sec=settings.get("wait_timeout_sec", DEFAULT_WAIT_TIMEOUT_SEC),
+            result_ttl_sec=settings.get("result_ttl_sec", DEFAULT_RESULT_TTL_SEC)
+        )
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    async def run(self, key: str, start_call) -> tuple:
+        """start_call() の結果を同じ key の同時呼び出しと共有する
+
+        start_call は awaitable を返す関数。結果は JSON 化できる値（文字列 / None）であること
+
+        Returns:
+            tuple: (result, role)。role は leader / follower / remote_follower / off
+        """
+        import asyncio
+
+        if not self.enabled:
+            return await start_call(), "off"
+        self._count("calls")
+        while True:
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = concurrent.futures.Future()
+            if leader:
+                break
+            result = await asyncio.wrap_future(future)
+            if result is not _LEADER_ABORTED:
+                self._count("coalesced_local")
+                return result, "follower"
+            # リーダーが失敗・取り消された場合は自分がリーダーになって呼び直す
+
+        try:
+            result, role = await self._lead(key, start_call)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_result(_LEADER_ABORTED)
+            raise
+        else:
+            # 失敗（None）は共有せず、フォロワーには自分で呼び直させる
+            future.set_result(_LEADER_ABORTED if result is None else result)
+            return result, role
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def _call_upstream(self, start_call):
+        self._count("upstream_calls")
+        return await start_call()
+
+    async def _lead(self, key: str, start_call) -> tuple:
+        if self.lock_dir is None:
+            return await self._call_upstream(start_call), "leader"
+
+        lock_path = self.lock_dir / f"{key}.lock"
+        slot_path = self.lock_dir / f"{key}.result.json"
+        waiting_since = time.time()
+        deadline = time.monotonic() + self.wait_timeout_sec
+        while True:
+            if self._try_lock(lock_path):
+                try:
+                    result = await self._call_upstream(start_call)
+                    # 失敗（None）は結果スロットに残さない（他プロセスのフォロワーは自分で呼び直す）
+                    if result is not None:
+                        self._write_slot(slot_path, key, result)
+                    return result, "leader"
+                finally:
+                    self._unlock(lock_path)
+
+            slot = await self._wait_remote(lock_path, slot_path, waiting_since, deadline)
+            if slot is not None:
+                self._count("coalesced_remote")
+                return slot["result"], "remote_follower"
+            if time.monotonic() >= deadline:
+                self._count("remote_wait_timeouts")
+                return await self._call_upstream(start_call), "leader"
+            # 他プロセスのリーダーが結果を残さずに終わった: 自分がリーダーになれるか再度試す
+
+    def _try_lock(self, lock_path: Path) -> bool:
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "created_at": time.time()}, f)
+        return True
+
+    def _unlock(self, lock_path: Path) -> None:
+        try:
+            lock_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _lock_is_stale(self, lock_path: Path) -> bool:
+        try:
+            age = time.time() - lock_path.stat().st_mtime
+        except OSError:
+            return False
+        try:
+            with open(lock_path, "r", encoding="utf-8") as f:
+                owner = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            # 書き込み途中のロックは若いうちは生きているとみなす
+            return age > self.lock_timeout_sec
+        return age > self.lock_timeout_sec or not _pid_alive(owner.get("pid"))
+
+    async def _wait_remote(self, lock_path: Path, slot_path: Path, waiting_since: float, deadline: float):
+        """他プロセスのリーダーの終了を待ち、待ち始めた後に書かれた結果スロットを返す（無ければ None）"""
+        import asyncio
+
+        while lock_path.exists():
+            if self._lock_is_stale(lock_path):
+                print(f"シングルフライト: 古いロックを解除します ({lock_path.name})")
+                self._count("stale_locks_broken")
+                self._unlock(lock_path)
+                return None
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval_sec)
+        try:
+            with open(slot_path, "r", encoding="utf-8") as f:
+                slot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return slot if slot.get("finished_at", 0) >= waiting_since else None
+
+    def _write_slot(self, slot_path: Path, key: str, result) -> None:
+        tmp_path = slot_path.with_name(f"{slot_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "result": result, "finished_at": time.time(), "pid": os.getpid()},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, slot_path)
+        except (OSError, TypeError, ValueError) as e:
+            # 結果スロットが書けなくても呼び出し自体は成功している（フォロワーは自分で呼び直す）
+            print(f"シングルフライト結果スロット書き込みエラー: {slot_path} - {e}")
+            return
+        self._sweep_slots()
+
+    def _sweep_slots(self) -> None:
+        """result_ttl_sec を過ぎた結果スロットを削除する"""
+        cutoff = time.time() - self.result_ttl_sec
+        try:
+            entries = list(os.scandir(self.lock_dir))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.name.endswith(".result.json"):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = dict(self.stats)
+        summary["saved_calls"] = summary["coalesced_local"] + summary["coalesced_remote"]
+        return summary
+
+
+_flight_source = None
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_single_flight(config: dict, base_dir) -> SingleFlight:
+    """config から構築した SingleFlight を取得する（同じ config オブジェクトには一度だけ構築）"""
+    global _flight_source, _flight
+    with _flight_lock:
+        if _flight is None or _flight_source is not config:
+            _flight = SingleFlight.from_config(config, base_dir)
+            _flight_source = config
+        return _flight
+
+
+def peek_single_flight():
+    """構築済みの SingleFlight を返す（未構築なら None）"""
+    return _flight
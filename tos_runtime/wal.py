@@ -0,0 +1,207 @@
+"""
+TOS v0.3 ランタイム - ステップ WAL
+フェーズ状態の遷移とステップログの参照を1レコードとして先に追記・fsync し、クラッシュ後の起動時に再適用する
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+DEFAULT_GROUP_COMMIT_MS = 0
+
+
+def _frame(record: dict) -> bytes:
+    """1レコードを "<crc32 8桁> <json>\\n" の1行にする（途中で切れた行は CRC で検出する）"""
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"%08x " % zlib.crc32(payload) + payload + b"\n"
+
+
+def _unframe(line: bytes):
+    """_frame の逆。壊れた行・途中で切れた行は None"""
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload.decode("utf-8"))
+    except ValueError:
+        return None
+
+
+class StepWAL:
+    """フェーズ状態の遷移 + ステップログの参照の WAL
+
+    - append(): レコードを追記し、fsync=True なら fsync が終わるまで待つ（コミット）
+      複数スレッドが同時にコミットした場合は1回の fsync をまとめて使う（グループコミット）。
+      group_commit_ms を指定すると fsync 前にその時間だけ待ち、後続のレコードも同じ fsync に載せる
+    - mark_applied(): seq までのレコードを書き終えた印を追記する
+      フェーズ状態は最新の遷移だけが残るため、印は「ここまで適用済み」の意味で扱う。
+      最後に追記したレコードまで適用済みになった場合は印を書かずに WAL を空にする（実行中に伸び続けない）。
+      fsync=True なら印・空にする操作も fsync する（OS ごと落ちたときに適用済みのレコードが戻ると、
+      再適用で古いフェーズ状態が新しいものを上書きしてしまう）
+    - pending(): 最後の適用済みの印より後のコミット済みレコードを返す（起動時の再適用用）
+    - 末尾の壊れた行（書き込み途中のクラッシュ）はコミットされていないものとして無視する
+    """
+
+    def __init__(self, path, fsync: bool = True, group_commit_ms: float = DEFAULT_GROUP_COMMIT_MS):
+        self.path = Path(path)
+        self.fsync = fsync
+        self.group_commit_ms = group_commit_ms
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._file = None
+        self._seq = None
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self.stats = {"commits": 0, "fsyncs": 0, "group_committed": 0, "replayed": 0, "torn_records": 0,
+                      "checkpoints": 0}
+
+    def _read_records(self) -> tuple:
+        """(レコードのリスト, 末尾に壊れた行があったか) を返す"""
+        if not self.path.exists():
+            return [], False
+        records = []
+        with open(self.path, "rb") as f:
+            for line in f:
+                record = _unframe(line)
+                if record is None:
+                    # 以降は書き込み途中で落ちた部分として扱う
+                    return records, True
+                records.append(record)
+        return records, False
+
+    def _ensure_open(self) -> None:
+        if self._seq is None:
+            self._seq = max((r.get("seq", 0) for r in self._read_records()[0]), default=0)
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+
+    def append(self, record: dict) -> int:
+        """レコードを追記してコミットする
+
+        Returns:
+            int: レコードの連番 (seq)
+        """
+        with self._lock:
+            self._ensure_open()
+            self._seq += 1
+            seq = self._seq
+            self._file.write(_frame(dict(record, seq=seq)))
+            self._file.flush()
+            self._written = seq
+            self.stats["commits"] += 1
+        if self.fsync:
+            self._sync(seq)
+        return seq
+
+    def _sync(self, seq: int) -> None:
+        with self._cond:
+            while self._synced < seq and self._syncing:
+                self._cond.wait()
+            if self._synced >= seq:
+                # 他のスレッドの fsync に載った
+                self.stats["group_committed"] += 1
+                return
+            self._syncing = True
+        target = seq
+        try:
+            if self.group_commit_ms:
+                time.sleep(self.group_commit_ms / 1000)
+            with self._lock:
+                target = self._written
+                fileno = self._file.fileno()
+            # fsync 中も他スレッドの追記は止めない（次の fsync に載る）
+            os.fsync(fileno)
+        finally:
+            with self._cond:
+                self._syncing = False
+                self._synced = max(self._synced, target)
+                self.stats["fsyncs"] += 1
+                self._cond.notify_all()
+
+    def mark_applied(self, seq: int) -> None:
+        """seq 以前のレコードを適用済みにする（seq が最後のレコードなら WAL を空にする）
+
+        seq は単調増加のまま続ける（同じ path への追記は1スレッドから行う前提）
+        """
+        with self._lock:
+            self._ensure_open()
+            if seq >= self._seq:
+                self._file.truncate(0)
+                self.stats["checkpoints"] += 1
+            else:
+                self._file.write(_frame({"applied": seq}))
+                self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+                self.stats["fsyncs"] += 1
+
+    def pending(self) -> list:
+        """コミット済みで未適用のレコードを seq 順に返す"""
+        with self._lock:
+            records, torn = self._read_records()
+            if torn:
+                self.stats["torn_records"] += 1
+        applied = max((r["applied"] for r in records if "applied" in r), default=0)
+        return [r for r in records if r.get("seq", 0) > applied]
+
+    def count_replayed(self, count: int) -> None:
+        with self._lock:
+            self.stats["replayed"] += count
+
+    def reset(self) -> None:
+        """すべて適用済みになった WAL を空にする"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path.exists():
+                with open(self.path, "wb") as f:
+                    if self.fsync:
+                        os.fsync(f.fileno())
+            self._seq = 0
+            self._written = 0
+            with self._cond:
+                self._synced = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.stats, fsync=self.fsync, group_commit_ms=self.group_commit_ms)
+
+
+_wals = {}
+_wals_lock = threading.Lock()
+
+
+def get_step_wal(config: dict, path) -> StepWAL:
+    """path ごとの StepWAL を取得する（ポリシーは初回の config["step_wal"] で決まる）"""
+    path = Path(path)
+    with _wals_lock:
+        wal = _wals.get(path)
+        if wal is None:
+            settings = config.get("step_wal", {})
+            wal = StepWAL(
+                path,
+                fsync=settings.get("fsync", True),
+                group_commit_ms=settings.get("group_commit_ms", DEFAULT_GROUP_COMMIT_MS)
+            )
+            _wals[path] = wal
+        return wal
+
+
+def peek_step_wals() -> dict:
+    """生成済みの StepWAL（path -> wal）を返す"""
+    with _wals_lock:
+        return dict(_wals)